@@ -27,7 +27,9 @@ from neon.backends.autodiff import Autodiff
 
 
 def gen_backend(backend='cpu', rng_seed=None, default_dtype=np.float32,
-                batch_size=0, stochastic_round=False, device_id=0):
+                batch_size=0, stochastic_round=False, device_id=0,
+                scratch_bytes=512 * 1024 * 1024, num_threads=1,
+                conv_autotune='off', conv_autotune_path=None, compute_dtype=None):
     """
     Construct and return a backend instance of the appropriate type based on
     the arguments given. With no parameters, a single CPU core, float32
@@ -52,10 +54,32 @@ def gen_backend(backend='cpu', rng_seed=None, default_dtype=np.float32,
                                                rounding using default bit width.
                                                If set to an integer will round
                                                to that number of bits.
-                                               Only affects the gpu backend.
+                                               The cpu backend only rounds
+                                               float16 tensors computed in
+                                               compute_dtype.
         device_id (numeric, optional): Set this to a numeric value which can be
                                        used to select which device to run the
                                        process on
+        scratch_bytes (int, optional): Upper bound on the memory held by the
+                                       pool of kernel temporaries.
+                                       Only affects the cpu backend.
+        num_threads (int, optional): Number of threads large elementwise and
+                                     reduction operations are split across.
+                                     Only affects the cpu backend.
+        conv_autotune (str, optional): How the algorithm of convolution layers
+                                       is picked.  'off' uses the direct
+                                       algorithm, 'cached' times the
+                                       algorithms of geometries missing from
+                                       the on-disk cache, 'retune' times them
+                                       again and overwrites the cache.
+                                       Only affects the cpu backend.
+        conv_autotune_path (str, optional): Autotuner cache file, defaults
+                                            to ~/nervana/cache/
+                                            conv_autotune.json
+        compute_dtype (dtype, optional): Set to np.float32 to compute float16
+                                         tensors in float32, keeping only their
+                                         storage in float16.
+                                         Only affects the cpu backend.
 
     Returns:
         Backend: newly constructed backend instance of the specifed type.
@@ -79,7 +103,10 @@ def gen_backend(backend='cpu', rng_seed=None, default_dtype=np.float32,
 
     if backend == 'cpu' or backend is None:
         from neon.backends.nervanacpu import NervanaCPU
-        be = NervanaCPU(rng_seed=rng_seed, default_dtype=default_dtype)
+        be = NervanaCPU(rng_seed=rng_seed, default_dtype=default_dtype,
+                        scratch_bytes=scratch_bytes, num_threads=num_threads,
+                        conv_autotune=conv_autotune, conv_autotune_path=conv_autotune_path,
+                        compute_dtype=compute_dtype, stochastic_round=stochastic_round)
     elif backend == 'gpu':
         gpuflag = False
         # check nvcc
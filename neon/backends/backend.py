@@ -18,6 +18,9 @@ Defines Tensor and Backend class
 
 import numpy as np
 import logging
+from collections import OrderedDict
+from functools import reduce
+from operator import mul
 
 
 logger = logging.getLogger(__name__)
@@ -449,6 +452,21 @@ class Backend(object):
         """
         pass
 
+    def capture(self, func):
+        """
+        Run func and record the backend calls it makes, so that they can be
+        replayed on the same buffers without running func again.  Backends
+        that do not support this only run func.
+
+        Arguments:
+            func (callable): computation to capture, called without arguments
+
+        Returns:
+            callable: replays the recorded calls, None if not supported
+        """
+        func()
+        return None
+
     def begin(self, block, identifier):
         """
         Signal the start of a block of repeated computation (ex. at the start
@@ -1423,6 +1441,158 @@ class Backend(object):
         """
         return a.take(indices, axis, out)
 
+    def lookup_bprop(self, indices, error, dW, grad=None, last=None):
+        """
+        Weight gradient of a lookup table: clear dW and write to each of its
+        columns in indices the sum of the columns of error for that index.
+
+        Backends may also keep a row-sparse copy of the gradient, written to
+        the first columns of grad for the sorted unique indices, and clear
+        only the columns of dW in last instead of all of it.  This generic
+        version ignores grad and last.
+
+        Arguments:
+            indices (numpy.ndarray): index of each column of error
+            error (Tensor): values to sum, with a column per index
+            dW (Tensor): dense gradient with a column per possible index
+            grad (Tensor, optional): buffer for the sums with at least a
+                                     column per index
+            last (numpy.ndarray, optional): indices of the columns of dW
+                                            written by the previous call
+
+        Returns:
+            numpy.ndarray: the sorted unique indices if grad was written,
+                           None otherwise
+        """
+        dW[:] = 0
+        unqidx, inv = np.unique(indices, return_inverse=True)
+        groups = [np.where(inv == i) for i in range(len(unqidx))]
+        for (wrd_id, group) in zip(unqidx, groups):
+            dW[:, int(wrd_id)] = self.sum(error.take(group[0], axis=1), axis=1)
+        return None
+
+    def compound_lstm_fprop_step(self, ifog, c_prev, c, c_act, h, gate_activation, activation):
+        """
+        Gate activations and state updates of a step of an LSTM layer, from
+        the pre-activations of its input, forget, output and input modulation
+        gates
+
+        Arguments:
+            ifog (Tensor): gate pre-activations, replaced by the activations
+            c_prev (Tensor): cell state of the previous step
+            c (Tensor): cell state output
+            c_act (Tensor): cell activation output
+            h (Tensor): hidden state output
+            gate_activation (Transform): activation of the gates
+            activation (Transform): activation of the input modulation and cell
+        """
+        nout = h.shape[0]
+        ifo, i, f, o, g = (ifog[:nout * 3], ifog[:nout], ifog[nout:nout * 2],
+                           ifog[nout * 2:nout * 3], ifog[nout * 3:])
+        ifo[:] = gate_activation(ifo)
+        g[:] = activation(g)
+
+        c[:] = f * c_prev + i * g
+        c_act[:] = activation(c)
+        h[:] = o * c_act
+
+    def compound_lstm_bprop_step(self, ifog, c_prev, c_act, in_deltas, ifog_delta, c_delta,
+                                 c_delta_prev, gate_activation, activation):
+        """
+        Gate pre-activation and cell state deltas of a step of an LSTM layer
+
+        Arguments:
+            ifog (Tensor): gate activations of the step
+            c_prev (Tensor): cell state of the previous step, 0 for the first
+            c_act (Tensor): cell activation of the step
+            in_deltas (Tensor): hidden state deltas of the step
+            ifog_delta (Tensor): gate pre-activation delta output
+            c_delta (Tensor): cell state deltas of the step, accumulated
+            c_delta_prev (Tensor): cell state delta output for the previous
+                                   step, None for the first
+            gate_activation (Transform): activation of the gates
+            activation (Transform): activation of the input modulation and cell
+        """
+        nout = c_act.shape[0]
+        i, f, o, g = [ifog[k * nout:(k + 1) * nout] for k in range(4)]
+        i_delta, f_delta, o_delta, g_delta = [ifog_delta[k * nout:(k + 1) * nout]
+                                              for k in range(4)]
+
+        c_delta[:] = c_delta + activation.bprop(c_act) * (o * in_deltas)
+        i_delta[:] = gate_activation.bprop(i) * c_delta * g
+        f_delta[:] = gate_activation.bprop(f) * c_delta * c_prev
+        o_delta[:] = gate_activation.bprop(o) * in_deltas * c_act
+        g_delta[:] = activation.bprop(g) * c_delta * i
+
+        if c_delta_prev is not None:
+            c_delta_prev[:] = c_delta * f
+
+    def compound_gru_fprop_step(self, Wrz_recur, Whcan_recur, h_prev, rzhcan, rzhcan_rec,
+                                rh_prev, h, gate_activation, activation):
+        """
+        Recurrent gemms, gate activations and state update of a step of a GRU
+        layer, from the pre-activations of its reset, update and candidate
+        gates
+
+        Arguments:
+            Wrz_recur (Tensor): recurrent weights of the reset and update gates
+            Whcan_recur (Tensor): recurrent weights of the candidate
+            h_prev (Tensor): hidden state of the previous step
+            rzhcan (Tensor): gate pre-activations from the inputs, replaced by
+                             the activations
+            rzhcan_rec (Tensor): buffer for the recurrent gate inputs
+            rh_prev (Tensor): reset previous hidden state output
+            h (Tensor): hidden state output
+            gate_activation (Transform): activation of the gates
+            activation (Transform): activation of the candidate
+        """
+        nout = h.shape[0]
+        rz, r, z, hcan = (rzhcan[:nout * 2], rzhcan[:nout], rzhcan[nout:nout * 2],
+                          rzhcan[nout * 2:])
+        rz_rec, hcan_rec = rzhcan_rec[:nout * 2], rzhcan_rec[nout * 2:]
+
+        self.compound_dot(Wrz_recur, h_prev, rz_rec)
+        rz[:] = gate_activation(rz + rz_rec)
+        rh_prev[:] = r * h_prev
+        self.compound_dot(Whcan_recur, rh_prev, hcan_rec)
+
+        hcan[:] = activation(hcan_rec + hcan)
+        h[:] = (1 - z) * h_prev + z * hcan
+
+    def compound_gru_bprop_step(self, Wrz_recur, Whcan_recur, rzhcan, h_prev, in_deltas,
+                                rzhcan_delta, h_delta, wrc_T_dc, gate_activation, activation):
+        """
+        Gate pre-activation and hidden state deltas of a step of a GRU layer
+
+        Arguments:
+            Wrz_recur (Tensor): recurrent weights of the reset and update gates
+            Whcan_recur (Tensor): recurrent weights of the candidate
+            rzhcan (Tensor): gate activations of the step
+            h_prev (Tensor): hidden state of the previous step, 0 for the first
+            in_deltas (Tensor): hidden state deltas of the step
+            rzhcan_delta (Tensor): gate pre-activation delta output
+            h_delta (Tensor): previous hidden state delta output
+            wrc_T_dc (Tensor): buffer for the candidate deltas through
+                               Whcan_recur
+            gate_activation (Transform): activation of the gates
+            activation (Transform): activation of the candidate
+        """
+        nout = in_deltas.shape[0]
+        r, z, hcan = [rzhcan[k * nout:(k + 1) * nout] for k in range(3)]
+        rz_delta = rzhcan_delta[:nout * 2]
+        r_delta, z_delta, hcan_delta = [rzhcan_delta[k * nout:(k + 1) * nout]
+                                        for k in range(3)]
+
+        hcan_delta[:] = activation.bprop(hcan) * in_deltas * z
+        z_delta[:] = gate_activation.bprop(z) * in_deltas * (hcan - h_prev)
+
+        self.compound_dot(Whcan_recur.T, hcan_delta, wrc_T_dc)
+        r_delta[:] = gate_activation.bprop(r) * wrc_T_dc * h_prev
+
+        h_delta[:] = in_deltas * (1 - z)
+        self.compound_dot(Wrz_recur.T, rz_delta, h_delta, beta=1.0)
+        h_delta[:] = h_delta + r * wrc_T_dc
+
     def onehot(self, indices, axis, out=None):
         """
         Generate optree for converting `indices` to onehot representation
@@ -1465,7 +1635,7 @@ class Backend(object):
                    T=1, R=1, S=1,
                    pad_d=0, pad_h=0, pad_w=0,
                    str_d=1, str_h=1, str_w=1,
-                   grid_P=0, grid_Q=0, update_size=None):
+                   grid_P=0, grid_Q=0, update_size=None, algo=None):
         """
         Create a new ConvLayer parameter object.
         This then is passed as an argument to all the convolution operations.
@@ -1486,6 +1656,8 @@ class Backend(object):
         strides: factor to step the filters by in a given direction
 
         dtype: need to know dtype to setup proper kernels and params.
+
+        algo: convolution algorithm, a hint for backends that have several
         """
         raise NotImplementedError()
 
@@ -1529,6 +1701,20 @@ class Backend(object):
         """
         raise NotImplementedError()
 
+    def quantize(self, x, out, scale=None, axis=None):
+        """
+        Quantize a tensor to int8 for quantized inference.
+
+        Arguments:
+            x (Tensor): values to quantize
+            out (Tensor): int8 output
+            scale (Tensor, optional): scale of the quantized values, by
+                                      default the largest magnitude of x
+                                      along axis over 127
+            axis (int, optional): axis the default scale is taken along
+        """
+        raise NotImplementedError()
+
     def deconv_layer(self, dtype,
                      N, C, K,
                      P, Q,
@@ -1617,6 +1803,35 @@ class Backend(object):
 
 
 # For constructing an op tree used in lazy evaluation
+class LRUCache(OrderedDict):
+
+    """
+    Dictionary holding at most maxsize items, the least recently used ones
+    are dropped first.  Both get and assignment count as a use.
+
+    Arguments:
+        maxsize (int): number of items kept
+    """
+
+    def __init__(self, maxsize):
+        super(LRUCache, self).__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        value = self.pop(key)
+        OrderedDict.__setitem__(self, key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self:
+            del self[key]
+        OrderedDict.__setitem__(self, key, value)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
 class OpTreeNode(tuple):
 
     """
@@ -1710,6 +1925,213 @@ class OpTreeNode(tuple):
 
         return (tuple(stack), tensor_index_map, index_tensor_map)
 
+    def optimize(self, fast_math=False):
+        """
+        Returns an equivalent op-tree that is cheaper to evaluate:
+
+        - scalar only subtrees are folded into constants
+        - --x and x.T.T are dropped
+        - common subexpressions over the same tensors become a single shared
+          node
+
+        These give the same results as the original op-tree.  With fast_math
+        set, rewrites that may change rounding or the dtype of the result are
+        made too:
+
+        - identities (x * 1, x + 0, x - 0, x / 1, x ** 1) are dropped, along
+          with the type promotion the dropped scalar would have caused
+        - chains of add/sub or mul/div combine their operands that broadcast
+          against a larger one first, e.g. (x * a) * b becomes x * (a * b)
+          for a row vector a and b
+
+        The rewrite only depends on the intrinsic key of the op-tree, so it is
+        cached by key and replayed on the tensors of later op-trees.  The
+        before/after trees are logged at debug level.
+
+        Arguments:
+            fast_math (bool, optional): also make the inexact rewrites.
+                                        Defaults to False.
+        """
+        key, tensor_index_map, index_tensor_map = self.intrinsic_key_maps()
+        key += tuple(type(k) for k in key if not isinstance(k, (tuple, str)))
+        key += (fast_math, )
+
+        if key not in OpTreeNode._optimized:
+            optimized = OpTreeNode._simplify(self, dict(), fast_math)
+            if optimized is self:
+                OpTreeNode._optimized[key] = None
+            else:
+                OpTreeNode._optimized[key] = OpTreeNode._to_template(optimized,
+                                                                     tensor_index_map, dict())
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("optimized op-tree, %d -> %d ops\n  before: %s\n  after:  %s",
+                             OpTreeNode._count_ops(self, set()),
+                             OpTreeNode._count_ops(optimized, set()),
+                             OpTreeNode._pretty_print(self), OpTreeNode._pretty_print(optimized))
+
+        template = OpTreeNode._optimized.get(key)
+        if template is None:
+            return self
+        return OpTreeNode._from_template(template, index_tensor_map, dict())
+
+    # optimized op-trees by intrinsic key, None when optimize leaves them as
+    # is.  The key holds the scalar constants, so learning rates that change
+    # every step or epoch add a key each time, and old keys are dropped.
+    _optimized = LRUCache(4096)
+
+    # constant folding of scalar operands
+    _scalar_ops = {"neg": np.negative, "abs": np.abs, "sgn": np.sign, "sqrt": np.sqrt,
+                   "sqr": np.square, "exp": np.exp, "log": np.log, "exp2": np.exp2,
+                   "log2": np.log2, "tanh": np.tanh, "add": np.add, "sub": np.subtract,
+                   "mul": np.multiply, "div": np.divide, "pow": np.power,
+                   "minimum": np.minimum, "maximum": np.maximum}
+
+    # (outer op, inner op) -> (op of the new outer node, op combining the
+    # small operands), for (A inner b) outer c == A new_outer (b combine c)
+    _reassociate = {("add", "add"): ("add", "add"), ("add", "sub"): ("sub", "sub"),
+                    ("sub", "add"): ("add", "sub"), ("sub", "sub"): ("sub", "add"),
+                    ("mul", "mul"): ("mul", "mul"), ("mul", "div"): ("div", "div"),
+                    ("div", "mul"): ("mul", "div"), ("div", "div"): ("div", "mul")}
+
+    @staticmethod
+    def _simplify(node, memo, fast_math):
+        """
+        Bottom up rewrite of an op-tree for optimize.  memo maps the
+        _cse_key of every node kept so far to the node.
+        """
+        if not isinstance(node, OpTreeNode):
+            return node
+
+        left = OpTreeNode._simplify(node[1], memo, fast_math)
+        right = OpTreeNode._simplify(node[2], memo, fast_math)
+
+        result = OpTreeNode._rewrite(node[0], left, right, fast_math)
+        if result is None:
+            if left is node[1] and right is node[2]:
+                result = node
+            else:
+                result = OpTreeNode(node[0], left, right)
+
+        # random numbers are drawn anew by every node
+        if isinstance(result, OpTreeNode) and result[0]["op"] not in OpCollection.zero_operand_ops:
+            result = memo.setdefault(OpTreeNode._cse_key(result), result)
+        return result
+
+    @staticmethod
+    def _rewrite(op_dict, a, b, fast_math):
+        """
+        Applies the first matching rule of optimize to a node whose operands
+        are already simplified.  Returns None if no rule matches.
+        """
+        op = op_dict["op"]
+
+        def is_scalar(x):
+            return isinstance(x, (int, float))
+
+        def is_const(x, value):
+            return is_scalar(x) and x == value
+
+        def size(x):
+            return reduce(mul, OpTreeNode.shape.fget(x), 1)
+
+        if op in OpTreeNode._scalar_ops and is_scalar(a) and (b is None or is_scalar(b)):
+            # integer division and powers are left to the backend
+            if not (op in ("div", "pow") and isinstance(a, int) and isinstance(b, int)):
+                args = (a,) if b is None else (a, b)
+                return OpTreeNode._scalar_ops[op](*args).item()
+
+        if op in ("neg", "transpose") and isinstance(a, OpTreeNode) and a[0]["op"] == op:
+            return a[1]
+        if not fast_math:
+            return None
+
+        if op == "mul" and is_const(a, 1) and not is_scalar(b):
+            return b
+        if op in ("mul", "div", "pow") and is_const(b, 1) and not is_scalar(a):
+            return a
+        if op == "add" and is_const(a, 0) and not is_scalar(b):
+            return b
+        if op in ("add", "sub") and is_const(b, 0) and not is_scalar(a):
+            return a
+
+        # a commutative outer op gets its inner op on the left
+        if (op in ("add", "mul") and isinstance(b, OpTreeNode) and
+                (op, b[0]["op"]) in OpTreeNode._reassociate and
+                not (isinstance(a, OpTreeNode) and (op, a[0]["op"]) in OpTreeNode._reassociate)):
+            a, b = b, a
+        if isinstance(a, OpTreeNode) and (op, a[0]["op"]) in OpTreeNode._reassociate:
+            big, small = a[1], a[2]
+            if a[0]["op"] in ("add", "mul") and size(small) > size(big):
+                big, small = small, big
+            new_op, combine = OpTreeNode._reassociate[(op, a[0]["op"])]
+            if size(small) < size(big) and size(b) < size(big):
+                if combine == "div" and isinstance(small, int) and isinstance(b, int):
+                    small = float(small)
+                c = OpTreeNode.build(combine, small, b)
+                if size(c) < size(big):
+                    folded = OpTreeNode._rewrite(c[0], small, b, fast_math)
+                    if folded is not None:
+                        c = folded
+                    return OpTreeNode(dict(op_dict, op=new_op), big, c)
+        return None
+
+    @staticmethod
+    def _cse_key(node):
+        """
+        Key of a node whose operands have been through _simplify, so equal
+        subtrees are already the very same object
+        """
+        def operand_key(x):
+            if isinstance(x, (int, float)):
+                return (type(x), x)
+            return id(x)
+
+        attrs = tuple(sorted((k, operand_key(v) if isinstance(v, Tensor) else v)
+                             for k, v in node[0].items()))
+        return (attrs, operand_key(node[1]), operand_key(node[2]))
+
+    @staticmethod
+    def _to_template(node, tensor_index_map, memo):
+        """
+        Copy of an op-tree as nested lists with tensors replaced by their
+        index in tensor_index_map, keeping shared nodes shared
+        """
+        if isinstance(node, Tensor):
+            return ("tensor", tensor_index_map[node])
+        if not isinstance(node, OpTreeNode):
+            return ("const", node)
+        if id(node) not in memo:
+            memo[id(node)] = ("node", node[0],
+                              OpTreeNode._to_template(node[1], tensor_index_map, memo),
+                              OpTreeNode._to_template(node[2], tensor_index_map, memo))
+        return memo[id(node)]
+
+    @staticmethod
+    def _from_template(template, index_tensor_map, memo):
+        """
+        Rebuild the op-tree of a template with the given tensors
+        """
+        if template[0] == "tensor":
+            return index_tensor_map[template[1]]
+        if template[0] == "const":
+            return template[1]
+        if id(template) not in memo:
+            memo[id(template)] = OpTreeNode(
+                dict(template[1]),
+                OpTreeNode._from_template(template[2], index_tensor_map, memo),
+                OpTreeNode._from_template(template[3], index_tensor_map, memo))
+        return memo[id(template)]
+
+    @staticmethod
+    def _count_ops(node, seen):
+        """
+        Number of distinct op nodes in an op-tree
+        """
+        if not isinstance(node, OpTreeNode) or id(node) in seen:
+            return 0
+        seen.add(id(node))
+        return 1 + OpTreeNode._count_ops(node[1], seen) + OpTreeNode._count_ops(node[2], seen)
+
     @staticmethod
     def build(op, a, b, out=None, **kwargs):
         """
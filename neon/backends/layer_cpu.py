@@ -16,6 +16,7 @@
 CPU backend layers
 """
 import math
+import numpy as np
 from operator import mul
 
 
@@ -39,6 +40,128 @@ def output_dim(X, S, padding, strides):
     return (X - S + 2 * padding)/strides + 1
 
 
+def window_lut(X, S, Q, padding, strides):
+    """
+    compute along 1 dimension the input index read by each window element at
+    each output position
+
+    Arguments:
+        X (int): input data dimension
+        S (int): filter (window) dimension
+        Q (int): output dimension
+        padding (int): padding on each side
+        strides (int): striding
+
+    Returns:
+        (lut, valid): arrays of shape (S, Q).  lut holds the input index
+                      clipped to range(X), valid is False where the element
+                      falls into the padding.
+    """
+    x = np.arange(S)[:, None] + np.arange(Q)[None, :] * strides - padding
+    valid = (x >= 0) & (x < X)
+    return np.clip(x, 0, X - 1).astype(np.intp), valid
+
+
+def spatial_lut(DHW, TRS, MPQ, padding, strides):
+    """
+    compute the flat (d, h, w) input index read by each window element
+    (t, r, s) at each output position (m, p, q)
+
+    Arguments:
+        DHW (tuple): input dimensions
+        TRS (tuple): filter (window) dimensions
+        MPQ (tuple): output dimensions
+        padding (tuple): padding on each side for each dimension
+        strides (tuple): striding for each dimension
+
+    Returns:
+        (lut, valid): arrays of shape (T * R * S, M, P, Q), see window_lut
+    """
+    D, H, W = DHW
+    T, R, S = TRS
+    M, P, Q = MPQ
+
+    d, valid_d = window_lut(D, T, M, padding[0], strides[0])
+    h, valid_h = window_lut(H, R, P, padding[1], strides[1])
+    w, valid_w = window_lut(W, S, Q, padding[2], strides[2])
+
+    lut = ((d[:, None, None, :, None, None] * H +
+            h[None, :, None, None, :, None]) * W +
+           w[None, None, :, None, None, :])
+    valid = (valid_d[:, None, None, :, None, None] &
+             valid_h[None, :, None, None, :, None] &
+             valid_w[None, None, :, None, None, :])
+
+    shape = (T * R * S, M, P, Q)
+    return lut.reshape(shape), valid.reshape(shape)
+
+
+# output tile size of the Winograd F(m x m, 3 x 3) convolution algorithms
+winograd_tiles = {'winograd_2x2': 2, 'winograd_4x4': 4}
+
+conv_algos = ('direct', 'fft') + tuple(sorted(winograd_tiles))
+
+
+def fft_length(n):
+    """
+    smallest 2, 3, 5-smooth integer >= n, a fast transform length for numpy.fft
+    """
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return n
+        n += 1
+
+
+def winograd_matrices(m):
+    """
+    The transforms of the Winograd minimal filtering algorithm F(m, 3)
+    (Lavin & Gray, 2015): y = AT . ((G . g) * (BT . d)) for a 3 tap filter g
+    and an input tile d of m + 2 elements.
+
+    Arguments:
+        m (int): output tile size, 2 or 4
+
+    Returns:
+        (AT, G, BT): float64 arrays of shape (m, m + 2), (m + 2, 3) and
+                     (m + 2, m + 2)
+    """
+    if m == 2:
+        AT = [[1, 1, 1, 0],
+              [0, 1, -1, -1]]
+        G = [[1, 0, 0],
+             [0.5, 0.5, 0.5],
+             [0.5, -0.5, 0.5],
+             [0, 0, 1]]
+        BT = [[1, 0, -1, 0],
+              [0, 1, 1, 0],
+              [0, -1, 1, 0],
+              [0, 1, 0, -1]]
+    elif m == 4:
+        AT = [[1, 1, 1, 1, 1, 0],
+              [0, 1, -1, 2, -2, 0],
+              [0, 1, 1, 4, 4, 0],
+              [0, 1, -1, 8, -8, 1]]
+        G = [[1 / 4., 0, 0],
+             [-1 / 6., -1 / 6., -1 / 6.],
+             [-1 / 6., 1 / 6., -1 / 6.],
+             [1 / 24., 1 / 12., 1 / 6.],
+             [1 / 24., -1 / 12., 1 / 6.],
+             [0, 0, 1]]
+        BT = [[4, 0, -5, 0, 1, 0],
+              [0, -4, -4, 1, 1, 0],
+              [0, 4, -4, -1, 1, 0],
+              [0, -2, -1, 2, 1, 0],
+              [0, 2, -1, -2, 1, 0],
+              [0, 4, 0, -5, 0, 1]]
+    else:
+        raise ValueError("no Winograd transform for output tiles of %d" % m)
+    return np.array(AT, dtype=np.float64), np.array(G), np.array(BT, dtype=np.float64)
+
+
 class ConvLayer(object):
 
     """
@@ -59,6 +182,12 @@ class ConvLayer(object):
 
     padding: amount of zero-padding around the given edge
     strides: factor to step the filters by in a given direction
+
+    algo: algorithm of the conv kernels, one of conv_algos.  'direct' is
+          im2col + gemm, 'fft' multiplies the spectra of the inputs and
+          filters and is limited to unit strides, 'winograd_2x2' and
+          'winograd_4x4' use Winograd F(2x2, 3x3) and F(4x4, 3x3) and are
+          limited to 2D layers with 3x3 filters and unit stride.
     """
 
     def __init__(self, lib, dtype,
@@ -67,7 +196,7 @@ class ConvLayer(object):
                  T=1, R=1, S=1,
                  pad_d=0, pad_h=0, pad_w=0,
                  str_d=1, str_h=1, str_w=1,
-                 bsum=False):
+                 bsum=False, algo='direct'):
 
         # Compute the output spatial dimensions
         M = output_dim(D, T, pad_d, str_d)
@@ -98,29 +227,43 @@ class ConvLayer(object):
         self.sizeO = reduce(mul, self.dimO, 1)
         self.nOut = reduce(mul, self.MPQ, 1) * K
 
-    def fprop_slice(self, q, S, X, padding, strides):
-        qs = q * strides - padding
-        sliceF = []
-        sliceI = []
-        for s in range(S):
-            x = qs + s
-            if x >= 0 and x < X:
-                sliceF.append(s)
-                sliceI.append(x)
-        return sliceF, sliceI
-
-    def bprop_slice(self, x, S, Q, padding, strides):
-        qs = x - (S - padding - 1)
-        sliceF = []
-        sliceO = []
-        for s in range(S):
-            q = qs + s
-            if q % strides == 0:
-                q //= strides
-                if q >= 0 and q < Q:
-                    sliceF.append(S - s - 1)
-                    sliceO.append(q)
-        return sliceF, sliceO
+        self.algo = algo
+
+        self.init_lut()
+
+    @property
+    def algo(self):
+        return self._algo
+
+    @algo.setter
+    def algo(self, algo):
+        if algo not in conv_algos:
+            raise ValueError("unknown convolution algorithm %s" % algo)
+        if not self.supports(algo):
+            raise ValueError("%s does not support this layer geometry" % algo)
+        self._algo = algo
+
+    def supports(self, algo):
+        """
+        Whether the fprop and update kernels of algo can run this layer.
+        """
+        if algo in winograd_tiles:
+            return (self.TRS == (1, 3, 3) and self.DHW[0] == 1 and
+                    self.padding[0] == 0 and self.strides[1:] == (1, 1))
+        if algo == 'fft':
+            return self.strides == (1, 1, 1)
+        return algo in conv_algos
+
+    def init_lut(self):
+        """
+        Precompute the im2col gather table.  fprop_lut[trs, m, p, q] is the
+        flat (d, h, w) input pixel read by filter tap trs at output position
+        (m, p, q).  fprop_lut_pad flags the taps that read padding (zeros),
+        it is None for unpadded layers.
+        """
+        self.fprop_lut, valid = spatial_lut(self.DHW, self.TRS, self.MPQ,
+                                            self.padding, self.strides)
+        self.fprop_lut_pad = None if valid.all() else ~valid
 
 
 class DeconvLayer(ConvLayer):
@@ -194,6 +337,10 @@ class DeconvLayer(ConvLayer):
         # nOut has to change because P and Q are now the inputs
         self.nOut = reduce(mul, self.DHW, 1) * C
 
+        self.algo = 'direct'
+
+        self.init_lut()
+
 
 class PoolLayer(object):
 
@@ -274,11 +421,32 @@ class PoolLayer(object):
         self.sizeO = reduce(mul, self.dimO, 1)
         self.nOut = reduce(mul, self.MPQ, 1) * K
 
-    def pool_slice(self, q, S, X, pad, stride):
-        qs = q * stride - pad
-        sliceI = []
-        for s in range(S):
-            x = qs + s
-            if x >= 0 and x < X:
-                sliceI.append(x)
-        return sliceI
+        # window element that won each max pooling output, written to
+        # argmax_buffer by fprop.  argmax is set by fprop and cleared by the
+        # bprop that follows it, which recomputes it if unset
+        self.argmax = None
+        self.argmax_buffer = None
+
+        self.init_lut()
+
+    def init_lut(self):
+        """
+        Precompute the pooling window gather tables.  fprop_lut_c[j, k] is the
+        input feature map read by window element j of output feature map k and
+        fprop_lut[trs, mpq] is the flat (d, h, w) input pixel read by window
+        element trs at output position mpq.  fprop_lut_pad flags the
+        (j, trs, k, mpq) window elements that fall into the padding, it is None
+        for unpadded layers.  window_size counts the valid elements of each
+        (k, mpq) window.
+        """
+        J, T, R, S = self.JTRS
+
+        self.fprop_lut_c, valid_c = window_lut(self.C, J, self.K,
+                                               self.padding[0], self.strides[0])
+        lut, valid = spatial_lut(self.DHW, (T, R, S), self.MPQ,
+                                 self.padding[1:], self.strides[1:])
+        self.fprop_lut = lut.reshape((T * R * S, -1))
+
+        valid = valid_c[:, None, :, None] & valid.reshape((T * R * S, -1))[None, :, None, :]
+        self.fprop_lut_pad = None if valid.all() else ~valid
+        self.window_size = valid.sum(axis=(0, 1))[:, :, None]
@@ -18,10 +18,20 @@ wraps :mod:`numpy` ndarray and related operations
 """
 
 import numpy as np
+import json
 import logging
+import os
+import platform
 import time
-from neon.backends.backend import Tensor, Backend, OpTreeNode, OpCollection
-from neon.backends.layer_cpu import ConvLayer, DeconvLayer, PoolLayer
+import weakref
+from contextlib import contextmanager
+from functools import partial, wraps
+from multiprocessing.pool import ThreadPool
+from operator import mul
+from neon.backends.backend import Tensor, Backend, OpTreeNode, OpCollection, LRUCache
+from neon.backends.layer_cpu import (ConvLayer, DeconvLayer, PoolLayer, ceil_div, conv_algos,
+                                     fft_length, winograd_matrices, winograd_tiles)
+from numpy.lib.stride_tricks import as_strided
 
 _none_slice = slice(None, None, None)
 
@@ -48,22 +58,31 @@ class CPUTensor(Tensor):
                                          performance increase if values do
                                          not need to be maintained across such
                                          calls
+        rounding (int, optional): number of mantissa bits values written to a
+                                  float16 tensor from float32 computations are
+                                  stochastically rounded to, zero to round to
+                                  nearest.  See NervanaCPU compute_dtype.
 
     See also:
         NervanaCPU class
     """
     _tensor = None
 
+    # scale of the values of an int8 tensor, see NervanaCPU.quantize
+    scale = None
+
     def __init__(self,
                  backend,
                  shape=None,
                  dtype=np.float32,
                  ary=None,
                  name=None,
-                 persist_values=True):
+                 persist_values=True,
+                 rounding=0):
 
         super(CPUTensor, self).__init__(backend, shape, dtype, name,
                                         persist_values)
+        self.rounding = rounding
 
         # supported dtypes
         assert dtype in (np.float16, np.float32, np.float64, np.uint8, np.int8,
@@ -206,7 +225,8 @@ class CPUTensor(Tensor):
         return self.__class__(
             backend=self.backend,
             ary=self._tensor[key],
-            dtype=self._tensor.dtype)
+            dtype=self._tensor.dtype,
+            rounding=self.rounding)
 
     def _assign(self, value):
         """
@@ -238,13 +258,19 @@ class CPUTensor(Tensor):
         Returns:
             self
         """
+        schedule = self.backend.schedule
         if isinstance(value, np.ndarray):
             if value.dtype is not self.dtype:
                 value = value.astype(self.dtype)
             assert value.size == self.size
             if value.ndim < self._min_dims:
                 value = value.reshape(self.shape)
+            if schedule is not None:
+                schedule.escape()
+        elif schedule is not None:
+            schedule.record(partial(self.set, value), ('set', _signature(self), value))
 
+        self.backend.forget_onehot(self._tensor)
         self._tensor[:] = value
         return self
 
@@ -252,6 +278,10 @@ class CPUTensor(Tensor):
         """
         return the array
         """
+        if self.backend.schedule is not None:
+            self.backend.schedule.escape()
+        # the caller can write to the array
+        self.backend.forget_onehot(self._tensor)
         return self._tensor
 
     def asnumpyarray(self):
@@ -262,6 +292,9 @@ class CPUTensor(Tensor):
         Returns:
             numpy.ndarray view or copy of the CPUTensor data.
         """
+        if self.backend.schedule is not None:
+            self.backend.schedule.escape()
+        self.backend.forget_onehot(self._tensor)
         return self._tensor
 
     def take(self, indices, axis=None):
@@ -276,6 +309,8 @@ class CPUTensor(Tensor):
             Tensor: Tensor with selected values
 
         """
+        if self.backend.schedule is not None:
+            self.backend.schedule.escape()
         if type(indices) == self.__class__:
             indices = indices._tensor
         # if indices are nx1 or 1xn, much of our code assumes these dims are
@@ -297,6 +332,10 @@ class CPUTensor(Tensor):
         Return:
             CPUTensor: updated view of the data.
         """
+        if self.backend.schedule is not None:
+            self.backend.schedule.record(partial(self.fill, value),
+                                         ('fill', _signature(self), value))
+        self.backend.forget_onehot(self._tensor)
         self._tensor.fill(value)
         return self
 
@@ -330,7 +369,8 @@ class CPUTensor(Tensor):
         return self.__class__(
             backend=self.backend,
             ary=self._tensor.reshape(shape),
-            dtype=self._tensor.dtype)
+            dtype=self._tensor.dtype,
+            rounding=self.rounding)
 
     @property
     def T(self):
@@ -352,7 +392,8 @@ class CPUTensor(Tensor):
         return self.__class__(
             backend=self.backend,
             ary=ary,
-            dtype=self._tensor.dtype)
+            dtype=self._tensor.dtype,
+            rounding=self.rounding)
 
     def transpose(self, out=None):
         """
@@ -478,6 +519,1014 @@ numpy_call_dict = {
 }
 
 
+def _sig_out(left, out):
+    np.negative(left, out)
+    np.exp(out, out)
+    np.add(out, 1., out)
+    return np.divide(1., out, out)
+
+
+def _sig2_out(left, out):
+    np.negative(left, out)
+    np.exp2(out, out)
+    np.add(out, 1., out)
+    return np.divide(1., out, out)
+
+
+def _safelog_out(left, out):
+    np.maximum(left, np.exp(-50.), out)
+    return np.log(out, out)
+
+
+# same operations as numpy_call_dict, writing into a given output array
+numpy_out_call_dict = {
+    # unary ops
+    "neg": np.negative,
+    "abs": np.abs,
+    "sgn": np.sign,
+    "sqrt": np.sqrt,
+    "sqr": np.square,
+    "exp": np.exp,
+    "log": np.log,
+    "safelog": _safelog_out,
+    "exp2": np.exp2,
+    "log2": np.log2,
+    "sig": _sig_out,
+    "sig2": _sig2_out,
+    "tanh": np.tanh,
+    # binary ops
+    "add": np.add,
+    "sub": np.subtract,
+    "mul": np.multiply,
+    "div": np.divide,
+    "eq": np.equal,
+    "ne": np.not_equal,
+    "lt": np.less,
+    "le": np.less_equal,
+    "gt": np.greater,
+    "ge": np.greater_equal,
+    "pow": np.power,
+    "minimum": np.minimum,
+    "maximum": np.maximum,
+    "dot": np.dot,
+    # reduction ops
+    "sum": lambda op_dict, left, out: np.sum(left, axis=op_dict['axis'], keepdims=True, out=out),
+    "max": lambda op_dict, left, out: np.max(left, axis=op_dict['axis'], keepdims=True, out=out),
+    "min": lambda op_dict, left, out: np.min(left, axis=op_dict['axis'], keepdims=True, out=out),
+}
+
+
+def _stacked_dot(a, b, out=None):
+    """
+    out[..., :, :] = dot(a[..., :, :], b[..., :, :]) over the leading axes of
+    two stacks of matrices, either of which may also be a single matrix
+    shared by the whole stack.  Uses matmul where numpy has it.  Otherwise a
+    shared matrix makes it a single gemm, with the stack folded into the rows
+    of a or the columns of b, and two stacks take a gemm per matrix.
+    """
+    if hasattr(np, 'matmul'):
+        return np.matmul(a, b, out)
+    lead = a.shape[:-2] if a.ndim > 2 else b.shape[:-2]
+    dtype = np.result_type(a, b)
+    if out is None:
+        out = np.empty(lead + (a.shape[-2], b.shape[-1]), dtype=dtype)
+    if b.ndim == 2:
+        rows = a.reshape((-1, a.shape[-1]))
+        if out.flags['C_CONTIGUOUS'] and out.dtype == dtype:
+            np.dot(rows, b, out.reshape((-1, out.shape[-1])))
+        else:
+            out[...] = np.dot(rows, b).reshape(out.shape)
+    elif a.ndim == 2:
+        cols = np.rollaxis(b, -2).reshape((b.shape[-2], -1))
+        prod = np.dot(a, cols).reshape((a.shape[0], ) + lead + (b.shape[-1], ))
+        out[...] = np.rollaxis(prod, 0, -1)
+    elif out.flags['C_CONTIGUOUS'] and out.dtype == dtype:
+        for idx in np.ndindex(*lead):
+            np.dot(a[idx], b[idx], out[idx])
+    else:
+        for idx in np.ndindex(*lead):
+            out[idx] = np.dot(a[idx], b[idx])
+    return out
+
+
+def _rounding_bits(rounding, dtype):
+    """
+    Mantissa bits the values written to a tensor of dtype with the given
+    rounding attribute are stochastically rounded to, 0 for none.  As on the
+    gpu True means the 10 bits of float16.  Only float16 tensors are rounded.
+    """
+    if not rounding or np.dtype(dtype) != np.float16:
+        return 0
+    return 10 if rounding is True else max(1, min(rounding, 10))
+
+
+def _stochastic_round(ary, bits, rng, out):
+    """
+    Write ary into out rounded to bits mantissa bits at random, up with the
+    probability of the dropped fraction, so that the rounding is unbiased.
+    Like the gpu kernels, random bits are added to the float32 value below
+    its kept mantissa, which is then truncated.
+    """
+    x = np.asarray(ary, dtype=np.float32)
+    drop = 23 - bits
+    r = np.asarray(rng.randint(0, 1 << drop, size=x.shape), dtype=np.uint32)
+    r += x.view(np.uint32)
+    r &= np.uint32(0xffffffff ^ ((1 << drop) - 1))
+    # the carry would turn inf into nan
+    np.copyto(r, x.view(np.uint32), where=~np.isfinite(x))
+    out[...] = r.view(np.float32)
+
+
+# inner dimension of the products of int8 matrices that are exact in float32
+int8_dot_chunk = 2 ** 24 // 127 ** 2
+
+
+def _cast_out(left, out):
+    out[:] = left
+    return out
+
+
+def _is_onehot(optree):
+    """
+    True for the assignment of a onehot op-tree
+    """
+    return (len(optree) == 3 and isinstance(optree[2], OpTreeNode) and
+            optree[2][0]['op'] == 'onehot')
+
+
+def _memory(ary):
+    """
+    The array owning the memory of array ary
+    """
+    return ary if ary.base is None else ary.base
+
+
+def _postfix_nodes(optree, nodes):
+    """
+    The op-tree node of every op in the post-order stack of an op-tree, None
+    for its operands.
+    """
+    for operand in optree[1:]:
+        if isinstance(operand, OpTreeNode):
+            _postfix_nodes(operand, nodes)
+        elif operand is not None:
+            nodes.append(None)
+    nodes.append(optree)
+    return nodes
+
+
+def _scalar_class(value):
+    """
+    What the compiled plan of an op-tree depends on of a scalar operand: its
+    type and the smallest dtype holding it, which numpy casts arrays by
+    """
+    return (type(value), np.min_scalar_type(value))
+
+
+def _plan_key(postfix, nodes, tensor_index_map):
+    """
+    Structure of an optimized op-tree a plan is compiled from: its ops and
+    the op nodes they share, its tensors and the class of its scalars
+    """
+    key = []
+    first = {}
+    for pos, p in enumerate(postfix):
+        if isinstance(p, dict):
+            key.append((p['op'], p.get('axis'), first.setdefault(id(nodes[pos]), pos)))
+        elif isinstance(p, Tensor):
+            key.append((tensor_index_map[p], p.shape))
+        else:
+            key.append(_scalar_class(p))
+    return tuple(key)
+
+
+class OpTreePlan(object):
+
+    """
+    An op-tree compiled into a fixed sequence of numpy calls.
+
+    Every intermediate result is written with an `out=` call into a scratch
+    buffer, and elementwise ops reuse the buffer of an operand that is no
+    longer needed, so evaluating the tree allocates no temporaries.  Trees
+    made only of elementwise ops are evaluated in blocks of rows of the
+    output, which keeps the scratch buffers cache sized, and their last op
+    writes straight into the output tensor.  Scratch buffers come from the
+    backend's ScratchArena.
+
+    Trees whose reductions all keep the same axis of the output are
+    separable along that axis, and large ones are evaluated in slices of it
+    on a pool of threads.  Slicing does not change the value of any element,
+    so the result is the same as the serial one.  A tree whose root reduces
+    a large operand along its only separable axis (e.g. the sum of all
+    elements) is reduced in fixed blocks of that axis whose results are then
+    combined.  The blocks depend only on the shapes of the tree, not on the
+    number of threads, so neither does the result.
+
+    A plan is built from the postfix stack of an op-tree along with the value
+    of every stack entry from one interpreted evaluation, which fixes the
+    shape and dtype of each node.  It can then evaluate any op-tree with the
+    same intrinsic key and tensor dtypes.  Scalar operands are inputs of the
+    plan like tensors: the constants of an op-tree with other scalars are
+    found by constants and passed to the call.
+
+    Tensors the traced evaluation read in a wider dtype than they are stored
+    in (see NervanaCPU compute_dtype) are upcast into scratch buffers one
+    block at a time.  The result is stochastically rounded as it is written
+    to the output if the plan is built with rounding, which keeps it serial.
+
+    Arguments:
+        postfix (list): post-order stack of the op-tree
+        nodes (list): op-tree node of every op in postfix
+        tensor_index_map (dict): tensor indices from OpTreeNode.intrinsic_key_maps
+        values (list): value of every postfix entry in the traced evaluation
+        block_bytes (int): target size of a scratch buffer in blocked evaluation
+        thread_bytes (int): size of the largest array of a tree from which it
+                            is split across threads
+        rounding (int, optional): rounding attribute of the output tensor
+        rng (RandomState, optional): random numbers of stochastic rounding
+        scalars (tuple, optional): scalar operands of the op-tree the plan is
+                                   compiled for, before optimization
+    """
+
+    def __init__(self, postfix, nodes, tensor_index_map, values, block_bytes, thread_bytes,
+                 rounding=0, rng=None, scalars=()):
+        assert postfix[-1]['op'] == 'assign'
+        out = values[0]
+        self.key = _plan_key(postfix, nodes, tensor_index_map)
+        self.scalars = scalars
+        self.last = (None, None)
+
+        # argument registers of every op.  An op node shared by several
+        # parents (see OpTreeNode.optimize) is evaluated once, the postfix
+        # entries of its later occurrences are skipped.
+        stack = []
+        args = {}
+        first = {}
+        skip = set()
+        for pos, p in enumerate(postfix[:-1]):
+            start = pos
+            if isinstance(p, dict):
+                nargs = 2 if p['op'] in OpCollection.binary_ops else 1
+                operands = stack[-nargs:]
+                del stack[-nargs:]
+                args[pos] = [reg for reg, _ in operands]
+                start = operands[0][1]
+                if id(nodes[pos]) in first:
+                    skip.update(range(start, pos + 1))
+                    stack.append((first[id(nodes[pos])], start))
+                    continue
+                first[id(nodes[pos])] = pos
+            stack.append((pos, start))
+        rhs = stack[-1][0]
+
+        # mantissa bits the result is stochastically rounded to
+        self.rounding = 0
+        if isinstance(values[rhs], np.ndarray) and values[rhs].dtype != out.dtype:
+            self.rounding = _rounding_bits(rounding, out.dtype)
+        self.rng = rng
+
+        # when each register is last read
+        last_use = {}
+        for pos in sorted(args):
+            if pos not in skip:
+                for a in args[pos]:
+                    last_use[a] = pos
+        last_use[rhs] = len(postfix)
+
+        ops = [postfix[pos]['op'] for pos in args if pos not in skip]
+        elementwise = all(op in OpCollection.ew_ops - OpCollection.zero_operand_ops
+                          for op in ops)
+        reductions = [pos for pos in args
+                      if pos not in skip and postfix[pos]['op'] in OpCollection.reduction_ops]
+        arrays = [v for pos, v in enumerate(values[:-1])
+                  if pos not in skip and isinstance(v, np.ndarray)]
+        self.work_bytes = max([v.nbytes for v in arrays])
+
+        def spans(axis, extent):
+            return all(v.ndim == 2 and v.shape[axis] in (1, extent) for v in arrays)
+
+        # the axis the tree is evaluated in slices of, and for a root
+        # reduction along it, its op
+        self.axis = None
+        self.combine = None
+        ref = out
+        if isinstance(values[rhs], np.ndarray) and values[rhs].shape == out.shape:
+            if elementwise:
+                self.axis = 0
+            elif all(op in OpCollection.ew_ops - OpCollection.zero_operand_ops or
+                     op in OpCollection.reduction_ops for op in ops):
+                for axis in (0, 1):
+                    if (out.ndim == 2 and out.shape[axis] > 1 and spans(axis, out.shape[axis]) and
+                            all(postfix[pos]['axis'] == 1 - axis for pos in reductions)):
+                        self.axis = axis
+                        break
+
+        # otherwise a reduction at the root, possibly followed by unary ops
+        # and reductions of its result as in be.sum(x) or
+        # be.sqrt(be.sum(be.square(x))), may be evaluated in blocks of the
+        # axis it reduces.  The ops after it run once on the combined result.
+        tail = []
+        pos = rhs
+        while pos in args and (postfix[pos]['op'] in OpCollection.reduction_ops or
+                               postfix[pos]['op'] in OpCollection.unary_ops & OpCollection.ew_ops):
+            tail.append(pos)
+            pos = args[pos][0]
+        while tail and tail[-1] not in reductions:
+            tail.pop()
+        self.post = []
+        self.reduce_arg = None
+        if (self.axis is None and tail and set(reductions) <= set(tail) and
+                self.work_bytes >= thread_bytes and
+                isinstance(values[args[tail[-1]][0]], np.ndarray) and
+                all(op in OpCollection.ew_ops - OpCollection.zero_operand_ops or
+                    op in OpCollection.reduction_ops for op in ops)):
+            node = postfix[tail[-1]]
+            operand = values[args[tail[-1]][0]]
+            axis = node['axis']
+            if axis is None and node['op'] in ('sum', 'max', 'min') and operand.ndim == 2:
+                axis = 0 if operand.shape[0] > 1 else 1
+            if axis is not None and operand.shape[axis] > 1 and spans(axis, operand.shape[axis]):
+                ref = operand
+                self.axis = axis
+                self.combine = node
+                self.reduce_arg = args[tail[-1]][0]
+                for pos in reversed(tail[:-1]):
+                    fn = numpy_call_dict[postfix[pos]['op']]
+                    if postfix[pos]['op'] in OpCollection.reduction_ops:
+                        fn = partial(fn, postfix[pos])
+                    self.post.append(fn)
+                skip.update(tail)
+        self.extent = ref.shape[self.axis] if self.axis is not None else 0
+
+        # extent of the slices of serial evaluation
+        self.block = self.extent
+        if self.axis is not None and (elementwise or self.combine is not None):
+            slice_bytes = ref.size // self.extent * max([v.itemsize for v in arrays])
+            self.block = max(1, min(self.extent, block_bytes // max(slice_bytes, 1)))
+        self.parallel = (self.axis is not None and self.work_bytes >= thread_bytes and
+                         not self.rounding)
+
+        def sliced(v):
+            return (self.axis is not None and v.ndim == ref.ndim and
+                    v.shape[self.axis] == self.extent)
+
+        # registers hold the value of each postfix entry, constants and
+        # scalar only subtrees are folded in at compile time, and recomputed
+        # by constants for other scalars
+        self.consts = [None] * len(postfix)
+        self.inputs = []
+        self.steps = []
+        self.scalar_leaves = []
+        self.scalar_steps = []
+        self.liftable = True
+        self.rhs = rhs
+
+        owner = {}  # register -> scratch buffer it lives in
+        free = []
+        specs = []
+        direct = (elementwise and rhs in args and postfix[rhs]['op'] in numpy_out_call_dict and
+                  isinstance(values[rhs], np.ndarray) and
+                  values[rhs].shape == out.shape and not self.rounding and
+                  np.can_cast(values[rhs].dtype, out.dtype, 'same_kind'))
+        self.direct = direct
+        pinned = set()
+
+        def release(reg):
+            buf = owner.pop(reg)
+            if buf not in pinned:
+                free.append(buf)
+
+        def allocate(value):
+            spec = (value.shape, value.dtype, sliced(value))
+            buf = next((b for b in free if specs[b] == spec), None)
+            if buf is None:
+                buf = len(specs)
+                specs.append(spec)
+            else:
+                free.remove(buf)
+            return buf
+
+        for pos, p in enumerate(postfix[:-1]):
+            if pos in skip:
+                continue
+            value = values[pos]
+            if isinstance(p, Tensor):
+                self.inputs.append((pos, tensor_index_map[p], sliced(value)))
+                if value.dtype != p._tensor.dtype:
+                    owner[pos] = allocate(value)
+                    self.steps.append((pos, _cast_out, [pos], owner[pos], sliced(value)))
+                continue
+            if not isinstance(p, dict):
+                self.consts[pos] = value
+                self.scalar_leaves.append(pos)
+                continue
+            if not isinstance(value, np.ndarray):
+                self.consts[pos] = value
+                fn = numpy_call_dict[p['op']]
+                if p['op'] in OpCollection.reduction_ops:
+                    fn = partial(fn, p)
+                self.scalar_steps.append((pos, fn, args[pos]))
+                # a scalar computed from a tensor can not be recomputed
+                if any(isinstance(values[a], np.ndarray) for a in args[pos]):
+                    self.liftable = False
+                continue
+
+            op = p['op']
+            dead = [a for a in set(args[pos]) if last_use[a] == pos and a in owner]
+            if op in numpy_out_call_dict:
+                fn = numpy_out_call_dict[op]
+                if op in OpCollection.reduction_ops:
+                    fn = partial(fn, p)
+                if op in OpCollection.ew_ops:
+                    # operands die before the result is written, so it can
+                    # take the place of one of them
+                    for a in dead:
+                        release(a)
+                if pos == rhs and direct:
+                    buf = -1
+                else:
+                    buf = owner[pos] = allocate(value)
+                self.steps.append((pos, fn, args[pos], buf, sliced(value)))
+            else:
+                fn = numpy_call_dict[op]
+                if op in OpCollection.reduction_ops:
+                    fn = partial(fn, p)
+                if op == 'transpose' and args[pos][0] in owner:
+                    # a view of its operand, it takes over the buffer, or
+                    # keeps it for good if the operand is read again later
+                    if dead:
+                        owner[pos] = owner.pop(args[pos][0])
+                        dead = []
+                    else:
+                        pinned.add(owner[args[pos][0]])
+                self.steps.append((pos, fn, args[pos], None, False))
+            for a in dead:
+                if a in owner:
+                    release(a)
+
+        self.specs = specs
+
+    def constants(self, postfix):
+        """
+        Registers of the constants of the plan for the postfix stack of an
+        optimized op-tree with the same plan key but other scalars
+        """
+        consts = list(self.consts)
+        for pos in self.scalar_leaves:
+            consts[pos] = postfix[pos]
+        for pos, fn, args in self.scalar_steps:
+            consts[pos] = fn(*[consts[a] for a in args])
+        return consts
+
+    def __call__(self, arrays, scratch, pool=None, num_threads=1, consts=None):
+        """
+        Evaluate the plan on the arrays of the tensors of an op-tree, ordered
+        by their intrinsic key index.  The output is arrays[0].
+
+        Arguments:
+            arrays (list): ndarrays of the op-tree's tensors
+            scratch (ScratchArena): arena the scratch buffers are taken from
+            pool (ThreadPool, optional): threads to evaluate slices of a
+                                         large tree on
+            num_threads (int, optional): number of threads in pool
+            consts (list, optional): registers of the constants, from
+                                     constants, the ones of the traced
+                                     op-tree by default
+
+        Returns:
+            bool: False if the plan could not be used because the output
+                  overlaps an input without being the very same array
+        """
+        out = arrays[0]
+        if consts is None:
+            consts = self.consts
+        threaded = pool is not None and self.parallel
+        block = self.block
+        if threaded and block == self.extent and self.combine is None:
+            block = -(-self.extent // num_threads)
+
+        blocks = None
+        if block < self.extent or self.combine is not None:
+            blocks = [(lo, min(self.extent, lo + block)) for lo in range(0, self.extent, block)]
+        if blocks is not None or self.direct:
+            for a in arrays[1:]:
+                if a is not out and np.may_share_memory(a, out):
+                    return False
+
+        if blocks is None and not self.specs:
+            self.evaluate(out, arrays, consts, [])
+            return True
+
+        # contiguous runs of blocks, one per thread
+        tasks = [blocks]
+        if threaded and blocks is not None:
+            n = min(num_threads, len(blocks))
+            tasks = [blocks[k * len(blocks) // n:(k + 1) * len(blocks) // n] for k in range(n)]
+        partials = [None] * len(blocks) if self.combine is not None else None
+
+        with scratch.scope():
+            buffers = [[scratch.empty(self.buffer_shape(shape, rows, block), dtype)
+                        for shape, dtype, rows in self.specs] for _ in tasks]
+            if len(tasks) == 1:
+                self.evaluate(out, arrays, consts, buffers[0], tasks[0], partials)
+            else:
+                pool.map(lambda k: self.evaluate(out, arrays, consts, buffers[k], tasks[k],
+                                                 partials),
+                         range(len(tasks)))
+        if self.combine is not None:
+            value = self.combine_blocks(partials)
+            for fn in self.post:
+                value = fn(value)
+            self.store(out, value)
+        return True
+
+    def buffer_shape(self, shape, rows, block):
+        """
+        Shape of a scratch buffer, holding a slice of block along the
+        partition axis for sliced values
+        """
+        if not rows:
+            return shape
+        return shape[:self.axis] + (block, ) + shape[self.axis + 1:]
+
+    def evaluate(self, out, arrays, consts, buffers, blocks=None, partials=None):
+        """
+        Run the steps of the plan on the whole arrays, or on each (lo, hi)
+        slice in blocks of the partition axis
+        """
+        if blocks is None:
+            regs = list(consts)
+            for pos, i, _ in self.inputs:
+                regs[pos] = arrays[i]
+            for pos, fn, args, buf, _ in self.steps:
+                a = [regs[i] for i in args]
+                if buf is None:
+                    regs[pos] = fn(*a)
+                else:
+                    regs[pos] = fn(*(a + [out if buf < 0 else buffers[buf]]))
+            if not self.direct:
+                self.store(out, regs[self.rhs])
+            return
+
+        lead = (slice(None), ) * self.axis
+        for lo, hi in blocks:
+            index = lead + (slice(lo, hi), )
+            head = lead + (slice(0, hi - lo), )
+            regs = list(consts)
+            for pos, i, rows in self.inputs:
+                regs[pos] = arrays[i][index] if rows else arrays[i]
+            for pos, fn, args, buf, rows in self.steps:
+                a = [regs[i] for i in args]
+                if buf is None:
+                    regs[pos] = fn(*a)
+                elif buf < 0:
+                    regs[pos] = fn(*(a + [out[index]]))
+                else:
+                    regs[pos] = fn(*(a + [buffers[buf][head] if rows else buffers[buf]]))
+            if self.combine is not None:
+                partials[lo // self.block] = self.reduce_block(regs[self.reduce_arg], lo)
+            elif not self.direct:
+                self.store(out[index], regs[self.rhs])
+
+    def store(self, out, value):
+        """
+        Write the value of the tree into out, the output or a block of it
+        """
+        if self.rounding:
+            _stochastic_round(value, self.rounding, self.rng, out)
+        else:
+            out[:] = value
+
+    def reduce_block(self, x, lo):
+        """
+        Root reduction of the block of its operand starting at lo, along
+        with the extreme values for argmax and argmin
+        """
+        op = self.combine['op']
+        if op in ('argmax', 'argmin'):
+            extreme = numpy_call_dict['max' if op == 'argmax' else 'min'](self.combine, x)
+            return extreme, numpy_call_dict[op](self.combine, x) + lo
+        return numpy_call_dict[op](self.combine, x)
+
+    def combine_blocks(self, partials):
+        """
+        Root reduction of the whole operand from the results of its blocks
+        """
+        op = self.combine['op']
+        if op in ('argmax', 'argmin'):
+            extremes = np.array([v for v, _ in partials])
+            indices = np.array([i for _, i in partials]).reshape((len(partials), -1))
+            # the first block holding the extreme value has its first index
+            best = numpy_call_dict[op]({'axis': 0}, extremes)
+            return indices[best.ravel(), np.arange(best.size)].reshape(extremes.shape[1:])
+        return numpy_call_dict[op]({'axis': 0}, np.array(partials))[0]
+
+
+class ScratchArena(object):
+
+    """
+    Size-bucketed pool of host memory for the temporaries of NervanaCPU
+    kernels.
+
+    Buffers are handed out inside a scope (`with arena.scope():`) and go back
+    to the pool when the scope exits, so each call reuses the memory of the
+    previous ones rather than going back to the allocator for large arrays.
+    Requests are rounded up to power of two buckets of bytes.  Small ones
+    are cheap to allocate and are not pooled.
+
+    The pool owns at most budget bytes, dropping idle buffers of other sizes
+    to make room, and serves requests beyond that with plain allocations.
+
+    Arguments:
+        budget (int): upper bound on the bytes owned by the arena
+        min_bytes (int): smallest request served from the pool
+
+    Attributes:
+        held (int): bytes owned by the arena
+        in_use (int): bytes handed out to open scopes
+        high_water (int): largest in_use seen
+        overflow (int): number of requests that did not fit in the budget
+    """
+
+    def __init__(self, budget, min_bytes=64 * 1024):
+        self.budget = budget
+        self.min_bytes = min_bytes
+        self.free = dict()
+        self.frames = []
+        self.held = 0
+        self.in_use = 0
+        self.high_water = 0
+        self.overflow = 0
+
+    @contextmanager
+    def scope(self):
+        """
+        Context in which buffers are taken from the arena, they are reclaimed
+        on exit.
+        """
+        self.frames.append([])
+        try:
+            yield self
+        finally:
+            for raw in self.frames.pop():
+                self.in_use -= raw.nbytes
+                self.free.setdefault(raw.nbytes, []).append(raw)
+
+    def empty(self, shape, dtype):
+        """
+        Uninitialized array, valid until the innermost open scope exits.
+        """
+        dtype = np.dtype(dtype)
+        if isinstance(shape, (int, long, np.integer)):
+            shape = (shape, )
+        nbytes = reduce(mul, shape, 1) * dtype.itemsize
+        if nbytes < self.min_bytes or not self.frames:
+            return np.empty(shape, dtype=dtype)
+
+        bucket = 1 << (nbytes - 1).bit_length()
+        if self.free.get(bucket):
+            raw = self.free[bucket].pop()
+        else:
+            for size in sorted(self.free, reverse=True):
+                while self.free[size] and self.held + bucket > self.budget:
+                    self.free[size].pop()
+                    self.held -= size
+            if self.held + bucket > self.budget:
+                self.overflow += 1
+                return np.empty(shape, dtype=dtype)
+            raw = np.empty(bucket, dtype=np.uint8)
+            self.held += bucket
+
+        self.frames[-1].append(raw)
+        self.in_use += bucket
+        self.high_water = max(self.high_water, self.in_use)
+        return raw[:nbytes].view(dtype).reshape(shape)
+
+    def zeros(self, shape, dtype):
+        """
+        Zero filled array, valid until the innermost open scope exits.
+        """
+        ary = self.empty(shape, dtype)
+        ary.fill(0)
+        return ary
+
+
+# activation transforms the recurrent cell kernels apply themselves, by the
+# qualified name of their class, so the backend does not import the layers
+_CELL_ACTIVATIONS = {'neon.transforms.activation.Identity': 'identity',
+                     'neon.transforms.activation.Rectlin': 'relu',
+                     'neon.transforms.activation.Tanh': 'tanh',
+                     'neon.transforms.activation.Logistic': 'logistic'}
+
+
+def _cell_activation(activation):
+    """
+    Kind of a recurrent cell activation for _activate and _activation_grad,
+    None if the kernels leave it to its op-trees
+    """
+    cls = type(activation)
+    kind = _CELL_ACTIVATIONS.get(cls.__module__ + '.' + cls.__name__)
+    if kind == 'logistic' and activation.shortcut:
+        # the derivative is taken as 1
+        kind = 'logistic_shortcut'
+    return kind
+
+
+def _host(value):
+    """
+    The array of a tensor argument, or the argument itself if it is a
+    number
+    """
+    return value._tensor if isinstance(value, CPUTensor) else value
+
+
+def _activate(kind, ary):
+    """
+    Apply a recurrent cell activation of the given kind to ary in place
+    """
+    if kind == 'tanh':
+        np.tanh(ary, ary)
+    elif kind in ('logistic', 'logistic_shortcut'):
+        np.negative(ary, ary)
+        np.exp(ary, ary)
+        ary += 1.0
+        np.reciprocal(ary, ary)
+    elif kind == 'relu':
+        np.maximum(ary, 0, ary)
+
+
+def _activation_grad(kind, ary, out):
+    """
+    Write the derivative of a recurrent cell activation of the given kind,
+    from its output ary, to out
+    """
+    if kind == 'tanh':
+        np.multiply(ary, ary, out)
+        np.subtract(1.0, out, out)
+    elif kind == 'logistic':
+        np.subtract(1.0, ary, out)
+        out *= ary
+    elif kind == 'relu':
+        np.greater(ary, 0, out)
+    else:
+        out.fill(1)
+
+
+def scratch_scope(func):
+    """
+    Decorator for NervanaCPU kernels, the scratch buffers they take from the
+    backend's arena are reclaimed when they return.
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.scratch.scope():
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+def _signature(value):
+    """
+    Hashable description of an argument of a recorded call, tensors and
+    arrays are described by the memory they cover.
+    """
+    if isinstance(value, CPUTensor):
+        value = value._tensor
+    if isinstance(value, np.ndarray):
+        return (value.__array_interface__['data'][0], value.shape, value.strides,
+                value.dtype.str)
+    if isinstance(value, (list, tuple)):
+        return tuple(_signature(v) for v in value)
+    if isinstance(value, (int, long, float, bool, str, np.number, np.dtype, type)) or \
+            value is None:
+        return value
+    return id(value)
+
+
+class StepSchedule(object):
+
+    """
+    Flat schedule of the backend calls made by a step of computation, as
+    recorded by NervanaCPU.capture.  Calling the schedule makes the same
+    kernel calls and evaluates the same compiled op-trees on the same
+    buffers, without running the code that built them.
+
+    Attributes:
+        calls (list): the recorded calls, in order
+        signature (list): description of every call.  Two steps with equal
+                          signatures make the same calls on the same memory.
+        replayable (bool): False if the step read tensors to the host, wrote
+                           host data to them, or allocated initialized
+                           tensors, none of which a replay reproduces
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.signature = []
+        self.replayable = True
+        self.depth = 0
+
+    def __call__(self):
+        for call in self.calls:
+            call()
+
+    def record(self, call, signature):
+        """
+        Add a call made outside of any other recorded call
+        """
+        if not self.depth:
+            self.calls.append(call)
+            self.signature.append(signature)
+
+    def escape(self):
+        """
+        Note an operation outside of any recorded call that a replay would not
+        reproduce
+        """
+        if not self.depth:
+            self.replayable = False
+
+
+def _forget_onehots(backend, values):
+    """
+    Note a kernel call that may write to any of the tensors in values
+    """
+    for value in values:
+        if isinstance(value, CPUTensor):
+            backend.forget_onehot(value._tensor)
+        elif isinstance(value, (list, tuple)):
+            _forget_onehots(backend, value)
+
+
+def recorded(func):
+    """
+    Decorator for NervanaCPU kernels, their calls are added to the schedule
+    of a step under capture.  The onehots last written to their tensor
+    arguments are forgotten, as kernels write through the arrays.
+    """
+    def call(self, *args, **kwargs):
+        if self.onehot_set:
+            _forget_onehots(self, args)
+            _forget_onehots(self, kwargs.values())
+        return func(self, *args, **kwargs)
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        schedule = self.schedule
+        if schedule is None:
+            return call(self, *args, **kwargs)
+        schedule.record(partial(call, self, *args, **kwargs),
+                        (func.__name__, _signature(args), _signature(sorted(kwargs.items()))))
+        schedule.depth += 1
+        try:
+            return call(self, *args, **kwargs)
+        finally:
+            schedule.depth -= 1
+    return wrapper
+
+
+def _cpu_model():
+    """
+    Name of the host processor, part of the keys of the autotuner cache.
+    """
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except IOError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+class ConvAutotuner(object):
+
+    """
+    Picks the convolution algorithm of each ConvLayer geometry by timing the
+    fprop, bprop and update kernels of every algorithm the layer supports.
+    The choices are kept in a JSON file keyed by CPU model, dtype and layer
+    geometry, so later runs and other processes start from them.
+
+    Arguments:
+        mode (str): 'off' leaves layers on the direct algorithm, 'cached'
+                    tunes the geometries missing from the cache, 'retune'
+                    tunes every geometry once per process and overwrites the
+                    cached choice
+        path (str): cache file, defaults to ~/nervana/cache/conv_autotune.json
+        repeats (int): timed runs of each algorithm, the fastest one counts
+    """
+
+    modes = ('off', 'cached', 'retune')
+
+    def __init__(self, mode='off', path=None, repeats=2):
+        if mode not in self.modes:
+            raise ValueError("conv_autotune must be one of %s" % (self.modes, ))
+        self.mode = mode
+        if path is None:
+            path = os.path.join('~', 'nervana', 'cache', 'conv_autotune.json')
+        self.path = os.path.expandvars(os.path.expanduser(path))
+        self.repeats = repeats
+        self.cpu = _cpu_model()
+        self.choices = None
+        self.tuned = set()
+
+    def key(self, layer, dtype):
+        """
+        Cache key of a layer geometry on this host.
+        """
+        geometry = layer.NCK + layer.DHW + layer.TRS + layer.padding + layer.strides
+        return '%s|%s|%s' % (self.cpu, np.dtype(dtype).name, ','.join(map(str, geometry)))
+
+    def choose(self, be, layer, dtype):
+        """
+        Algorithm for a layer: the cached choice, or the fastest one when the
+        geometry has not been tuned yet.
+
+        Arguments:
+            be (NervanaCPU): backend running the timed kernels
+            layer (ConvLayer): the conv layer as a parameter object
+            dtype (dtype): data type of the layer's tensors
+
+        Returns:
+            str: one of conv_algos
+        """
+        if self.mode == 'off':
+            return 'direct'
+
+        key = self.key(layer, dtype)
+        if self.choices is None:
+            self.choices = self.load()
+        algo = self.choices.get(key)
+        if algo in conv_algos and layer.supports(algo) and \
+                (self.mode == 'cached' or key in self.tuned):
+            logger.debug("conv autotune %s: %s (cached)", key, algo)
+            return algo
+
+        times = self.benchmark(be, layer, dtype)
+        algo = min(times, key=times.get)
+        self.choices[key] = algo
+        self.tuned.add(key)
+        self.save(key, algo)
+        logger.info("conv autotune %s: %s (%s)", key, algo,
+                    ', '.join('%s %.2fms' % (a, t * 1000) for a, t in sorted(times.items())))
+        return algo
+
+    def benchmark(self, be, layer, dtype):
+        """
+        Seconds taken by a training step (fprop, bprop and update) of a layer
+        with each of the algorithms it supports.  Filter transforms are not
+        reused between the timed steps since the weights change every step.
+        """
+        rng = np.random.RandomState(0)
+        inputs = be.array(rng.uniform(-1, 1, layer.dimI2), dtype=dtype)
+        filters = be.array(rng.uniform(-1, 1, layer.dimF2), dtype=dtype)
+        errors = be.array(rng.uniform(-1, 1, layer.dimO2), dtype=dtype)
+        outputs = be.empty(layer.dimO2, dtype=dtype)
+        deltas = be.empty(layer.dimI2, dtype=dtype)
+        updates = be.empty(layer.dimF2, dtype=dtype)
+
+        times = dict()
+        for algo in conv_algos:
+            if not layer.supports(algo):
+                continue
+            layer.algo = algo
+            # the first run warms up the scratch arena
+            for i in range(self.repeats + 1):
+                start = time.time()
+                be.fprop_conv(layer, inputs, filters, outputs)
+                be.bprop_conv(layer, filters, errors, deltas)
+                be.update_conv(layer, inputs, errors, updates)
+                if i:
+                    times[algo] = min(times.get(algo, np.inf), time.time() - start)
+        return times
+
+    def load(self):
+        """
+        The choices in the cache file, empty if it does not exist yet.
+        """
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return dict()
+
+    def save(self, key, algo):
+        """
+        Add a choice to the cache file.  The file is reread so choices written
+        by other processes are kept, and replaced in one rename.
+        """
+        choices = self.load()
+        choices[key] = algo
+        tmp = '%s.%d' % (self.path, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            with open(tmp, 'w') as f:
+                json.dump(choices, f, indent=1, sort_keys=True)
+            os.rename(tmp, self.path)
+        except (IOError, OSError) as e:
+            logger.warning("could not write conv autotune cache %s: %s", self.path, e)
+
+
 class NervanaCPU(Backend):
 
     """
@@ -486,6 +1535,8 @@ class NervanaCPU(Backend):
 
     Attributes:
         default_dtype (dtype): default element data type.
+        compute_dtype (dtype): data type float16 tensors are computed in,
+                               None to compute them in float16
         tensor_cls: underlying Tensor type. For CPU backend, it will be CPU tensor
 
     See also:
@@ -496,17 +1547,75 @@ class NervanaCPU(Backend):
                  rng_seed=None,
                  default_dtype=np.float32,
                  hist_bins=64,
-                 hist_offset=-48):
+                 hist_offset=-48,
+                 conv_block_bytes=256 * 1024 * 1024,
+                 ew_block_bytes=128 * 1024,
+                 scratch_bytes=512 * 1024 * 1024,
+                 num_threads=1,
+                 thread_min_bytes=1024 * 1024,
+                 conv_autotune='off',
+                 conv_autotune_path=None,
+                 compute_dtype=None,
+                 stochastic_round=False):
 
         if default_dtype not in [np.float16, np.float32, np.float64]:
             logger.error('Default data type for nervanagpu '
                          'backend must be float16, 32 or 64')
             raise ValueError
 
+        if compute_dtype not in [None, np.float32, np.float64]:
+            logger.error('Compute data type for nervanacpu '
+                         'backend must be float32 or 64')
+            raise ValueError
+
         super(NervanaCPU, self).__init__(rng_seed, default_dtype)
 
         self.tensor_cls = CPUTensor
 
+        # upper bound on the size of the unfolded (im2col) convolution input,
+        # larger layers are lowered in blocks of output rows
+        self.conv_block_bytes = conv_block_bytes
+
+        # op-trees compiled by execute, keyed by intrinsic key and tensor
+        # dtypes, and the size of their scratch buffers when evaluated in blocks
+        self.optree_plans = LRUCache(4096)
+        self.ew_block_bytes = ew_block_bytes
+
+        # temporaries of the kernels
+        self.scratch = ScratchArena(scratch_bytes)
+
+        # op-trees over arrays of at least thread_min_bytes are split across
+        # num_threads threads, started on first use
+        self.num_threads = num_threads
+        self.thread_min_bytes = thread_min_bytes
+        self._thread_pool = None
+
+        # schedule of the step being captured, see capture
+        self.schedule = None
+
+        # picks the algorithm of conv layers created without one
+        self.autotuner = ConvAutotuner(conv_autotune, conv_autotune_path)
+
+        # the ones of the last onehot written to an array by id of its memory
+        self.onehot_set = dict()
+
+        # [weakref to xvar, inverse standard deviation, eps] of
+        # compound_fprop_bn by id of its xvar, dropped with the xvar of the
+        # batch norm layer
+        self.bn_invstd = dict()
+
+        # float16 tensors are only stored as such, the op-trees and gemms
+        # read them in compute_dtype one block at a time and write their
+        # results back rounded to the mantissa bits of the tensor's rounding
+        # attribute (stochastic_round by default, as on the gpu)
+        self.compute_dtype = None if compute_dtype is None else np.dtype(compute_dtype)
+        if stochastic_round:
+            if stochastic_round is True:
+                stochastic_round = 10
+        else:
+            stochastic_round = 0
+        self.round_mode = stochastic_round
+
         # log
         logger.info("Initialized NervanaCPU")
 
@@ -530,30 +1639,101 @@ class NervanaCPU(Backend):
             optree: (OpTreeNode): the OpTreeNode object that represents all
                                     the operations
         """
-        # deal with onehot specially for now
-        if (len(optree) == 3 and isinstance(optree[2], OpTreeNode) and
-                optree[2][0]['op'] == 'onehot'):
-            assert optree[0]['op'] == 'assign'
-            assert isinstance(optree[1], Tensor)
-            # get the output buffer
-            array_output = optree[1].get()
+        schedule = self.schedule
+        if schedule is None or schedule.depth:
+            return self._execute(optree)
 
-            # get the output shape and onehot representation length will be on
-            # this axis
-            numpy_axis = optree[2][0]['axis']
-            numpy_ind0 = optree[2][0]['idx'].get().squeeze()
-
-            numpy_ind_len = numpy_ind0.size
-            numpy_ind1 = range(numpy_ind_len)
-
-            # ind for indexing
-            numpy_ind = np.zeros((2, numpy_ind_len), dtype=np.int32)
-            numpy_ind[numpy_axis] = numpy_ind0
-            numpy_ind[1 - numpy_axis] = numpy_ind1
-            array_output[:] = 0
-            array_output[numpy_ind.tolist()] = 1
-
-            return array_output
+        schedule.depth += 1
+        try:
+            result = self._execute(optree)
+        finally:
+            schedule.depth -= 1
+
+        # a replay runs the plan the op-tree was compiled to
+        key, tensor_index_map, tensors, scalars = self._optree_key(optree)
+        plan = self.optree_plans.get(key)
+        consts = None
+        if plan is not None:
+            consts = self._plan_constants(plan, optree, tensor_index_map, scalars)
+        if _is_onehot(optree):
+            # a replay can not tell what was written to the output since
+            schedule.record(partial(self._onehot, optree, False),
+                            ('onehot', _signature(list(optree.traverse(list())))))
+        elif consts is None:
+            schedule.record(partial(self._execute, optree),
+                            ('execute', _signature(list(optree.traverse(list())))))
+        else:
+            arrays = [t._tensor for t in tensors]
+            schedule.record(partial(self._replay_plan, plan, arrays, consts, optree),
+                            ('execute', id(plan), _signature(arrays), scalars))
+        return result
+
+    def _optree_key(self, optree):
+        """
+        Key of the compiled plan of an op-tree along with the tensor index map,
+        the tensors in index order and the scalars of the op-tree.  The key
+        only holds the class of the scalars, so op-trees that differ in their
+        scalars, such as updates with a learning rate that changes every
+        step, share a plan.
+        """
+        key, tensor_index_map, index_tensor_map = optree.intrinsic_key_maps()
+        tensors = [index_tensor_map[i] for i in range(len(index_tensor_map))]
+        scalars = tuple(k for k in key if not isinstance(k, (tuple, str)))
+        key = tuple(k if isinstance(k, (tuple, str)) else _scalar_class(k) for k in key)
+        key += tuple(t.dtype for t in tensors)
+        key += (_rounding_bits(tensors[0].rounding, tensors[0].dtype), )
+        return key, tensor_index_map, tensors, scalars
+
+    def _plan_constants(self, plan, optree, tensor_index_map, scalars):
+        """
+        Registers of the constants of a plan for an op-tree with its key,
+        None if the op-tree optimizes to another structure than the plan's
+        """
+        if scalars == plan.scalars:
+            return plan.consts
+        if scalars == plan.last[0]:
+            return plan.last[1]
+        if not plan.liftable:
+            return None
+        optimized = optree.optimize()
+        postfix = optimized.traverse(list())
+        if _plan_key(postfix, _postfix_nodes(optimized, []), tensor_index_map) != plan.key:
+            return None
+        plan.last = (scalars, plan.constants(postfix))
+        return plan.last[1]
+
+    def _replay_plan(self, plan, arrays, consts, optree):
+        """
+        Evaluate a recorded plan, falling back to the op-tree
+        """
+        self.forget_onehot(arrays[0])
+        if not plan(arrays, self.scratch, self.thread_pool, self.num_threads, consts):
+            self._execute(optree)
+
+    def _execute(self, optree):
+        """
+        Evaluate an op-tree
+        """
+        if _is_onehot(optree):
+            return self._onehot(optree, self.schedule is None)
+        self.forget_onehot(optree[1]._tensor)
+
+        # reuse the compiled plan of op-trees with the same intrinsic key
+        key, tensor_index_map, tensors, scalars = self._optree_key(optree)
+        plan = self.optree_plans.get(key)
+        if plan is not None:
+            consts = self._plan_constants(plan, optree, tensor_index_map, scalars)
+            if consts is None:
+                # scalars that optimize to another tree get a plan of
+                # their own
+                plan = None
+            elif self.run_plan(plan, tensors, consts):
+                return tensors[0]
+
+        # the first evaluation of a key interprets the optimized op-tree and
+        # compiles it, later ones only run the plan
+        if plan is None:
+            optree = optree.optimize()
 
         # get post order stack
         postfix_stack = optree.traverse(list())
@@ -561,8 +1741,12 @@ class NervanaCPU(Backend):
         # init compute stack
         compute_stack = []
 
+        # float16 operands are read in the compute dtype
+        upcast = self.compute_dtype
+
         # iterate through postfix stack to compute result
-        for p in postfix_stack:
+        values = []
+        for pos, p in enumerate(postfix_stack[:-1]):
             if isinstance(p, dict):
                 # TODO add rand and onehot here
                 if p['op'] in OpCollection.unary_ops:
@@ -580,13 +1764,107 @@ class NervanaCPU(Backend):
                 else:
                     raise NotImplementedError
             elif isinstance(p, CPUTensor):
-                compute_stack.append(p._tensor)
+                if upcast is not None and pos > 0 and p._tensor.dtype == np.float16:
+                    compute_stack.append(p._tensor.astype(upcast))
+                else:
+                    compute_stack.append(p._tensor)
             else:
                 compute_stack.append(p)
-
-        assert len(compute_stack) == 1
+            values.append(compute_stack[-1])
+
+        assert len(compute_stack) == 2 and postfix_stack[-1]['op'] == 'assign'
+        if plan is None:
+            plan = OpTreePlan(postfix_stack, _postfix_nodes(optree, []), tensor_index_map,
+                              values, self.ew_block_bytes, self.thread_min_bytes,
+                              postfix_stack[0].rounding, self.rng, scalars)
+            self.optree_plans[key] = plan
+            # a root reduction evaluated in blocks rounds differently from
+            # the single numpy call above, the plan computes every result
+            if plan.combine is not None and self.run_plan(plan, tensors):
+                return postfix_stack[0]
+        if plan.rounding:
+            plan.store(compute_stack[0], compute_stack[1])
+        else:
+            numpy_call_dict['assign'](*compute_stack)
         return postfix_stack[0]
 
+    @property
+    def thread_pool(self):
+        """
+        Persistent pool of the threads large op-trees are evaluated on, None
+        for a single threaded backend.
+        """
+        if self._thread_pool is None and self.num_threads > 1:
+            self._thread_pool = ThreadPool(self.num_threads)
+        return self._thread_pool
+
+    def _onehot(self, optree, reuse=True):
+        """
+        Evaluate the assignment of a onehot op-tree.  Rather than clearing
+        the whole output, the ones of the previous onehot written to the same
+        array are cleared if nothing else has been written to it since.  Data
+        iterators write the labels of every minibatch to the same buffer.
+
+        Arguments:
+            optree (OpTreeNode): the assignment of the onehot op-tree
+            reuse (bool): clear only the previous ones if they are known
+        """
+        assert optree[0]['op'] == 'assign'
+        assert isinstance(optree[1], Tensor)
+        array_output = optree[1]._tensor
+        axis = optree[2][0]['axis']
+        ind = optree[2][0]['idx']._tensor.astype(np.intp).reshape(-1)
+        other = np.arange(ind.size)
+        index = (ind, other) if axis == 0 else (other, ind)
+
+        # the onehot last written to the memory of the output
+        memory = _memory(array_output)
+        key = (array_output.__array_interface__['data'][0], array_output.shape,
+               array_output.strides)
+        last = self.onehot_set.pop(id(memory), None)
+        if reuse and last is not None and last[0] == key:
+            array_output[last[1]] = 0
+        else:
+            array_output.fill(0)
+        array_output[index] = 1
+        self.onehot_set[id(memory)] = (key, index, memory)
+        return array_output
+
+    def forget_onehot(self, ary):
+        """
+        Note a write to array ary by anything but a onehot
+        """
+        if self.onehot_set:
+            self.onehot_set.pop(id(_memory(ary)), None)
+
+    def run_plan(self, plan, tensors, consts=None):
+        """
+        Evaluate a compiled op-tree on its tensors, returns False if the plan
+        can not be used for them.
+        """
+        return plan([t._tensor for t in tensors], self.scratch,
+                    self.thread_pool, self.num_threads, consts)
+
+    def capture(self, func):
+        """
+        Run func and record the kernel calls and op-tree evaluations it makes
+        into a StepSchedule, which replays them on the same buffers without
+        running func again.
+
+        Arguments:
+            func (callable): computation to capture, called without arguments
+
+        Returns:
+            StepSchedule: the recorded calls
+        """
+        assert self.schedule is None, "captures can not be nested"
+        self.schedule = schedule = StepSchedule()
+        try:
+            func()
+        finally:
+            self.schedule = None
+        return schedule
+
     def empty(self, shape, dtype=None, name=None, persist_values=True):
         """
         Instantiate a new instance of the CPUTensor class without initializing
@@ -615,7 +1893,8 @@ class NervanaCPU(Backend):
             ary=np.zeros(shape, dtype),
             dtype=dtype,
             name=name,
-            persist_values=persist_values)
+            persist_values=persist_values,
+            rounding=self.round_mode)
 
     def array(self, ary, dtype=None, name=None, persist_values=True):
         """
@@ -641,13 +1920,17 @@ class NervanaCPU(Backend):
         Returns:
             CPUTensor: newly created data structure reference
         """
+        if self.schedule is not None:
+            # initialized tensors are not reset by a replay
+            self.schedule.escape()
         dtype = self.default_dtype if dtype is None else dtype
         return self.tensor_cls(
             backend=self,
             ary=np.array(ary, dtype),
             dtype=dtype,
             name=name,
-            persist_values=persist_values)
+            persist_values=persist_values,
+            rounding=self.round_mode)
 
     def zeros(self, shape, dtype=None, name=None, persist_values=True):
         """
@@ -670,13 +1953,17 @@ class NervanaCPU(Backend):
         Returns:
             CPUTensor: newly created data structure reference
         """
+        if self.schedule is not None:
+            # initialized tensors are not reset by a replay
+            self.schedule.escape()
         dtype = self.default_dtype if dtype is None else dtype
         return self.tensor_cls(
             backend=self,
             ary=np.zeros(shape, dtype),
             dtype=dtype,
             name=name,
-            persist_values=persist_values)
+            persist_values=persist_values,
+            rounding=self.round_mode)
 
     def ones(self, shape, dtype=None, name=None, persist_values=True):
         """
@@ -699,13 +1986,17 @@ class NervanaCPU(Backend):
         Returns:
             CPUTensor: newly created data structure reference
         """
+        if self.schedule is not None:
+            # initialized tensors are not reset by a replay
+            self.schedule.escape()
         dtype = self.default_dtype if dtype is None else dtype
         return self.tensor_cls(
             backend=self,
             ary=np.ones(shape, dtype),
             dtype=dtype,
             name=name,
-            persist_values=persist_values)
+            persist_values=persist_values,
+            rounding=self.round_mode)
 
     def empty_like(self, ary, dtype=None, name=None, persist_values=True):
         """
@@ -726,13 +2017,17 @@ class NervanaCPU(Backend):
         Returns:
             Tensor: array object
         """
+        if self.schedule is not None:
+            # initialized tensors are not reset by a replay
+            self.schedule.escape()
         dtype = self.default_dtype if dtype is None else dtype
         return self.tensor_cls(
             backend=self,
             ary=np.zeros(ary.shape, dtype),
             dtype=dtype,
             name=name,
-            persist_values=persist_values)
+            persist_values=persist_values,
+            rounding=self.round_mode)
 
     def zeros_like(self, ary, dtype=None, name=None, persist_values=True):
         """
@@ -753,14 +2048,20 @@ class NervanaCPU(Backend):
         Returns:
             Tensor: array object
         """
+        if self.schedule is not None:
+            # initialized tensors are not reset by a replay
+            self.schedule.escape()
         dtype = self.default_dtype if dtype is None else dtype
         return self.tensor_cls(
             backend=self,
             ary=np.zeros(ary.shape, dtype),
             dtype=dtype,
             name=name,
-            persist_values=persist_values)
+            persist_values=persist_values,
+            rounding=self.round_mode)
 
+    @recorded
+    @scratch_scope
     def compound_dot(self, A, B, C, alpha=1.0, beta=0.0, relu=False, bsum=None):
         """
         Doing following operations (* is dot product)
@@ -770,8 +2071,12 @@ class NervanaCPU(Backend):
 
         relu: if true applied before output (and prior to beta addition)
 
+        A and B may be int8 tensors made by quantize, their product is then
+        accumulated in int32 and scaled back by their scales.
+
         The operation will be short-circuited to: out <- alpha * left * right
-        if beta has value 0 (the default).
+        if beta has value 0 (the default).  The product is then written
+        straight into C if it is contiguous, otherwise into a scratch buffer.
 
         Arguments:
             A, B (CPUTensor): input operands
@@ -779,44 +2084,267 @@ class NervanaCPU(Backend):
             alpha (float): scale A*B term
             beta (float): scale C term before sum
             relu (bool): whether to apply ReLu before output
+            bsum (CPUTensor): if given, receives the sums of the rows of C
         """
 
         # checking type and shape
-        assert A.dtype == B.dtype == C.dtype
+        if A.dtype == np.int8:
+            assert B.dtype == np.int8
+        else:
+            assert A.dtype == B.dtype == C.dtype
 
         assert A.shape[0] == C.shape[0]
         assert B.shape[1] == C.shape[1]
         assert A.shape[1] == B.shape[0]
 
-        # cleaner implementation, shall be equivalent to the one below
-        # if relu:
-        #     C[:] = self.log(1. + self.exp(alpha * self.dot(A, B))) + beta * C
-        # else:
-        #     C[:] = alpha * self.dot(A, B) + beta * C
+        array_C = C._tensor
+        if A.dtype == np.int8:
+            # quantized operands, see quantize
+            out = self.scratch.empty(C.shape, dtype=np.float32)
+            self._int8_dot(A._tensor, B._tensor, out)
+            out *= A.scale._tensor * B.scale._tensor
+        elif beta == 0 and array_C.flags['C_CONTIGUOUS']:
+            out = self._compute_out(array_C, self._rounding(C))
+            np.dot(self._upcast(A._tensor), self._upcast(B._tensor), out)
+        else:
+            out = self.scratch.empty(C.shape, dtype=self._compute_dtype(C.dtype))
+            np.dot(self._upcast(A._tensor), self._upcast(B._tensor), out)
 
-        if beta == 0:
-            if C._tensor.flags['C_CONTIGUOUS'] is not True:
-                tmp = np.empty(C.shape, dtype=C.dtype)
-                np.dot(A._tensor, B._tensor, tmp)
-                C._tensor[:] = tmp.copy()
+        self._dot_epilogue(out, C, alpha, beta, relu, bsum)
+        return C
+
+    def _dot_epilogue(self, out, C, alpha, beta, relu, bsum=None):
+        """
+        C <- relu(alpha * out) + beta * C, in place, for the product out of a
+        gemm written either into C's own buffer or into a scratch buffer.
+        bsum, if given, gets the sums of the rows of C.
+        """
+        array_C = C._tensor
+        rounding = self._rounding(C)
+        if alpha != 1.0:
+            out *= alpha
+        if relu:
+            self.Relu(out, out)
+        if out is not array_C:
+            if beta != 0 and out.dtype != array_C.dtype:
+                # accumulate in the compute dtype, C is written once
+                array_P = self._upcast(array_C)
+                if beta != 1.0:
+                    array_P *= beta
+                out += array_P
+                beta = 0
+            if beta == 0:
+                self._store(array_C, out, rounding)
             else:
-                np.dot(A._tensor, B._tensor, C._tensor)
+                if beta != 1.0:
+                    array_C *= beta
+                array_C += out
+        if bsum is not None:
+            # summed into a buffer of its own, a reshape of a strided bsum
+            # would be a copy
+            array_bsum = bsum._tensor
+            array_S = self.scratch.empty((array_C.shape[0], 1), self._compute_dtype(bsum.dtype))
+            np.sum(out if beta == 0 else array_C, axis=1, dtype=array_S.dtype,
+                   keepdims=True, out=array_S)
+            self._store(array_bsum, array_S.reshape(array_bsum.shape), self._rounding(bsum))
 
-            if relu:
-                self.Relu(C._tensor, C._tensor)
+    def _compute_dtype(self, dtype):
+        """
+        Data type the kernels compute tensors stored in dtype in
+        """
+        if self.compute_dtype is not None and np.dtype(dtype) == np.float16:
+            return self.compute_dtype
+        return np.dtype(dtype)
+
+    def _rounding(self, T):
+        """
+        Mantissa bits the results of the kernels are stochastically rounded
+        to as they are written to tensor T
+        """
+        if self._compute_dtype(T.dtype) == T.dtype:
+            return 0
+        return _rounding_bits(T.rounding, T.dtype)
+
+    def _upcast(self, ary):
+        """
+        An input array in the compute dtype, copied into a scratch buffer if
+        it is stored in float16
+        """
+        dtype = self._compute_dtype(ary.dtype)
+        if dtype == ary.dtype:
+            return ary
+        array_P = self.scratch.empty(ary.shape, dtype)
+        array_P[:] = ary
+        return array_P
+
+    def _compute_out(self, ary, rounding=0, copy=False):
+        """
+        The buffer a kernel computes the values of the output array ary in:
+        ary itself, or a scratch buffer in the compute dtype (holding a copy
+        of ary if copy) that _store then writes back
+        """
+        dtype = self._compute_dtype(ary.dtype)
+        if dtype == ary.dtype and not rounding:
+            return ary
+        array_P = self.scratch.empty(ary.shape, dtype)
+        if copy:
+            array_P[:] = ary
+        return array_P
+
+    def _store(self, ary, out, rounding=0):
+        """
+        Write the values a kernel computed in out into the output array ary
+        """
+        if out is ary:
+            return
+        if rounding:
+            _stochastic_round(out, rounding, self.rng, ary)
         else:
-            np.multiply(C._tensor, beta, C._tensor)
-            tmp = np.empty(C.shape, dtype=C.dtype)
-            np.dot(A._tensor, B._tensor, tmp)
-            np.multiply(tmp, alpha, tmp)
-            if relu:
-                self.Relu(tmp, tmp)
-            np.add(C._tensor, tmp, C._tensor)
-        if bsum is not None:
-            bsum[:] = self.sum(C, 1)
+            ary[:] = out
 
-        return C
+    @scratch_scope
+    def lookup_bprop(self, indices, error, dW, grad=None, last=None):
+        """
+        Weight gradient of a lookup table: write to each column of dW in
+        indices the sum of the columns of error for that index.  If grad is
+        given the sums are also written to its first columns in the order of
+        the sorted unique indices, and only the columns of dW in last are
+        cleared, all of dW if last is None.
+
+        The columns are sorted by index and summed as segments, so the cost is
+        proportional to the number of columns and not the number of indices.
+
+        Arguments:
+            indices (numpy.ndarray): index of each column of error
+            error (Tensor): values to sum, with a column per index
+            dW (Tensor): dense gradient with a column per possible index
+            grad (Tensor, optional): buffer for the sums with at least a
+                                     column per index
+            last (numpy.ndarray, optional): indices of the columns of dW
+                                            written by the previous call
+
+        Returns:
+            numpy.ndarray: the sorted unique indices if grad was written,
+                           None otherwise
+        """
+        if self.schedule is not None:
+            self.schedule.escape()
+        rows, inv = np.unique(indices, return_inverse=True)
+        order = np.argsort(inv, kind='mergesort')
+        starts = np.searchsorted(inv[order], np.arange(len(rows)))
+
+        array_error = error._tensor
+        sums = self.scratch.empty((array_error.shape[0], len(rows)),
+                                  dtype=self._compute_dtype(error.dtype))
+        np.add.reduceat(self._upcast(array_error)[:, order], starts, axis=1, out=sums)
+
+        array_dW = dW._tensor
+        if grad is None or last is None:
+            array_dW.fill(0)
+        else:
+            array_dW[:, last] = 0
+        if grad is None:
+            array_dW[:, rows] = sums
+            self.forget_onehot(array_dW)
+            return None
+
+        array_grad = grad._tensor[:, :len(rows)]
+        self.forget_onehot(array_grad)
+        self._store(array_grad, sums, self._rounding(grad))
+        array_dW[:, rows] = array_grad
+        self.forget_onehot(array_dW)
+        return rows
+
+    def scatter(self, a, indices, axis, out):
+        """
+        Write the slices of a along axis to the slices indices of out, the
+        inverse of take
+
+        Arguments:
+            a (Tensor): values to write, with a slice per index
+            indices (numpy.ndarray): slices of out to write to
+            axis (int): axis the slices are taken along, 0 or 1
+            out (Tensor): tensor to write to
+
+        Returns:
+            Tensor: out
+        """
+        if self.schedule is not None:
+            self.schedule.escape()
+        array_out = out._tensor
+        if axis == 0:
+            array_out[indices] = a._tensor
+        else:
+            array_out[:, indices] = a._tensor
+        self.forget_onehot(array_out)
+        return out
+
+    @recorded
+    @scratch_scope
+    def quantize(self, x, out, scale=None, axis=None):
+        """
+        Quantize x into the int8 tensor out, out <- rint(x / scale) clipped to
+        [-127, 127].  The scale is kept as out.scale, compound_dot and
+        fprop_conv compute with int8 operands in int32 and multiply the
+        result by the scales of both.
 
+        Arguments:
+            x (CPUTensor): values to quantize
+            out (CPUTensor): int8 output
+            scale (CPUTensor, optional): scale broadcastable to x.  Defaults
+                                         to the largest magnitude of x along
+                                         axis over 127.
+            axis (int, optional): axis the default scale is taken along, one
+                                  scale per channel of the other axis.  None
+                                  for a single scale.
+
+        Returns:
+            CPUTensor: out
+        """
+        assert out.dtype == np.int8 and out.shape == x.shape
+        array_X = x._tensor
+        if scale is None:
+            array_S = np.max(np.abs(array_X), axis=axis, keepdims=True).astype(np.float32)
+            array_S[array_S == 0] = 127.
+            scale = self.array(array_S / 127., dtype=np.float32)
+
+        array_Q = self.scratch.empty(array_X.shape, dtype=np.float32)
+        np.multiply(array_X, 1. / scale._tensor, array_Q)
+        np.rint(array_Q, array_Q)
+        np.clip(array_Q, -127., 127., array_Q)
+        out._tensor[:] = array_Q
+        out.scale = scale
+        return out
+
+    def _int8_dot(self, a, b, out):
+        """
+        out <- the exact product of two int8 matrices, written to a float32
+        out.  NumPy has no integer gemm, but the products over int8_dot_chunk
+        values of the inner dimension are integers that float32 holds
+        exactly.  Each chunk goes through sgemm, several are summed in int32.
+        """
+        M, K = a.shape
+        acc = None
+        if K > int8_dot_chunk:
+            acc = self.scratch.empty(out.shape, dtype=np.int32)
+        for k0 in range(0, K, int8_dot_chunk):
+            k1 = min(K, k0 + int8_dot_chunk)
+            array_A = self.scratch.empty((M, k1 - k0), dtype=np.float32)
+            array_A[:] = a[:, k0:k1]
+            array_B = self.scratch.empty((k1 - k0, b.shape[1]), dtype=np.float32)
+            array_B[:] = b[k0:k1]
+            np.dot(array_A, array_B, out)
+            if acc is not None:
+                if k0 == 0:
+                    acc[:] = out
+                else:
+                    np.add(acc, out, acc, casting='unsafe')
+        if acc is not None:
+            out[:] = acc
+        return out
+
+    @recorded
+    @scratch_scope
     def batched_dot(self, A, B, C, alpha=1.0, beta=0.0, relu=False):
         """
         Doing following operations:
@@ -861,32 +2389,51 @@ class NervanaCPU(Backend):
         assert B.shape[1 + dimb] == C.shape[1 + dimc]
         assert A.shape[1 + dima] == B.shape[0 + dimb]
 
-        tmp = np.zeros(C.shape)
-
-        for i in range(batch_loops):
-            if dima:
-                tmp += np.dot(A._tensor[i], B._tensor[i])
-            else:
-                tmp[i] = np.dot(A._tensor, B._tensor[i])
-
-        np.multiply(tmp, alpha, tmp)
-        if relu:
-            self.Relu(tmp, tmp)
-        np.add(C._tensor * beta, tmp, C._tensor)
+        array_A, array_B, array_C = A._tensor, B._tensor, C._tensor
+        dtype = self._compute_dtype(C.dtype)
+        if beta == 0 and array_C.flags['C_CONTIGUOUS']:
+            out = self._compute_out(array_C, self._rounding(C))
+        else:
+            out = self.scratch.empty(C.shape, dtype=dtype)
 
+        if dimc:
+            # fprop and bprop: one product per batch, broadcasting the 2D
+            # operand over the batch
+            _stacked_dot(self._upcast(array_A), self._upcast(array_B), out)
+        else:
+            # update: the products are summed over the batch, a single gemm of
+            # the operands with the batch folded into the inner dimension
+            assert dima and dimb
+            K, N = array_A.shape[1:]
+            array_A2 = self.scratch.empty((K, batch_loops, N), dtype=dtype)
+            array_A2[:] = array_A.transpose((1, 0, 2))
+            array_B2 = self.scratch.empty((C.shape[1], batch_loops, N), dtype=dtype)
+            array_B2[:] = array_B.transpose((2, 0, 1))
+            np.dot(array_A2.reshape((K, -1)), array_B2.reshape((C.shape[1], -1)).T, out)
+
+        self._dot_epilogue(out, C, alpha, beta, relu)
         return C
 
+    @recorded
     def make_binary_mask(self, out, keepthresh=0.5):
         """
         Create a binary mask for dropout layers.
 
+        The mask compares random 32 bit integers, taken from the raw bytes of
+        the generator, against keepthresh * 2**32, which is much faster than
+        drawing uniform floats.  out may be of any dtype, uint8 masks take
+        the least memory.
+
         Arguments:
             out (CPUTensor): Output tensor
             keepthresh (float): fraction of ones
         """
-        out._tensor[:] = np.array(
-            self.rng.uniform(size=out._tensor.shape) < keepthresh,
-            dtype=out._tensor.dtype)
+        array_out = out._tensor
+        if keepthresh >= 1.0:
+            array_out.fill(1)
+            return
+        bits = np.frombuffer(self.rng.bytes(4 * array_out.size), dtype=np.uint32)
+        np.less(bits.reshape(array_out.shape), np.uint32(int(keepthresh * 2 ** 32)), array_out)
 
     def conv_layer(self, dtype,
                    N, C, K,
@@ -894,7 +2441,7 @@ class NervanaCPU(Backend):
                    T=1, R=1, S=1,
                    pad_d=0, pad_h=0, pad_w=0,
                    str_d=1, str_h=1, str_w=1,
-                   bsum=False):
+                   bsum=False, algo=None):
         """
         Create a new ConvLayer parameter object.
         This then is passed as an argument to all the convolution operations.
@@ -918,10 +2465,21 @@ class NervanaCPU(Backend):
 
         bsum: calculate the sum along the batchnorm axis for fprop or bprop
               outputs an fp32 tensor of size Kx1
+
+        algo: convolution algorithm, 'direct' (im2col), 'fft' for layers with
+              unit strides or, for 2D layers with 3x3 filters and unit
+              stride, 'winograd_2x2' / 'winograd_4x4'.  Can be changed later
+              through the layer's algo attribute.  Defaults to the choice
+              of the autotuner, 'direct' when it is off.
         """
-        return ConvLayer(self, dtype, N, C, K, D, H, W, T, R, S,
-                         pad_d, pad_h, pad_w, str_d, str_h, str_w)
+        layer = ConvLayer(self, dtype, N, C, K, D, H, W, T, R, S,
+                          pad_d, pad_h, pad_w, str_d, str_h, str_w, algo=algo or 'direct')
+        if algo is None:
+            layer.algo = self.autotuner.choose(self, layer, dtype)
+        return layer
 
+    @recorded
+    @scratch_scope
     def fprop_conv(self, layer, I, F, O, alpha=1.0, relu=False, bsum=None, beta=0.0):
         """
         Forward propagate the inputs of a convolutional network layer to
@@ -936,54 +2494,61 @@ class NervanaCPU(Backend):
             relu (boolean): apply ReLu or not before output
                             (currently not implemented)
             beta (float): accumulation value into O
+
+        I and F may be int8 tensors made by quantize, which are convolved with
+        the direct algorithm in int32.
         """
         assert layer.sizeI == I.size
         assert layer.sizeF == F.size
         assert layer.sizeO == O.size
 
-        M, P, Q = layer.MPQ
-        C, D, H, W, N = layer.dimI
-        C, T, R, S, K = layer.dimF
-        K, M, P, Q, N = layer.dimO
-
-        pad_d, pad_h, pad_w = layer.padding
-        str_d, str_h, str_w = layer.strides
-
-        array_I = I.get().reshape(layer.dimI)
-        array_F = F.get().reshape(layer.dimF)
-        array_O = O.get().reshape(layer.dimO)
-
-        for m in range(M):
-            sliceT, sliceD = layer.fprop_slice(m, T, D, pad_d, str_d)
-
-            for p in range(P):
-                sliceR, sliceH = layer.fprop_slice(p, R, H, pad_h, str_h)
-
-                for q in range(Q):
-                    sliceS, sliceW = layer.fprop_slice(q, S, W, pad_w, str_w)
-
-                    sliceTRS = np.array([
-                        t * R * S + r * S + s
-                        for t in sliceT
-                        for r in sliceR
-                        for s in sliceS], dtype=np.intp)
-
-                    sliceDHW = np.array([
-                        d * H * W + y * W + w
-                        for d in sliceD
-                        for y in sliceH
-                        for w in sliceW], dtype=np.intp)
-
-                    slicedF = array_F.reshape(
-                        (C, -1, K))[:, sliceTRS, :].reshape((-1, K))
-                    slicedI = array_I.reshape(
-                        (C, -1, N))[:, sliceDHW, :].reshape((-1, N))
+        K = layer.K
+
+        array_I = self._upcast(I.get().reshape(layer.dimI))
+        array_F = self._upcast(F.get().reshape(layer.dimF2))
+        stored_O = O.get().reshape(layer.dimO)
+        array_O = self._compute_out(stored_O, self._rounding(O), copy=beta != 0)
+
+        if F.dtype == np.int8:
+            assert I.dtype == np.int8
+            scale = (F.scale._tensor * I.scale._tensor).reshape((K, 1))
+            for p0, p1 in self._conv_row_blocks(layer, 4):
+                cols = self._im2col(layer, array_I, p0, p1)
+                array_O_tmp = self._int8_dot(
+                    array_F.T, cols, self.scratch.empty((K, cols.shape[1]), dtype=np.float32))
+                array_O_tmp *= scale
+                self._conv_accumulate(array_O[:, :, p0:p1], array_O_tmp, alpha, beta)
+        elif layer.algo in winograd_tiles:
+            tile = winograd_tiles[layer.algo]
+            U = self._winograd_filters(layer, array_F, tile, flip=False)
+            self._winograd_conv(array_I[:, 0], U, tile, layer.padding[1:], array_O[:, 0],
+                                alpha, beta)
+        elif layer.algo == 'fft':
+            shape, rows = self._fft_shape(layer.dimI, layer.TRS, layer.padding, K)
+            G = self._fft_filters(layer, array_F, shape, flip=False)
+            self._fft_conv(array_I, G, shape, rows, layer.padding, array_O, alpha, beta)
+        else:
+            # im2col: the filter windows of each block of output rows are
+            # unfolded into a (C*T*R*S, M*P*Q*N) matrix and reduced with a
+            # single gemm
+            for p0, p1 in self._conv_row_blocks(layer, array_I.itemsize):
+                cols = self._im2col(layer, array_I, p0, p1)
+                array_O_b = array_O[:, :, p0:p1]
+                if beta == 0 and array_O_b.flags['C_CONTIGUOUS']:
+                    np.dot(array_F.T, cols, array_O_b.reshape((K, -1)))
+                    if alpha != 1.0:
+                        array_O_b *= alpha
+                else:
+                    array_O_tmp = self.scratch.empty((K, cols.shape[1]), dtype=array_O.dtype)
+                    np.dot(array_F.T, cols, array_O_tmp)
+                    self._conv_accumulate(array_O_b, array_O_tmp, alpha, beta)
 
-                    array_O[:, m, p, q, :] = beta * array_O[:, m, p, q, :] + alpha * \
-                        np.dot(slicedF.T,  slicedI)
+        self._store(stored_O, array_O, self._rounding(O))
         if bsum is not None:
             bsum[:] = array_O.sum((1, 2, 3, 4))
 
+    @recorded
+    @scratch_scope
     def bprop_conv(self, layer, F, E, grad_I, alpha=1.0, relu=False, bsum=None, beta=0.0):
         """
         Backward propagate the error through a convolutional network layer.
@@ -1002,55 +2567,63 @@ class NervanaCPU(Backend):
         assert layer.sizeO == E.size
         assert layer.sizeI == grad_I.size
 
-        M, P, Q = layer.MPQ
-
         C, D, H, W, N = layer.dimI
         C, T, R, S, K = layer.dimF
-        K, M, P, Q, N = layer.dimO
-
+        M, P, Q = layer.MPQ
         pad_d, pad_h, pad_w = layer.padding
-        str_d, str_h, str_w = layer.strides
-
-        array_F = F.get().reshape(layer.dimF)
-        array_E = E.get().reshape(layer.dimO)
-        array_grad_I = grad_I.get().reshape(layer.dimI)
-
-        # array_grad_I = array_grad_I.fill(0.)
-
-        array_F = np.transpose(array_F, (4, 1, 2, 3, 0)).copy()
-
-        for d in range(D):
-            sliceT, sliceM = layer.bprop_slice(d, T, M, pad_d, str_d)
-
-            for h in range(H):
-                sliceR, sliceP = layer.bprop_slice(h, R, P, pad_h, str_h)
-
-                for w in range(W):
-                    sliceS, sliceQ = layer.bprop_slice(w, S, Q, pad_w, str_w)
-
-                    sliceTRS = np.array([
-                        t * R * S + r * S + s
-                        for t in sliceT
-                        for r in sliceR
-                        for s in sliceS], dtype=np.intp)
-
-                    sliceMPQ = np.array([
-                        m * P * Q + p * Q + q
-                        for m in sliceM
-                        for p in sliceP
-                        for q in sliceQ], dtype=np.intp)
 
-                    slicedF = array_F.reshape(
-                        (K, -1, C))[:, sliceTRS, :].reshape((-1, C))
-                    slicedE = array_E.reshape(
-                        (K, -1, N))[:, sliceMPQ, :].reshape((-1, N))
+        array_F = self._upcast(F.get().reshape(layer.dimF2))
+        array_E = self._upcast(E.get().reshape(layer.dimO))
+        stored_grad_I = grad_I.get().reshape(layer.dimI)
+        array_grad_I = self._compute_out(stored_grad_I, self._rounding(grad_I), copy=beta != 0)
+
+        if layer.algo in winograd_tiles and pad_h < R and pad_w < S:
+            # the input gradient is the stride 1 correlation of the errors,
+            # padded by R - 1 - pad, with the flipped and transposed filters
+            tile = winograd_tiles[layer.algo]
+            U = self._winograd_filters(layer, array_F, tile, flip=True)
+            self._winograd_conv(array_E[:, 0], U, tile, (R - 1 - pad_h, S - 1 - pad_w),
+                                array_grad_I[:, 0], alpha, beta)
+        elif layer.algo == 'fft' and pad_d < T and pad_h < R and pad_w < S:
+            padding = (T - 1 - pad_d, R - 1 - pad_h, S - 1 - pad_w)
+            shape, rows = self._fft_shape(layer.dimO, layer.TRS, padding, C)
+            G = self._fft_filters(layer, array_F, shape, flip=True)
+            self._fft_conv(array_E, G, shape, rows, padding, array_grad_I, alpha, beta)
+        else:
+            # gemm + col2im: the filters are applied to each block of output
+            # rows in their native (C*T*R*S, K) layout and the resulting
+            # columns are scatter-added into the (padded) input gradient
+            direct = (beta == 0 and not any(layer.padding) and
+                      array_grad_I.flags['C_CONTIGUOUS'])
+            if direct:
+                array_P = array_grad_I
+                array_P.fill(0)
+            else:
+                array_P = self.scratch.zeros(
+                    (C, D + 2 * pad_d, H + 2 * pad_h, W + 2 * pad_w, N), dtype=array_grad_I.dtype)
+
+            for p0, p1 in self._conv_row_blocks(layer, array_P.itemsize):
+                array_E_b = array_E[:, :, p0:p1].reshape((K, -1))
+                cols = self.scratch.empty((C, T, R, S, M, p1 - p0, Q, N), dtype=array_P.dtype)
+                np.dot(array_F, array_E_b, cols.reshape((C * T * R * S, -1)))
+                self._col2im(layer, cols, array_P, p0, p1)
+
+            if direct:
+                if alpha != 1.0:
+                    array_P *= alpha
+            else:
+                self._conv_accumulate(
+                    array_grad_I,
+                    array_P[:, pad_d:pad_d + D, pad_h:pad_h + H, pad_w:pad_w + W, :],
+                    alpha, beta)
 
-                    array_grad_I[:, d, h, w, :] = beta * array_grad_I[:, d, h, w, :] + alpha * \
-                        np.dot(slicedF.T, slicedE)
+        self._store(stored_grad_I, array_grad_I, self._rounding(grad_I))
         # If this is the forward pass for deconv, compute bsum here
         if bsum is not None:
             bsum[:] = self.sum(grad_I.reshape(C, -1), 1)
 
+    @recorded
+    @scratch_scope
     def update_conv(self, layer, I, E, U, alpha=1.0):
         """
         Compute the updated gradient for a convolutional network layer.
@@ -1066,46 +2639,447 @@ class NervanaCPU(Backend):
         assert layer.sizeO == E.size
         assert layer.sizeF == U.size
 
+        K = layer.K
+
+        array_I = self._upcast(I.get().reshape(layer.dimI))
+        array_E = self._upcast(E.get().reshape(layer.dimO))
+        stored_U = U.get().reshape(layer.dimF2)
+        array_U = self._compute_out(stored_U, self._rounding(U))
+
+        if layer.algo in winograd_tiles:
+            self._winograd_update(array_I[:, 0], array_E[:, 0], winograd_tiles[layer.algo],
+                                  layer.padding[1:], array_U, alpha)
+        elif layer.algo == 'fft':
+            self._fft_update(layer, array_I, array_E, array_U, alpha)
+        else:
+            # dW = cols . E.T, with the input unfolded once per block of output
+            # rows and the blocks accumulated into the update
+            if array_U.flags['C_CONTIGUOUS']:
+                array_acc = array_U
+            else:
+                array_acc = self.scratch.empty(array_U.shape, dtype=array_U.dtype)
+
+            blocks = self._conv_row_blocks(layer, array_I.itemsize)
+            if len(blocks) > 1:
+                array_U_b = self.scratch.empty(array_U.shape, dtype=array_U.dtype)
+            for i, (p0, p1) in enumerate(blocks):
+                cols = self._im2col(layer, array_I, p0, p1)
+                array_E_b = array_E[:, :, p0:p1].reshape((K, -1))
+                if i == 0:
+                    np.dot(cols, array_E_b.T, array_acc)
+                else:
+                    np.dot(cols, array_E_b.T, array_U_b)
+                    array_acc += array_U_b
+
+            if alpha != 1.0:
+                array_acc *= alpha
+            if array_acc is not array_U:
+                array_U[:] = array_acc
+
+        self._store(stored_U, array_U, self._rounding(U))
+
+    def _im2col(self, layer, array_I, p0, p1):
+        """
+        Unfold the filter windows for output rows p0:p1 of a layer, gathered
+        through the layer's precomputed fprop_lut.
+
+        Arguments:
+            layer (ConvLayer): the conv layer as a parameter object
+            array_I (ndarray): (C, D, H, W, N) input
+            p0, p1 (int): range of output rows
+
+        Returns:
+            ndarray: (C*T*R*S, M*(p1 - p0)*Q*N) columns, column (m, p, q, n)
+                     holds the input window of output position (m, p0 + p, q)
+                     for image n, with zeros where the window reads padding.
+        """
         C, D, H, W, N = layer.dimI
-        C, T, R, S, K = layer.dimF
-        K, M, P, Q, N = layer.dimO
 
-        pad_d, pad_h, pad_w = layer.padding
+        lut = layer.fprop_lut[:, :, p0:p1]
+        cols = self.scratch.empty((C, ) + lut.shape + (N, ), dtype=array_I.dtype)
+        array_I.reshape((C, -1, N)).take(lut, axis=1, out=cols, mode='clip')
+        if layer.fprop_lut_pad is not None:
+            cols[:, layer.fprop_lut_pad[:, :, p0:p1]] = 0
+        return cols.reshape((layer.dimF2[0], -1))
+
+    def _col2im(self, layer, cols, array_P, p0, p1):
+        """
+        Scatter-add unfolded columns back onto the padded input layout, the
+        adjoint of _im2col.
+
+        Arguments:
+            layer (ConvLayer): the conv layer as a parameter object
+            cols (ndarray): columns of shape (C, T, R, S, M, p1 - p0, Q, N)
+            array_P (ndarray): padded (C, D, H, W, N) accumulation buffer
+            p0, p1 (int): range of output rows the columns belong to
+        """
+        C, T, R, S, K = layer.dimF
+        M, P, Q = layer.MPQ
         str_d, str_h, str_w = layer.strides
 
-        array_I = I.get().reshape(layer.dimI)
-        array_E = E.get().reshape(layer.dimO)
-        array_U = U.get().reshape(layer.dimF)
-        array_U.fill(0.)
+        # windows overlap, but for a fixed filter tap the output positions map
+        # to distinct input pixels, so accumulate one tap at a time
+        for t in range(T):
+            sliceD = slice(t, t + str_d * M, str_d)
+            for r in range(R):
+                sliceH = slice(r + str_h * p0, r + str_h * p1, str_h)
+                for s in range(S):
+                    sliceW = slice(s, s + str_w * Q, str_w)
+                    array_P[:, sliceD, sliceH, sliceW, :] += cols[:, t, r, s]
 
-        for m in range(M):
-            sliceT, sliceD = layer.fprop_slice(m, T, D, pad_d, str_d)
+    def _winograd_filters(self, layer, array_F, tile, flip):
+        """
+        The filters of a 3x3 layer in the Winograd domain, G . g . G.T for
+        every filter g.  The transform costs little next to the convolution,
+        so it is recomputed by each pass rather than tracking weight updates.
 
-            for p in range(P):
-                sliceR, sliceH = layer.fprop_slice(p, R, H, pad_h, str_h)
+        Arguments:
+            layer (ConvLayer): the conv layer as a parameter object
+            array_F (ndarray): (C * 3 * 3, K) filters
+            tile (int): output tile size
+            flip (bool): transform the filters of bprop, flipped in both
+                         spatial dimensions with C and K swapped
 
-                for q in range(Q):
-                    sliceS, sliceW = layer.fprop_slice(q, S, W, pad_w, str_w)
+        Returns:
+            ndarray: ((tile + 2) ** 2, C, K) transformed filters, or
+                     ((tile + 2) ** 2, K, C) when flipped
+        """
+        C, T, R, S, K = layer.dimF
+        a = tile + 2
+        g = array_F.reshape((C, R, S, K))
+        if flip:
+            g = g[:, ::-1, ::-1].transpose((1, 2, 3, 0))
+        else:
+            g = g.transpose((1, 2, 0, 3))
+        G = winograd_matrices(tile)[1].astype(array_F.dtype)
+        U = self.scratch.empty((a, a) + g.shape[2:], dtype=array_F.dtype)
+        self._tile_transform(G, np.ascontiguousarray(g), U)
+        return U.reshape((a * a, ) + g.shape[2:])
+
+    def _tile_transform(self, mat, x, out):
+        """
+        out[a, b] = sum_ij mat[a, i] * mat[b, j] * x[i, j], i.e. mat . x . mat.T
+        for all the tiles held along the two leading axes of x.  x and out
+        have to be C contiguous and of the dtype of mat.
+        """
+        n, k = mat.shape
+        tmp = self.scratch.empty((n, k) + x.shape[2:], dtype=out.dtype)
+        np.dot(mat, x.reshape((k, -1)), tmp.reshape((n, -1)))
+        for a in range(n):
+            np.dot(mat, tmp[a].reshape((k, -1)), out[a].reshape((n, -1)))
+        return out
 
-                    sliceTRS = np.array([
-                        t * R * S + r * S + s
-                        for t in sliceT
-                        for r in sliceR
-                        for s in sliceS], dtype=np.intp)
+    def _winograd_pad(self, array_X, padding, height, width):
+        """
+        Copy a (C, H, W, N) array into a zeroed (C, height, width, N) scratch
+        buffer at offset padding.
+        """
+        C, H, W, N = array_X.shape
+        pad_h, pad_w = padding
+        array_P = self.scratch.zeros((C, height, width, N), dtype=array_X.dtype)
+        array_P[:, pad_h:pad_h + H, pad_w:pad_w + W] = array_X
+        return array_P
 
-                    sliceDHW = np.array([
-                        d * H * W + y * W + w
-                        for d in sliceD
-                        for y in sliceH
-                        for w in sliceW], dtype=np.intp)
+    def _winograd_inputs(self, array_P, BT, tile, u0, u1, tw):
+        """
+        BT . d . B for the overlapping (tile + 2) x (tile + 2) input tiles d of
+        tile rows u0:u1 of the padded input, as an array of shape
+        (tile + 2, tile + 2, C, u1 - u0, tw, N).
+        """
+        C, _, _, N = array_P.shape
+        a = tile + 2
+        sc, sh, sw, sn = array_P.strides
+        tiles = self.scratch.empty((a, a, C, u1 - u0, tw, N), dtype=array_P.dtype)
+        tiles[:] = as_strided(array_P[:, u0 * tile:], shape=tiles.shape,
+                              strides=(sh, sw, sc, tile * sh, tile * sw, sn))
+        return self._tile_transform(BT, tiles, self.scratch.empty(tiles.shape, dtype=tiles.dtype))
 
-                    slicedI = array_I.reshape(
-                        (C, -1, N))[:, sliceDHW, :].reshape((-1, N))
-                    slicedE = array_E[:, m, p, q, :]
-                    slicedU = array_U.reshape((C, -1, K))
+    def _winograd_row_blocks(self, th, row_bytes):
+        """
+        Split th rows of tiles into ranges of at most conv_block_bytes, given
+        the scratch bytes needed per tile row.
+        """
+        rows = max(1, min(th, self.conv_block_bytes // row_bytes))
+        return [(u0, min(u0 + rows, th)) for u0 in range(0, th, rows)]
 
-                    slicedU[:, sliceTRS, :] += alpha * np.dot(
-                        slicedI,  slicedE.T).reshape((C, -1, K))
+    def _winograd_conv(self, array_X, U, tile, padding, array_Y, alpha, beta):
+        """
+        array_Y <- alpha * conv(array_X, U) + beta * array_Y, a stride 1 3x3
+        correlation computed with Winograd F(tile x tile, 3x3).  After the
+        input transform each of the (tile + 2) ** 2 tile elements is an
+        independent (Co, Ci) x (Ci, tiles * N) gemm, the output transform then
+        reduces the tiles to tile x tile outputs.
+
+        Arguments:
+            array_X (ndarray): (Ci, H, W, N) input
+            U (ndarray): ((tile + 2) ** 2, Ci, Co) transformed filters
+            tile (int): output tile size
+            padding (tuple): zero padding of the input height and width
+            array_Y (ndarray): (Co, P, Q, N) output
+            alpha (float): linear scaling
+            beta (float): accumulation value into array_Y
+        """
+        AT, _, BT = [m.astype(array_X.dtype) for m in winograd_matrices(tile)]
+        Ci, H, W, N = array_X.shape
+        Co, P, Q, N = array_Y.shape
+        a = tile + 2
+        th, tw = ceil_div(P, tile), ceil_div(Q, tile)
+        array_P = self._winograd_pad(array_X, padding, th * tile + 2, tw * tile + 2)
+
+        row_bytes = a * a * (2 * Ci + Co) * tw * N * array_X.itemsize
+        for u0, u1 in self._winograd_row_blocks(th, row_bytes):
+            V = self._winograd_inputs(array_P, BT, tile, u0, u1, tw)
+            nt = (u1 - u0) * tw * N
+            Mt = self.scratch.empty((a, a, Co, u1 - u0, tw, N), dtype=array_Y.dtype)
+            V_e, Mt_e = V.reshape((a * a, Ci, nt)), Mt.reshape((a * a, Co, nt))
+            for e in range(a * a):
+                np.dot(U[e].T, V_e[e], Mt_e[e])
+            Yt = self._tile_transform(
+                AT, Mt, self.scratch.empty((tile, tile, Co, u1 - u0, tw, N), dtype=Mt.dtype))
+
+            # reassemble the output tiles into rows
+            rows = self.scratch.empty((Co, u1 - u0, tile, tw, tile, N), dtype=Yt.dtype)
+            rows.transpose((2, 4, 0, 1, 3, 5))[:] = Yt
+            rows = rows.reshape((Co, (u1 - u0) * tile, tw * tile, N))
+            p0, p1 = u0 * tile, min(u1 * tile, P)
+            self._conv_accumulate(array_Y[:, p0:p1], rows[:, :p1 - p0, :Q], alpha, beta)
+
+    def _winograd_update(self, array_I, array_E, tile, padding, array_U, alpha):
+        """
+        array_U <- alpha * dW for a stride 1 3x3 layer, computed with the
+        transpose of Winograd F(tile x tile, 3x3):
+        dW = G.T . (sum over tiles of (BT . d . B) * (AT.T . e . AT)) . G
+        for the tile x tile error tiles e and the input tiles d they read.
+
+        Arguments:
+            array_I (ndarray): (C, H, W, N) input
+            array_E (ndarray): (K, P, Q, N) errors
+            tile (int): output tile size
+            padding (tuple): zero padding of the input height and width
+            array_U (ndarray): (C * 3 * 3, K) updates
+            alpha (float): linear scaling
+        """
+        AT, G, BT = [m.astype(array_I.dtype) for m in winograd_matrices(tile)]
+        C, H, W, N = array_I.shape
+        K, P, Q, N = array_E.shape
+        a = tile + 2
+        th, tw = ceil_div(P, tile), ceil_div(Q, tile)
+        array_P = self._winograd_pad(array_I, padding, th * tile + 2, tw * tile + 2)
+        array_Ep = self._winograd_pad(array_E, (0, 0), th * tile, tw * tile)
+
+        Mw = self.scratch.empty((a, a, C, K), dtype=array_U.dtype)
+        Mw_e = Mw.reshape((a * a, C, K))
+        Mw_b = self.scratch.empty((C, K), dtype=array_U.dtype)
+        row_bytes = a * a * (2 * C + 2 * K) * tw * N * array_I.itemsize
+        for u0, u1 in self._winograd_row_blocks(th, row_bytes):
+            V = self._winograd_inputs(array_P, BT, tile, u0, u1, tw)
+            e = self.scratch.empty((tile, tile, K, u1 - u0, tw, N), dtype=array_Ep.dtype)
+            e[:] = array_Ep[:, u0 * tile:u1 * tile].reshape(
+                (K, u1 - u0, tile, tw, tile, N)).transpose((2, 4, 0, 1, 3, 5))
+            Et = self._tile_transform(AT.T, e, self.scratch.empty(
+                (a, a, K, u1 - u0, tw, N), dtype=e.dtype))
+            nt = (u1 - u0) * tw * N
+            V_e, Et_e = V.reshape((a * a, C, nt)), Et.reshape((a * a, K, nt))
+            for i in range(a * a):
+                if u0 == 0:
+                    np.dot(V_e[i], Et_e[i].T, Mw_e[i])
+                else:
+                    np.dot(V_e[i], Et_e[i].T, Mw_b)
+                    Mw_e[i] += Mw_b
+
+        dW = self._tile_transform(G.T, Mw, self.scratch.empty((3, 3, C, K), dtype=Mw.dtype))
+        if alpha != 1.0:
+            dW *= alpha
+        array_U[:] = dW.transpose((2, 0, 1, 3)).reshape(array_U.shape)
+
+    def _fft_shape(self, dimX, TRS, padding, Co):
+        """
+        Transform shape of the stride 1 correlation of a (Ci, D, H, W, N) input
+        with T x R x S filters into Co channels.  Depth and width are padded
+        to fast transform lengths, the height is split into overlapping tiles
+        (overlap-save) whose spectra fit in conv_block_bytes.
+
+        Returns:
+            ((Ld, Lh, Lw), rows): the transform shape and the number of
+                                  output rows computed by each tile
+        """
+        Ci, D, H, W, N = dimX
+        T, R, S = TRS
+        pad_d, pad_h, pad_w = padding
+        P = H + 2 * pad_h - R + 1
+        Ld = fft_length(D + 2 * pad_d)
+        Lw = fft_length(W + 2 * pad_w)
+        row_bytes = Ld * (Lw // 2 + 1) * (Ci + Co) * N * 16
+        rows = max(1, min(P, self.conv_block_bytes // row_bytes - R + 1))
+        Lh = fft_length(rows + R - 1)
+        return (Ld, Lh, Lw), min(P, Lh - R + 1)
+
+    def _rfft(self, x, shape, cdtype):
+        """
+        Spectrum of x over its three trailing axes, zero padded to the
+        transform shape, as a contiguous array of dtype cdtype with the
+        frequencies moved to the front: (Ld, Lh, Lw // 2 + 1) + x.shape[:-3].
+        Axes of length 1 are left untransformed.
+        """
+        lead = x.ndim - 3
+        axes = [lead + i for i in range(3) if shape[i] > 1] or [x.ndim - 1]
+        Xf = np.fft.rfftn(x, [shape[i - lead] for i in axes], axes)
+        order = tuple(range(lead, x.ndim)) + tuple(range(lead))
+        return np.ascontiguousarray(Xf.transpose(order), dtype=cdtype)
+
+    def _irfft(self, Xf, shape):
+        """
+        Inverse of _rfft, a real array of shape Xf.shape[3:] + shape.
+        """
+        lead = Xf.ndim - 3
+        Xf = np.ascontiguousarray(Xf.transpose(tuple(range(3, Xf.ndim)) + (0, 1, 2)))
+        axes = [lead + i for i in range(3) if shape[i] > 1] or [Xf.ndim - 1]
+        return np.fft.irfftn(Xf, [shape[i - lead] for i in axes], axes)
+
+    def _fft_filters(self, layer, array_F, shape, flip):
+        """
+        Conjugate spectra of the filters of a layer, zero padded to the
+        transform shape, recomputed by each pass like _winograd_filters.
+
+        Arguments:
+            layer (ConvLayer): the conv layer as a parameter object
+            array_F (ndarray): (C * T * R * S, K) filters
+            shape (tuple): transform shape (Ld, Lh, Lw)
+            flip (bool): spectra of the bprop filters, flipped in all the
+                         spatial dimensions with C and K swapped
+
+        Returns:
+            ndarray: (Ld, Lh, Lw // 2 + 1, K, C) spectra, or
+                     (Ld, Lh, Lw // 2 + 1, C, K) when flipped
+        """
+        C, T, R, S, K = layer.dimF
+        g = array_F.reshape(layer.dimF)
+        if flip:
+            g = g[:, ::-1, ::-1, ::-1].transpose((0, 4, 1, 2, 3))
+        else:
+            g = g.transpose((4, 0, 1, 2, 3))
+        padded = self.scratch.zeros(g.shape[:2] + shape, dtype=array_F.dtype)
+        padded[:, :, :T, :R, :S] = g
+        G = self._rfft(padded, shape, np.result_type(array_F.dtype, np.complex64))
+        return np.conj(G, G)
+
+    def _fft_tile(self, array_X, padding, shape, p0, cdtype):
+        """
+        Spectrum of the tile of the zero padded input that starts at padded
+        row p0 and spans the height of the transform.
+
+        Arguments:
+            array_X (ndarray): (C, D, H, W, N) input
+            padding (tuple): zero padding of the input depth, height and width
+            shape (tuple): transform shape (Ld, Lh, Lw)
+            p0 (int): first padded input row of the tile
+            cdtype (dtype): complex dtype of the spectrum
+
+        Returns:
+            ndarray: (Ld, Lh, Lw // 2 + 1, C, N) spectrum
+        """
+        C, D, H, W, N = array_X.shape
+        pad_d, pad_h, pad_w = padding
+        Lh = shape[1]
+        tile = self.scratch.zeros((C, N) + shape, dtype=array_X.dtype)
+        h0, h1 = max(p0 - pad_h, 0), min(p0 - pad_h + Lh, H)
+        if h0 < h1:
+            tile[:, :, pad_d:pad_d + D, h0 + pad_h - p0:h1 + pad_h - p0, pad_w:pad_w + W] = \
+                array_X[:, :, h0:h1].transpose((0, 4, 1, 2, 3))
+        return self._rfft(tile, shape, cdtype)
+
+    def _fft_conv(self, array_X, G, shape, rows, padding, array_Y, alpha, beta):
+        """
+        array_Y <- alpha * conv(array_X, G) + beta * array_Y, a stride 1
+        correlation computed tile by tile as the inverse transform of the
+        product of the input and filter spectra.  For every frequency the
+        product is a (Co, Ci) x (Ci, N) matrix product.
+
+        Arguments:
+            array_X (ndarray): (Ci, D, H, W, N) input
+            G (ndarray): (Ld, Lh, Lw // 2 + 1, Co, Ci) conjugate filter spectra
+            shape (tuple): transform shape (Ld, Lh, Lw)
+            rows (int): output rows per tile
+            padding (tuple): zero padding of the input depth, height and width
+            array_Y (ndarray): (Co, M, P, Q, N) output
+            alpha (float): linear scaling
+            beta (float): accumulation value into array_Y
+        """
+        Co, M, P, Q, N = array_Y.shape
+        Yf = self.scratch.empty(G.shape[:4] + (N, ), dtype=G.dtype)
+        for p0 in range(0, P, rows):
+            p1 = min(p0 + rows, P)
+            Xf = self._fft_tile(array_X, padding, shape, p0, G.dtype)
+            _stacked_dot(G, Xf, Yf)
+            Y = self._irfft(Yf, shape)
+            self._conv_accumulate(array_Y[:, :, p0:p1],
+                                  Y[:, :, :M, :p1 - p0, :Q].transpose((0, 2, 3, 4, 1)),
+                                  alpha, beta)
+
+    def _fft_update(self, layer, array_I, array_E, array_U, alpha):
+        """
+        array_U <- alpha * dW for a stride 1 layer.  The weight gradient is
+        the correlation of the input with the errors, summed over the batch:
+        per frequency a (C, N) x (N, K) product of the input spectrum with the
+        conjugate error spectrum.  The products of all the tiles are summed
+        before a single inverse transform.
+
+        Arguments:
+            layer (ConvLayer): the conv layer as a parameter object
+            array_I (ndarray): (C, D, H, W, N) input
+            array_E (ndarray): (K, M, P, Q, N) errors
+            array_U (ndarray): (C * T * R * S, K) updates
+            alpha (float): linear scaling
+        """
+        C, T, R, S, K = layer.dimF
+        M, P, Q = layer.MPQ
+        shape, rows = self._fft_shape(layer.dimI, layer.TRS, layer.padding, K)
+        cdtype = np.result_type(array_I.dtype, np.complex64)
+
+        Zf = Zf_b = None
+        for p0 in range(0, P, rows):
+            p1 = min(p0 + rows, P)
+            Xf = self._fft_tile(array_I, layer.padding, shape, p0, cdtype)
+            Ef = self._fft_tile(array_E[:, :, p0:p1], (0, 0, 0), shape, 0, cdtype)
+            Ef = np.conj(Ef, Ef).swapaxes(-1, -2)
+            if Zf is None:
+                Zf = _stacked_dot(Xf, Ef)
+            else:
+                if Zf_b is None:
+                    Zf_b = np.empty_like(Zf)
+                Zf += _stacked_dot(Xf, Ef, Zf_b)
+
+        dW = self._irfft(Zf, shape)[:, :, :T, :R, :S]
+        if alpha != 1.0:
+            dW *= alpha
+        array_U[:] = dW.transpose((0, 2, 3, 4, 1)).reshape(array_U.shape)
+
+    def _conv_row_blocks(self, layer, itemsize):
+        """
+        Split the output rows of a layer into ranges whose unfolded input fits
+        in conv_block_bytes.
+
+        Returns:
+            list of (p0, p1) output row ranges covering range(P)
+        """
+        M, P, Q = layer.MPQ
+        row_bytes = layer.dimF2[0] * M * Q * layer.dimI[-1] * itemsize
+        rows = max(1, min(P, self.conv_block_bytes // row_bytes))
+        return [(p0, min(p0 + rows, P)) for p0 in range(0, P, rows)]
+
+    def _conv_accumulate(self, out, ary, alpha, beta):
+        """
+        out <- alpha * ary + beta * out, with ary reshaped to out's shape.
+        """
+        ary = ary.reshape(out.shape)
+        if alpha != 1.0:
+            ary *= alpha
+        if beta == 0:
+            out[:] = ary
+        else:
+            if beta != 1.0:
+                out *= beta
+            out += ary
 
     def deconv_layer(self, dtype,
                      N, C, K,
@@ -1150,7 +3124,7 @@ class NervanaCPU(Backend):
         Create a new PoolLayer parameter object.
         This then is passed as an argument to all pooling kernels.
 
-        op: "max", "avg", "l2" pooling (currently bprop only supports max, but not avg and l2)
+        op: "max", "avg", "l2" pooling
         N: Number of images in mini-batch
 
         C: Number of input feature maps
@@ -1181,6 +3155,8 @@ class NervanaCPU(Backend):
         return PoolLayer(self, dtype, op, N, C, D, H, W, J, T, R, S,
                          pad_c, pad_d, pad_h, pad_w, str_c, str_d, str_h, str_w)
 
+    @recorded
+    @scratch_scope
     def fprop_pool(self, layer, I, O):
         """
         Forward propagate pooling layer.
@@ -1197,46 +3173,37 @@ class NervanaCPU(Backend):
         op = layer.op
 
         J, T, R, S = layer.JTRS
-        C, D, H, W, N = layer.dimI
-        K, M, P, Q, N = layer.dimO
-        pad_c, pad_d, pad_h, pad_w = layer.padding
-        str_c, str_d, str_h, str_w = layer.strides
-        WH = W * H
-        DWH = D * W * H
+        K, N = layer.K, layer.N
 
         array_I = I.get().reshape(layer.dimI)
         array_O = O.get().reshape(layer.dimO)
 
-        for k in range(K):
-            sliceC = layer.pool_slice(k, J, C, pad_c, str_c)
-
-            for m in range(M):
-                sliceD = layer.pool_slice(m, T, D, pad_d, str_d)
-
-                for p in range(P):
-                    sliceH = layer.pool_slice(p, R, H, pad_h, str_h)
-
-                    for q in range(Q):
-                        sliceW = layer.pool_slice(q, S, W, pad_w, str_w)
-
-                        sliceCDHW = np.array([
-                            c * DWH + d * WH + y * W + x
-                            for c in sliceC
-                            for d in sliceD
-                            for y in sliceH
-                            for x in sliceW], dtype=np.intp)
-
-                        sliceI = array_I.reshape((-1, N))
-                        if op == "max":
-                            array_O[k, m, p, q, :] = np.max(
-                                sliceI[sliceCDHW, :], axis=0)
-                        elif op == "avg":
-                            array_O[k, m, p, q, :] = np.mean(
-                                sliceI[sliceCDHW, :], axis=0)
-                        elif op == "l2":
-                            array_O[k, m, p, q, :] = np.sqrt(np.sum(
-                                np.square(sliceI[sliceCDHW, :]), axis=0))
-
+        layer.argmax = None
+        if op == "max":
+            if layer.argmax_buffer is None:
+                layer.argmax_buffer = np.empty(layer.dimO,
+                                               dtype=np.int8 if J * T * R * S <= 128 else np.int16)
+            self._pool_max(layer, array_I, array_O, layer.argmax_buffer)
+            layer.argmax = layer.argmax_buffer
+            return
+
+        windows = self._pool_windows(layer, self._pool_pad(layer, array_I, 0.0))
+        elems = (windows[idx] for idx in np.ndindex(J, T, R, S))
+        if op == "avg":
+            array_O[:] = next(elems)
+            for elem in elems:
+                array_O += elem
+            array_O.reshape((K, -1, N))[:] /= layer.window_size
+        elif op == "l2":
+            array_O.fill(0)
+            square = self.scratch.empty(array_O.shape, dtype=array_O.dtype)
+            for elem in elems:
+                np.square(elem, square)
+                array_O += square
+            np.sqrt(array_O, array_O)
+
+    @recorded
+    @scratch_scope
     def bprop_pool(self, layer, I, E, delta, alpha=1.0, beta=0.0):
         """
         Backward propagate pooling layer.
@@ -1247,7 +3214,7 @@ class NervanaCPU(Backend):
             I (Tensor): Input tensor.
             E (Tensor): Error tensor.
             delta (Tensor): Gradient tensor (delta)
-            alpha (float): linear scaling (does not work for l2 pooling)
+            alpha (float): linear scaling
             beta (float): accumulation value into grad_I
         """
 
@@ -1258,56 +3225,151 @@ class NervanaCPU(Backend):
 
         J, T, R, S = layer.JTRS
         C, D, H, W, N = layer.dimI
-        K, M, P, Q, N = layer.dimO
+        K = layer.K
+        DHW = D * H * W
+
+        array_E = E.get().reshape((K, -1, N))
+        array_delta = delta.get().reshape((C * DHW, N))
+        if beta == 0:
+            array_delta.fill(0)
+        elif beta != 1.0:
+            array_delta *= beta
+
+        if op == "max":
+            # route each error to the input that won the max of its window, as
+            # recorded by the fprop_pool this bprop follows, or recomputed
+            argmax, layer.argmax = layer.argmax, None
+            if argmax is None:
+                argmax = self.scratch.empty(layer.dimO, dtype=np.int16)
+                self._pool_max(layer, I.get().reshape(layer.dimI),
+                               self.scratch.empty(layer.dimO, dtype=array_E.dtype), argmax)
+            argmax = argmax.reshape((K, -1, N))
+            j, trs = argmax // (T * R * S), argmax % (T * R * S)
+            rows = (layer.fprop_lut_c[j, np.arange(K)[:, None, None]] * DHW +
+                    layer.fprop_lut[trs, np.arange(argmax.shape[1])[:, None]])
+            self._pool_scatter(layer, array_delta, rows, alpha * array_E)
+        elif op in ("avg", "l2"):
+            # every valid element of a window shares its error, evenly for avg
+            # and in proportion to x / |x| for l2.  Window elements are strided
+            # views over the (padded) gradient, accumulated one at a time so
+            # overlapping windows need no scatter.
+            if op == "avg":
+                errors = array_E * (alpha / layer.window_size)
+            else:
+                norm = CPUTensor(self, ary=self.scratch.empty(layer.dimO2, dtype=E.dtype),
+                                 dtype=E.dtype)
+                self.fprop_pool(layer, I, norm)
+                norm = norm.get().reshape((K, -1, N))
+                errors = self.scratch.zeros(norm.shape, dtype=norm.dtype)
+                np.divide(alpha * array_E, norm, errors, where=norm > 0)
+                inputs = self._pool_windows(layer, self._pool_pad(layer, I.get(), 0.0))
+            errors = errors.reshape(layer.dimO)
+
+            array_P = self._pool_pad(layer, array_delta, None)
+            grads = self._pool_windows(layer, array_P)
+            for idx in np.ndindex(J, T, R, S):
+                if op == "avg":
+                    grads[idx] += errors
+                else:
+                    grads[idx] += inputs[idx] * errors
+            if any(layer.padding):
+                pad_c, pad_d, pad_h, pad_w = layer.padding
+                array_delta.reshape(layer.dimI)[:] += array_P[pad_c:pad_c + C, pad_d:pad_d + D,
+                                                              pad_h:pad_h + H, pad_w:pad_w + W]
+        else:
+            raise NotImplementedError
+
+    def _pool_max(self, layer, array_I, array_O, argmax):
+        """
+        Max pool array_I into array_O, recording in argmax the flat
+        (j, t, r, s) window element that won each output.  Ties go to the first
+        element of the window.
+        """
+        J, T, R, S = layer.JTRS
+
+        windows = self._pool_windows(layer, self._pool_pad(layer, array_I, -np.inf))
+        mask = self.scratch.empty(layer.dimO, dtype=bool)
+        winner = self.scratch.empty(layer.dimO, dtype=argmax.dtype)
+
+        array_O[:] = windows[0, 0, 0, 0]
+        argmax.fill(0)
+        for i, idx in enumerate(np.ndindex(J, T, R, S)):
+            if i == 0:
+                continue
+            elem = windows[idx]
+            np.greater(elem, array_O, mask)
+            np.maximum(array_O, elem, array_O)
+            # elements are visited in increasing order, so a later winner
+            # always has the larger index
+            np.multiply(mask.view(np.int8), i, winner)
+            np.maximum(argmax, winner, argmax)
+
+    def _pool_pad(self, layer, array, pad_value):
+        """
+        Surround a (C, D, H, W, N) array with the layer's padding, filled with
+        pad_value, or with zeros and left empty inside when pad_value is None.
+        Unpadded layers get the array back as is.
+        """
+        C, D, H, W, N = layer.dimI
         pad_c, pad_d, pad_h, pad_w = layer.padding
-        str_c, str_d, str_h, str_w = layer.strides
-        WH = W * H
-        DWH = D * W * H
+        array = array.reshape(layer.dimI)
+        if not any(layer.padding):
+            return array
 
-        array_I = I.get().reshape(layer.dimI)
-        array_E = E.get().reshape(layer.dimO)
-        array_E[:] = array_E * alpha
-        array_delta = delta.get().reshape(layer.dimI)
-        array_delta[:] = array_delta * beta
-
-        for k in range(K):
-            sliceC = layer.pool_slice(k, J, C, pad_c, str_c)
-
-            for m in range(M):
-                sliceD = layer.pool_slice(m, T, D, pad_d, str_d)
-
-                for p in range(P):
-                    sliceH = layer.pool_slice(p, R, H, pad_h, str_h)
-
-                    for q in range(Q):
-                        sliceW = layer.pool_slice(q, S, W, pad_w, str_w)
-
-                        sliceCDHW = np.array([
-                            c * DWH + d * WH + y * W + x
-                            for c in sliceC
-                            for d in sliceD
-                            for y in sliceH
-                            for x in sliceW], dtype=np.intp)
-
-                        sliceB = array_delta.reshape((-1, N))
-
-                        if op == "max":
-                            sliceI = array_I.reshape((-1, N))
-                            max_idx = np.argmax(sliceI[sliceCDHW, :], axis=0)
-                            for n in range(N):
-                                sliceB[
-                                    sliceCDHW[max_idx[n]], n] += array_E[k, m, p, q, n]
-                        elif op == "avg":
-                            sliceB[
-                                sliceCDHW, :] += array_E[k, m, p, q, :] * (1.0 / sliceCDHW.size)
-                        else:
-                            raise NotImplementedError
+        array_P = self.scratch.zeros((C + 2 * pad_c, D + 2 * pad_d, H + 2 * pad_h,
+                                      W + 2 * pad_w, N), dtype=array.dtype)
+        if pad_value is not None:
+            array_P.fill(pad_value)
+            array_P[pad_c:pad_c + C, pad_d:pad_d + D, pad_h:pad_h + H, pad_w:pad_w + W] = array
+        return array_P
+
+    def _pool_windows(self, layer, array_P):
+        """
+        Strided view of every pooling window of a padded (C, D, H, W, N)
+        array, without copying it.
+
+        Arguments:
+            layer (PoolLayer): The pool layer object
+            array_P (ndarray): input, padded by _pool_pad
+
+        Returns:
+            ndarray: (J, T, R, S, K, M, P, Q, N) view, where indexing the
+                     leading (j, t, r, s) gives that window element of every
+                     output as a strided (K, M, P, Q, N) array
+        """
+        str_c, str_d, str_h, str_w = layer.strides
+        s_c, s_d, s_h, s_w, s_n = array_P.strides
+        return as_strided(array_P, shape=layer.JTRS + layer.dimO,
+                          strides=(s_c, s_d, s_h, s_w,
+                                   s_c * str_c, s_d * str_d, s_h * str_h, s_w * str_w, s_n))
+
+    def _pool_scatter(self, layer, array_delta, rows, errors):
+        """
+        array_delta[rows, n] += errors[..., n], where rows broadcasts against
+        errors and holds flat (c, d, h, w) input indices.  Overlapping windows
+        can hit the same input more than once, so those are accumulated with
+        bincount instead of a buffered fancy index add.
+        """
+        N = array_delta.shape[1]
+        cols = np.arange(N)
+        if not layer.overlap:
+            array_delta[rows, cols] += errors
+        else:
+            rows, errors = np.broadcast_arrays(rows * N + cols, errors)
+            array_delta += np.bincount(rows.ravel(), weights=errors.ravel(),
+                                       minlength=array_delta.size).reshape(array_delta.shape)
 
+    @recorded
+    @scratch_scope
     def compound_fprop_bn(self, x, xsum, xvar, gmean, gvar, gamma, beta, y, eps, rho, relu):
         """
         Function to perform batch normalization forward pass. Included
         for API compatibility with GPU compound kernel call.
 
+        The features are processed in blocks of rows small enough to stay in
+        cache, so the variance and the normalized output take one pass over
+        x.  The inverse standard deviation is kept for compound_bprop_bn.
+
         Arguments:
             x (Tensor): Input from previous layer
             xsum (Tensor): Precomputed batch sum over PQN dimension
@@ -1319,23 +3381,53 @@ class NervanaCPU(Backend):
             y (Tensor): normalized output
             eps (float): constant for numerical stability
             rho (float): exponential window averaging constant
-        """
-        xvar[:] = self.var(x, axis=1)
-        xsum[:] = xsum / x.shape[1]  # reuse xsum instead of computing xmean
-        xhat = (x - xsum) / self.sqrt(xvar + eps)
+            relu (bool): apply ReLu to the output
+        """
+        array_x = x._tensor
+        array_y = y._tensor.reshape(array_x.shape)
+        nfm, M = array_x.shape
+        dtype = self._compute_dtype(x.dtype)
+
+        # reuse xsum for the mean instead of computing xmean
+        xsum[:] = xsum / M
+        mean = self._upcast(xsum._tensor)
+        var = self.scratch.empty((nfm, 1), dtype=dtype)
+        scale = self.scratch.empty((nfm, 1), dtype=dtype)
+        invstd = self._bn_invstd(xvar, (nfm, 1), dtype)
+        array_gamma, array_beta = self._upcast(gamma._tensor), self._upcast(beta._tensor)
+
+        for r0, r1, xc, sq in self._bn_blocks(nfm, M, dtype):
+            np.subtract(array_x[r0:r1], mean[r0:r1], xc)
+            np.multiply(xc, xc, sq)
+            np.sum(sq, axis=1, keepdims=True, out=var[r0:r1])
+            var[r0:r1] /= M
+            np.add(var[r0:r1], eps, invstd[r0:r1])
+            np.sqrt(invstd[r0:r1], invstd[r0:r1])
+            np.divide(1., invstd[r0:r1], invstd[r0:r1])
+            np.multiply(array_gamma[r0:r1], invstd[r0:r1], scale[r0:r1])
+            np.multiply(xc, scale[r0:r1], xc)
+            xc += array_beta[r0:r1]
+            if relu:
+                np.maximum(xc, 0, xc)
+            self._store(array_y[r0:r1], xc, self._rounding(y))
+
+        self._store(xvar._tensor, var)
+        self.bn_invstd[id(xvar)][2] = eps
 
         gmean[:] = gmean * rho + (1.0 - rho) * xsum
         gvar[:] = gvar * rho + (1.0 - rho) * xvar
 
-        outputs = y.reshape(xhat.shape)
-        outputs[:] = xhat * gamma + beta
-
+    @recorded
+    @scratch_scope
     def compound_bprop_bn(self, delta, grad_gamma, grad_beta, x, xsum, xvar,
                           gamma, eps):
         """
         Function to perform batch normalization backward pass. Included
         for API compatibility with GPU compound kernel call.
 
+        Like the forward pass it takes one pass over x and delta in blocks of
+        rows, with the inverse standard deviation of the forward pass.
+
         Arguments:
             delta (Tensor): Delta buffer
             grad_gamma (Tensor): Gradient w.r.t. gamma
@@ -1346,11 +3438,300 @@ class NervanaCPU(Backend):
             gamma (Tensor): scale parameter
             eps (float): constant for numerical stability
         """
-        xhat = (x - xsum) / self.sqrt(xvar + eps)
-        grad_gamma[:] = self.sum(xhat * delta, axis=1)
-        grad_beta[:] = self.sum(delta, axis=1)
-        xtmp = (xhat * grad_gamma + grad_beta) / float(x.shape[1])
-        delta[:] = gamma * (delta - xtmp) / self.sqrt(xvar + eps)
+        array_x = x._tensor
+        array_delta = delta._tensor
+        nfm, M = array_x.shape
+        dtype = self._compute_dtype(x.dtype)
+
+        cached = self.bn_invstd.get(id(xvar))
+        if cached is not None and cached[0]() is xvar and cached[2] == eps:
+            invstd = cached[1]
+        else:
+            invstd = 1. / np.sqrt(self._upcast(xvar._tensor) + eps)
+        mean = self._upcast(xsum._tensor)
+        array_gamma = self._upcast(gamma._tensor)
+        gg = self.scratch.empty((nfm, 1), dtype=dtype)
+        gb = self.scratch.empty((nfm, 1), dtype=dtype)
+
+        if array_delta.dtype != dtype:
+            dbuf = self.scratch.empty((min(nfm, self._bn_rows(M, dtype)), M), dtype=dtype)
+        for r0, r1, xhat, dc in self._bn_blocks(nfm, M, dtype):
+            d = array_delta[r0:r1]
+            if d.dtype != dtype:
+                dbuf[:r1 - r0] = d
+                d = dbuf[:r1 - r0]
+            np.subtract(array_x[r0:r1], mean[r0:r1], xhat)
+            np.multiply(xhat, invstd[r0:r1], xhat)
+            np.multiply(xhat, d, dc)
+            np.sum(dc, axis=1, keepdims=True, out=gg[r0:r1])
+            np.sum(d, axis=1, keepdims=True, out=gb[r0:r1])
+            # delta <- gamma * invstd * (delta - (xhat * grad_gamma + grad_beta) / M)
+            np.multiply(xhat, gg[r0:r1] / M, xhat)
+            xhat += gb[r0:r1] / M
+            np.subtract(d, xhat, dc)
+            np.multiply(dc, array_gamma[r0:r1] * invstd[r0:r1], dc)
+            self._store(array_delta[r0:r1], dc, self._rounding(delta))
+
+        self._store(grad_gamma._tensor, gg, self._rounding(grad_gamma))
+        self._store(grad_beta._tensor, gb, self._rounding(grad_beta))
+
+    def _bn_invstd(self, xvar, shape, dtype):
+        """
+        Buffer for the inverse standard deviation of the batch norm with the
+        given xvar, allocated on its first forward pass and freed with xvar
+        """
+        cached = self.bn_invstd.get(id(xvar))
+        if (cached is None or cached[0]() is not xvar or cached[1].shape != shape or
+                cached[1].dtype != dtype):
+            def forget(ref, cache=self.bn_invstd, key=id(xvar)):
+                if cache.get(key, [None])[0] is ref:
+                    del cache[key]
+            cached = [weakref.ref(xvar, forget), np.empty(shape, dtype=dtype), None]
+            self.bn_invstd[id(xvar)] = cached
+        cached[2] = None
+        return cached[1]
+
+    def _bn_blocks(self, nfm, M, dtype):
+        """
+        Blocks of rows of a (nfm, M) batch norm input of about ew_block_bytes
+        along with two scratch buffers for them.
+        """
+        rows = min(nfm, self._bn_rows(M, dtype))
+        buf0 = self.scratch.empty((rows, M), dtype=dtype)
+        buf1 = self.scratch.empty((rows, M), dtype=dtype)
+        for r0 in range(0, nfm, rows):
+            r1 = min(nfm, r0 + rows)
+            yield r0, r1, buf0[:r1 - r0], buf1[:r1 - r0]
+
+    def _bn_rows(self, M, dtype):
+        """
+        Rows of M values of dtype in a batch norm block
+        """
+        return max(1, self.ew_block_bytes // (M * np.dtype(dtype).itemsize))
+
+    def _fused_cell(self, tensor, *kinds):
+        """
+        Whether the recurrent cell kernels on tensor can apply activations of
+        the given kinds in place with numpy, rather than through op-trees
+        """
+        return self._compute_dtype(tensor.dtype) == tensor.dtype and None not in kinds
+
+    @recorded
+    @scratch_scope
+    def compound_lstm_fprop_step(self, ifog, c_prev, c, c_act, h, gate_activation, activation):
+        """
+        Gate activations and state updates of a step of an LSTM layer, from
+        the pre-activations of its input, forget, output and input modulation
+        gates.
+
+        The activations are applied in place on ifog and the state updates
+        written straight to c, c_act and h, with c_act holding i * g until
+        it is computed.  Other activations and float16 tensors go through
+        the op-tree version.
+
+        Arguments:
+            ifog (Tensor): gate pre-activations, replaced by the activations
+            c_prev (Tensor): cell state of the previous step
+            c (Tensor): cell state output
+            c_act (Tensor): cell activation output
+            h (Tensor): hidden state output
+            gate_activation (Transform): activation of the gates
+            activation (Transform): activation of the input modulation and cell
+        """
+        gate_kind, kind = _cell_activation(gate_activation), _cell_activation(activation)
+        if not self._fused_cell(h, gate_kind, kind):
+            return super(NervanaCPU, self).compound_lstm_fprop_step(
+                ifog, c_prev, c, c_act, h, gate_activation, activation)
+
+        nout = h.shape[0]
+        array_ifog = ifog._tensor
+        i, f, o, g = [array_ifog[k * nout:(k + 1) * nout] for k in range(4)]
+        array_c, array_c_act = c._tensor, c_act._tensor
+
+        _activate(gate_kind, array_ifog[:nout * 3])
+        _activate(kind, g)
+
+        np.multiply(i, g, array_c_act)
+        np.multiply(f, _host(c_prev), array_c)
+        array_c += array_c_act
+        array_c_act[:] = array_c
+        _activate(kind, array_c_act)
+        np.multiply(o, array_c_act, h._tensor)
+
+    @recorded
+    @scratch_scope
+    def compound_lstm_bprop_step(self, ifog, c_prev, c_act, in_deltas, ifog_delta, c_delta,
+                                 c_delta_prev, gate_activation, activation):
+        """
+        Gate pre-activation and cell state deltas of a step of an LSTM layer,
+        computed in place in ifog_delta and c_delta with a single scratch
+        buffer.  Other activations and float16 tensors go through the op-tree
+        version.
+
+        Arguments:
+            ifog (Tensor): gate activations of the step
+            c_prev (Tensor): cell state of the previous step, 0 for the first
+            c_act (Tensor): cell activation of the step
+            in_deltas (Tensor): hidden state deltas of the step
+            ifog_delta (Tensor): gate pre-activation delta output
+            c_delta (Tensor): cell state deltas of the step, accumulated
+            c_delta_prev (Tensor): cell state delta output for the previous
+                                   step, None for the first
+            gate_activation (Transform): activation of the gates
+            activation (Transform): activation of the input modulation and cell
+        """
+        gate_kind, kind = _cell_activation(gate_activation), _cell_activation(activation)
+        if not self._fused_cell(c_act, gate_kind, kind):
+            return super(NervanaCPU, self).compound_lstm_bprop_step(
+                ifog, c_prev, c_act, in_deltas, ifog_delta, c_delta, c_delta_prev,
+                gate_activation, activation)
+
+        nout = c_act.shape[0]
+        array_ifog, array_delta = ifog._tensor, ifog_delta._tensor
+        i, f, o, g = [array_ifog[k * nout:(k + 1) * nout] for k in range(4)]
+        i_delta, f_delta, o_delta, g_delta = [array_delta[k * nout:(k + 1) * nout]
+                                              for k in range(4)]
+        array_c_act, array_in, array_c_delta = c_act._tensor, in_deltas._tensor, c_delta._tensor
+        buf = self.scratch.empty(array_c_act.shape, array_c_act.dtype)
+
+        # o_delta holds o * in_deltas until it is computed
+        np.multiply(o, array_in, o_delta)
+        _activation_grad(kind, array_c_act, buf)
+        buf *= o_delta
+        array_c_delta += buf
+
+        _activation_grad(gate_kind, i, i_delta)
+        i_delta *= array_c_delta
+        i_delta *= g
+
+        if isinstance(c_prev, CPUTensor):
+            _activation_grad(gate_kind, f, f_delta)
+            f_delta *= array_c_delta
+            f_delta *= c_prev._tensor
+        else:
+            # no previous cell state in the first step
+            f_delta.fill(0)
+
+        _activation_grad(gate_kind, o, o_delta)
+        o_delta *= array_in
+        o_delta *= array_c_act
+
+        _activation_grad(kind, g, g_delta)
+        g_delta *= array_c_delta
+        g_delta *= i
+
+        if c_delta_prev is not None:
+            np.multiply(array_c_delta, f, c_delta_prev._tensor)
+
+    @recorded
+    @scratch_scope
+    def compound_gru_fprop_step(self, Wrz_recur, Whcan_recur, h_prev, rzhcan, rzhcan_rec,
+                                rh_prev, h, gate_activation, activation):
+        """
+        Recurrent gemms, gate activations and state update of a step of a GRU
+        layer, from the pre-activations of its reset, update and candidate
+        gates.
+
+        The recurrent inputs are added and the activations applied in place
+        on rzhcan.  Other activations and float16 tensors go through the
+        op-tree version.
+
+        Arguments:
+            Wrz_recur (Tensor): recurrent weights of the reset and update gates
+            Whcan_recur (Tensor): recurrent weights of the candidate
+            h_prev (Tensor): hidden state of the previous step
+            rzhcan (Tensor): gate pre-activations from the inputs, replaced by
+                             the activations
+            rzhcan_rec (Tensor): buffer for the recurrent gate inputs
+            rh_prev (Tensor): reset previous hidden state output
+            h (Tensor): hidden state output
+            gate_activation (Transform): activation of the gates
+            activation (Transform): activation of the candidate
+        """
+        gate_kind, kind = _cell_activation(gate_activation), _cell_activation(activation)
+        if not self._fused_cell(h, gate_kind, kind):
+            return super(NervanaCPU, self).compound_gru_fprop_step(
+                Wrz_recur, Whcan_recur, h_prev, rzhcan, rzhcan_rec, rh_prev, h,
+                gate_activation, activation)
+
+        nout = h.shape[0]
+        array_rzhcan, array_rec = rzhcan._tensor, rzhcan_rec._tensor
+        rz, r, z, hcan = (array_rzhcan[:nout * 2], array_rzhcan[:nout],
+                          array_rzhcan[nout:nout * 2], array_rzhcan[nout * 2:])
+        array_h, array_h_prev = h._tensor, h_prev._tensor
+
+        self.compound_dot(Wrz_recur, h_prev, rzhcan_rec[:nout * 2])
+        rz += array_rec[:nout * 2]
+        _activate(gate_kind, rz)
+        np.multiply(r, array_h_prev, rh_prev._tensor)
+
+        self.compound_dot(Whcan_recur, rh_prev, rzhcan_rec[nout * 2:])
+        hcan += array_rec[nout * 2:]
+        _activate(kind, hcan)
+
+        buf = self.scratch.empty(array_h.shape, array_h.dtype)
+        np.subtract(1, z, array_h)
+        array_h *= array_h_prev
+        np.multiply(z, hcan, buf)
+        array_h += buf
+
+    @recorded
+    @scratch_scope
+    def compound_gru_bprop_step(self, Wrz_recur, Whcan_recur, rzhcan, h_prev, in_deltas,
+                                rzhcan_delta, h_delta, wrc_T_dc, gate_activation, activation):
+        """
+        Gate pre-activation and hidden state deltas of a step of a GRU layer,
+        computed in place in rzhcan_delta and h_delta with a single scratch
+        buffer.  Other activations and float16 tensors go through the op-tree
+        version.
+
+        Arguments:
+            Wrz_recur (Tensor): recurrent weights of the reset and update gates
+            Whcan_recur (Tensor): recurrent weights of the candidate
+            rzhcan (Tensor): gate activations of the step
+            h_prev (Tensor): hidden state of the previous step, 0 for the first
+            in_deltas (Tensor): hidden state deltas of the step
+            rzhcan_delta (Tensor): gate pre-activation delta output
+            h_delta (Tensor): previous hidden state delta output
+            wrc_T_dc (Tensor): buffer for the candidate deltas through
+                               Whcan_recur
+            gate_activation (Transform): activation of the gates
+            activation (Transform): activation of the candidate
+        """
+        gate_kind, kind = _cell_activation(gate_activation), _cell_activation(activation)
+        if not self._fused_cell(h_delta, gate_kind, kind):
+            return super(NervanaCPU, self).compound_gru_bprop_step(
+                Wrz_recur, Whcan_recur, rzhcan, h_prev, in_deltas, rzhcan_delta, h_delta,
+                wrc_T_dc, gate_activation, activation)
+
+        nout = in_deltas.shape[0]
+        array_rzhcan, array_delta = rzhcan._tensor, rzhcan_delta._tensor
+        r, z, hcan = [array_rzhcan[k * nout:(k + 1) * nout] for k in range(3)]
+        r_delta, z_delta, hcan_delta = [array_delta[k * nout:(k + 1) * nout]
+                                        for k in range(3)]
+        array_in, array_h_delta, array_wrc = in_deltas._tensor, h_delta._tensor, wrc_T_dc._tensor
+        array_h_prev = _host(h_prev)
+        buf = self.scratch.empty(array_in.shape, array_in.dtype)
+
+        _activation_grad(kind, hcan, hcan_delta)
+        hcan_delta *= array_in
+        hcan_delta *= z
+
+        _activation_grad(gate_kind, z, z_delta)
+        z_delta *= array_in
+        np.subtract(hcan, array_h_prev, buf)
+        z_delta *= buf
+
+        self.compound_dot(Whcan_recur.T, rzhcan_delta[nout * 2:], wrc_T_dc)
+        _activation_grad(gate_kind, r, r_delta)
+        r_delta *= array_wrc
+        r_delta *= array_h_prev
+
+        np.subtract(1, z, array_h_delta)
+        array_h_delta *= array_in
+        self.compound_dot(Wrz_recur.T, rzhcan_delta[:nout * 2], h_delta, beta=1.0)
+        np.multiply(r, array_wrc, buf)
+        array_h_delta += buf
 
     def _hist_tensor(self, tag):
         """
@@ -1407,7 +1407,7 @@ class NervanaGPU(Backend):
                    pad_d=0, pad_h=0, pad_w=0,
                    str_d=1, str_h=1, str_w=1,
                    relu=False, bsum=False,
-                   deterministic_update=False):
+                   deterministic_update=False, algo=None):
         """
         Create a new ConvLayer parameter object.
         This then is passed as an argument to all the convolution operations.
@@ -1437,6 +1437,8 @@ class NervanaGPU(Backend):
         deterministic_update: eleminate atom adds in the update operation
                               can slow the kernel down
 
+        algo: convolution algorithm of the cpu backend, ignored
+
         """
         return ConvLayer(self, dtype, N, C, K, D, H, W, T, R, S,
                          pad_d, pad_h, pad_w, str_d, str_h, str_w,
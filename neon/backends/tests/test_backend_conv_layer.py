@@ -21,6 +21,7 @@ be a valid checking. It requires externally pad the input, while NervanaCPU does
 not require so
 """
 import itertools as itt
+import json
 import numpy as np
 from operator import mul
 
@@ -119,6 +120,21 @@ def pytest_generate_tests(metafunc):
         fargs = itt.product(N_C_K, D_H_W, T_R_S)
         metafunc.parametrize("fargs_tests", fargs)
 
+    if 'winograd_args' in metafunc.fixturenames:
+        algos = ['winograd_2x2', 'winograd_4x4']
+        N_C_K_H_W = [(8, 3, 16, 7, 9), (32, 32, 32, 14, 14)]
+        padding = [0, 1, 2]
+        fargs = itt.product(algos, N_C_K_H_W, padding)
+        metafunc.parametrize("winograd_args", fargs)
+
+    if 'fft_args' in metafunc.fixturenames:
+        N_C_K = [(8, 3, 16), (32, 16, 8)]
+        D_H_W_T_R_S = [(1, 15, 17, 1, 7, 7), (1, 12, 12, 1, 3, 5), (5, 9, 9, 3, 3, 3)]
+        padding = [0, 1, 3]
+        block_bytes = [1024, 256 * 1024 * 1024]
+        fargs = itt.product(N_C_K, D_H_W_T_R_S, padding, block_bytes)
+        metafunc.parametrize("fft_args", fargs)
+
 
 def test_conv_layer(fargs_tests):
 
@@ -225,6 +241,98 @@ def test_conv_layer(fargs_tests):
     del ng
     del nc
 
+
+def test_conv_winograd(winograd_args):
+
+    algo, (N, C, K, H, W), pad = winograd_args
+    dtype = np.float32
+
+    nc = NervanaCPU()
+    conv = nc.conv_layer(dtype, N, C, K, H=H, W=W, R=3, S=3, pad_h=pad, pad_w=pad)
+
+    cpuI = np.random.uniform(-0.8, 0.8, conv.dimI).astype(dtype)
+    cpuF = np.random.uniform(-0.3, 0.3, conv.dimF).astype(dtype)
+    cpuE = np.random.uniform(-0.2, 0.2, conv.dimO).astype(dtype)
+
+    for step in range(2):
+        results = []
+        for conv.algo in ('direct', algo):
+            results.append(run_backend_conv(nc, conv, cpuI, cpuF, cpuE, dtype))
+
+        for op, direct, fast in zip(("fprop", "bprop", "update"), *results):
+            print op
+            scale = np.max(np.abs(direct.get()))
+            assert np.allclose(fast.get(), direct.get(), rtol=0, atol=1e-4 * scale)
+
+        # the cached filter transforms have to follow the weight update
+        cpuF = cpuF - 0.1 * results[0][2].get().reshape(conv.dimF)
+
+
+def test_conv_fft(fft_args):
+
+    (N, C, K), (D, H, W, T, R, S), pad, block_bytes = fft_args
+    dtype = np.float32
+
+    # a small block size splits the transforms into tiles of a few rows
+    nc = NervanaCPU(conv_block_bytes=block_bytes)
+    conv = nc.conv_layer(dtype, N, C, K, D, H, W, T, R, S,
+                         pad_d=min(pad, T - 1), pad_h=pad, pad_w=pad)
+
+    cpuI = np.random.uniform(-0.8, 0.8, conv.dimI).astype(dtype)
+    cpuF = np.random.uniform(-0.3, 0.3, conv.dimF).astype(dtype)
+    cpuE = np.random.uniform(-0.2, 0.2, conv.dimO).astype(dtype)
+
+    for step in range(2):
+        results = []
+        for conv.algo in ('direct', 'fft'):
+            results.append(run_backend_conv(nc, conv, cpuI, cpuF, cpuE, dtype))
+
+        for op, direct, fft in zip(("fprop", "bprop", "update"), *results):
+            print op
+            scale = np.max(np.abs(direct.get()))
+            assert np.allclose(fft.get(), direct.get(), rtol=0, atol=1e-4 * scale)
+
+        # the cached filter spectra have to follow the weight update
+        cpuF = cpuF - 0.1 * results[0][2].get().reshape(conv.dimF)
+
+    # strided layers stay on the direct path
+    strided = nc.conv_layer(dtype, N, C, K, H=H, W=W, R=R, S=S, str_h=2, str_w=2)
+    assert not strided.supports('fft')
+
+
+def test_conv_autotune(tmpdir):
+
+    path = str(tmpdir.join('cache', 'conv_autotune.json'))
+    geometry = dict(N=8, C=4, K=8, H=10, W=10, R=3, S=3, pad_h=1, pad_w=1)
+
+    nc = NervanaCPU(conv_autotune='cached', conv_autotune_path=path)
+    conv = nc.conv_layer(np.float32, **geometry)
+    choices = json.load(open(path))
+    assert choices == {nc.autotuner.key(conv, np.float32): conv.algo}
+
+    # other processes start from the cached choice, explicit choices win
+    def benchmark(be, layer, dtype):
+        raise AssertionError("cached geometry timed again")
+    nc = NervanaCPU(conv_autotune='cached', conv_autotune_path=path)
+    nc.autotuner.benchmark = benchmark
+    assert nc.conv_layer(np.float32, **geometry).algo == conv.algo
+    assert nc.conv_layer(np.float32, algo='fft', **geometry).algo == 'fft'
+
+    # retune times the geometry again, once per process
+    nc = NervanaCPU(conv_autotune='retune', conv_autotune_path=path)
+    timed = []
+    nc.autotuner.benchmark = lambda be, layer, dtype: timed.append(layer) or {'fft': 1.0}
+    assert nc.conv_layer(np.float32, **geometry).algo == 'fft'
+    assert nc.conv_layer(np.float32, **geometry).algo == 'fft'
+    assert len(timed) == 1
+    assert json.load(open(path)).values() == ['fft']
+
+    # strided layers only run the direct algorithm
+    nc = NervanaCPU(conv_autotune='retune', conv_autotune_path=path)
+    assert nc.conv_layer(np.float32, str_h=2, str_w=2, **geometry).algo == 'direct'
+    assert NervanaCPU().conv_layer(np.float32, **geometry).algo == 'direct'
+
+
 if __name__ == '__main__':
 
     fargs = [(64, 64, 64),
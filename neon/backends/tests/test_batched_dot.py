@@ -101,3 +101,30 @@ def test_batched_dot():
     assert_tensors_allclose(npU, ncU, rtol=0, atol=1e-3)
 
     del(ng)
+
+
+def test_batched_dot_cpu():
+
+    nc = NervanaCPU()
+    X, N, C, K = 10, 16, 24, 12
+
+    for dtype in (np.float32, np.float64):
+        cpuI, cpuE, cpuW = setup_test_data(X, N, C, K, dtype)
+        for alpha, beta, relu in ((1.0, 0.0, False), (2.0, 0.5, True), (-1.0, 1.0, True)):
+            cpuO, cpuB, cpuU = [np.random.uniform(-1.0, 1.0, a.shape).astype(dtype)
+                                for a in (cpuE, cpuI, cpuW)]
+            devO, devB, devU = [nc.array(a, dtype=dtype) for a in (cpuO, cpuB, cpuU)]
+            devI, devE, devW = [nc.array(a, dtype=dtype) for a in (cpuI, cpuE, cpuW)]
+
+            nc.batched_dot(devW,   devI,   devO, alpha, beta, relu)  # fprop
+            nc.batched_dot(devW.T, devE,   devB, alpha, beta, relu)  # bprop
+            nc.batched_dot(devE,   devI.T, devU, alpha, beta, relu)  # update
+
+            npO = alpha * np.array([np.dot(cpuW, cpuI[i]) for i in range(X)])
+            npB = alpha * np.array([np.dot(cpuW.T, cpuE[i]) for i in range(X)])
+            npU = alpha * sum(np.dot(cpuE[i], cpuI[i].T) for i in range(X))
+            for dev, ref, init in ((devO, npO, cpuO), (devB, npB, cpuB), (devU, npU, cpuU)):
+                if relu:
+                    ref = np.maximum(ref, 0)
+                assert dev.get().dtype == dtype
+                assert np.allclose(dev.get(), ref + beta * init, rtol=0, atol=1e-4)
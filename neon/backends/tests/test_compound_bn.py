@@ -0,0 +1,70 @@
+# ----------------------------------------------------------------------------
+# Copyright 2015 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+# pylint: skip-file
+
+"""
+test the cpu batch norm compound kernels against numpy
+"""
+import numpy as np
+
+from neon.backends.nervanacpu import NervanaCPU
+
+
+def test_compound_bn():
+
+    eps, rho = 1e-3, 0.9
+    nfm, M = 24, 300
+    rng = np.random.RandomState(0)
+    x = rng.uniform(-1, 2, (nfm, M)).astype(np.float32)
+    d = rng.uniform(-1, 1, (nfm, M)).astype(np.float32)
+    gamma = rng.uniform(0.5, 1.5, (nfm, 1)).astype(np.float32)
+    beta = rng.uniform(-1, 1, (nfm, 1)).astype(np.float32)
+
+    mean = x.mean(axis=1, keepdims=True)
+    var = x.var(axis=1, keepdims=True)
+    xhat = (x - mean) / np.sqrt(var + eps)
+    gg = np.sum(xhat * d, axis=1, keepdims=True)
+    gb = np.sum(d, axis=1, keepdims=True)
+    dx = gamma * (d - (xhat * gg + gb) / M) / np.sqrt(var + eps)
+
+    # several rows per block and one row per block
+    for block in (8192, 1024, 128):
+        nc = NervanaCPU(ew_block_bytes=block)
+        for relu in (False, True):
+            X, D = nc.array(x), nc.array(d)
+            xsum = nc.array(x.sum(axis=1, keepdims=True))
+            xvar, y = nc.empty((nfm, 1)), nc.empty((nfm, M))
+            gmean, gvar = nc.zeros((nfm, 1)), nc.ones((nfm, 1))
+            grad_gamma, grad_beta = nc.empty((nfm, 1)), nc.empty((nfm, 1))
+
+            nc.compound_fprop_bn(X, xsum, xvar, gmean, gvar, nc.array(gamma),
+                                 nc.array(beta), y, eps, rho, relu)
+            ref = xhat * gamma + beta
+            assert np.allclose(y.get(), np.maximum(ref, 0) if relu else ref, atol=1e-5)
+            assert np.allclose(xsum.get(), mean, atol=1e-6)
+            assert np.allclose(xvar.get(), var, atol=1e-6)
+            assert np.allclose(gmean.get(), (1 - rho) * mean, atol=1e-6)
+            assert np.allclose(gvar.get(), rho + (1 - rho) * var, atol=1e-6)
+
+            nc.compound_bprop_bn(D, grad_gamma, grad_beta, X, xsum, xvar,
+                                 nc.array(gamma), eps)
+            assert np.allclose(grad_gamma.get(), gg, atol=1e-4)
+            assert np.allclose(grad_beta.get(), gb, atol=1e-4)
+            assert np.allclose(D.get(), dx, atol=1e-5)
+
+        # the inverse standard deviation is kept once per xvar and freed with it
+        assert list(nc.bn_invstd) == [id(xvar)]
+        del xvar
+        assert not nc.bn_invstd
@@ -0,0 +1,73 @@
+# ----------------------------------------------------------------------------
+# Copyright 2015 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+# pylint: skip-file
+
+"""
+test NervanaCPU.compound_dot against numpy, with the alpha, beta, relu and
+bsum epilogue on contiguous and non-contiguous outputs.
+"""
+import itertools as itt
+import numpy as np
+
+from neon.backends.nervanacpu import NervanaCPU
+
+
+def pytest_generate_tests(metafunc):
+    if 'cdot_args' in metafunc.fixturenames:
+        epilogue = [(1.0, 0.0, False), (2.0, 0.0, True), (0.5, 1.0, False), (-1.0, 0.5, True)]
+        transpose = [(False, False), (True, False), (False, True)]
+        fargs = itt.product(epilogue, transpose, [False, True], [np.float32, np.float64])
+        metafunc.parametrize("cdot_args", fargs)
+
+
+def test_compound_dot(cdot_args):
+
+    (alpha, beta, relu), (transA, transB), strided, dtype = cdot_args
+    nc = NervanaCPU()
+    M, N, K = 16, 12, 24
+
+    cpuA = np.random.uniform(-1.0, 1.0, (K, M) if transA else (M, K)).astype(dtype)
+    cpuB = np.random.uniform(-1.0, 1.0, (N, K) if transB else (K, N)).astype(dtype)
+    cpuC = np.random.uniform(-1.0, 1.0, (M, 2 * N)).astype(dtype)
+
+    devA = nc.array(cpuA, dtype=dtype)
+    devB = nc.array(cpuB, dtype=dtype)
+    if strided:
+        # every other column, not contiguous
+        devC = nc.array(cpuC, dtype=dtype)[:, ::2]
+        cpuC = cpuC[:, ::2]
+    else:
+        cpuC = cpuC[:, :N].copy()
+        devC = nc.array(cpuC, dtype=dtype)
+    if strided:
+        # half of the columns, a reshape to (M, 1) would be a copy
+        bsum_buf = nc.zeros((2, M), dtype=np.float32)
+        bsum = bsum_buf[:, :M // 2]
+    else:
+        bsum = nc.zeros((M, 1), dtype=np.float32)
+
+    nc.compound_dot(devA.T if transA else devA, devB.T if transB else devB, devC,
+                    alpha=alpha, beta=beta, relu=relu, bsum=bsum)
+
+    ref = alpha * np.dot(cpuA.T if transA else cpuA, cpuB.T if transB else cpuB)
+    if relu:
+        ref = np.maximum(ref, 0)
+    ref += beta * cpuC
+
+    assert devC.get().dtype == dtype
+    assert np.allclose(devC.get(), ref, rtol=0, atol=1e-5)
+    assert np.allclose(bsum.get().reshape((M, 1)), ref.sum(1, keepdims=True), rtol=0, atol=1e-4)
+    if strided:
+        assert not bsum_buf.get()[:, M // 2:].any()
@@ -92,3 +92,142 @@ def test_vs_numpy(backend_tests, custom_args):
 
     assert_tensors_allclose(
         numpy_func_val, backend_func_val, rtol=1e-2, atol=1e-2)
+
+
+def test_cpu_compiled_optree(backend_cpu64):
+    be = NervanaObject.be
+    block_bytes = be.ew_block_bytes
+    be.ew_block_bytes = 64
+    nplans = len(be.optree_plans)
+    try:
+        f, c, i, g = [np.random.rand(37, 5) for _ in range(4)]
+        bias = np.random.rand(37, 1)
+        c_ref = c.copy()
+        c_dev, f_dev, i_dev, g_dev, b_dev = [be.array(x) for x in (c, f, i, g, bias)]
+        for _ in range(3):
+            # blocked and written straight into the output, which it also reads
+            c_dev[:] = f_dev * c_dev + i_dev * be.tanh(g_dev) + b_dev
+            c_ref = f * c_ref + i * np.tanh(g) + bias
+            assert np.allclose(c_dev.get(), c_ref)
+
+            # reductions are evaluated in one block
+            s_dev = be.empty((1, 5))
+            s_dev[:] = be.sum(be.sqrt(c_dev * 2), axis=0) + 1
+            assert np.allclose(s_dev.get(), np.sum(np.sqrt(c_ref * 2), axis=0) + 1)
+
+        # every call after the first reuses the plan compiled for its key
+        assert len(be.optree_plans) == nplans + 2
+    finally:
+        be.ew_block_bytes = block_bytes
+
+
+def test_cpu_optree_scalars(backend_cpu64):
+    be = NervanaObject.be
+    nplans = len(be.optree_plans)
+    x = np.random.rand(37, 5)
+    x_dev = be.array(x)
+
+    # a learning rate that changes every step reuses the plan
+    for i in range(20):
+        x_dev[:] = x_dev * (1 + i * 1e-3) + be.sqrt(x_dev) * (0.5 / (i + 1))
+        x = x * (1 + i * 1e-3) + np.sqrt(x) * (0.5 / (i + 1))
+        assert np.allclose(x_dev.get(), x)
+    assert len(be.optree_plans) == nplans + 1
+
+    # scalars that optimize to another tree get another plan
+    for c in (2.0, 1.0, 3.0):
+        x_dev[:] = x_dev * c + 0.5
+        x = x * c + 0.5
+        assert np.allclose(x_dev.get(), x)
+
+
+def test_lru_cache():
+    from neon.backends.backend import LRUCache
+    cache = LRUCache(2)
+    cache['a'], cache['b'] = 1, 2
+    assert cache.get('a') == 1
+    cache['c'] = 3
+    assert list(cache) == ['a', 'c'] and cache.get('b') is None
+
+
+def test_optree_optimize(backend_cpu64):
+    be = NervanaObject.be
+    x = be.array(np.random.rand(6, 4))
+    v = be.array(np.random.rand(6, 1))
+
+    # scalar constants, and identities only with fast_math since they drop
+    # the type promotion of the scalar
+    folded = (x * (2.0 * 3.0)).optimize()
+    assert folded[2] == 6.0
+    assert (-(-x)).optimize() is x
+    assert (x * 1 + (2.0 - 2.0)).optimize(fast_math=True) is x
+    kept = (x * 1).optimize()
+    assert kept[0]['op'] == 'mul' and kept[1] is x
+
+    # the shared subexpression is evaluated once
+    std = be.sqrt(v + 1e-5)
+    optree = (x - v) / std + v / std
+    optimized = optree.optimize()
+    assert optimized[1][2] is optimized[2][2]
+    assert np.allclose(optimized.asnumpyarray(), optree.asnumpyarray())
+
+    # broadcast operands are combined before they meet the full sized one,
+    # which changes the rounding so it is left to fast_math
+    optree = (x * v) * 2.0
+    assert optree.optimize() is optree
+    optimized = optree.optimize(fast_math=True)
+    assert optimized[1] is x and optimized[2][0]['shape'] == (6, 1)
+
+
+def test_cpu_scratch_arena():
+    from neon.backends.nervanacpu import ScratchArena
+    arena = ScratchArena(budget=1 << 20, min_bytes=1024)
+
+    # buffers go back to their bucket when the scope exits
+    with arena.scope():
+        a = arena.empty((100, 10), np.float32)
+        b = arena.zeros((30, 10), np.float64)
+        assert a.shape == (100, 10) and not b.any()
+        assert arena.in_use == 4096 + 4096
+    assert arena.in_use == 0 and arena.held == 8192 and arena.high_water == 8192
+    with arena.scope():
+        c = arena.empty((1000, ), np.float32)
+        assert c.base is not None and arena.held == 8192
+
+    # requests beyond the budget are plain allocations
+    with arena.scope():
+        arena.empty((1 << 18, ), np.float64)
+        assert arena.overflow == 1 and arena.held <= arena.budget
+
+
+def test_cpu_threaded_optree():
+    from neon.backends.nervanacpu import NervanaCPU
+    rng = np.random.RandomState(0)
+    x0, x1 = rng.rand(300, 70), rng.rand(300, 70)
+
+    def run(num_threads):
+        be = NervanaCPU(default_dtype=np.float64, num_threads=num_threads,
+                        thread_min_bytes=1024, ew_block_bytes=4096)
+        x, y = be.array(x0), be.array(x1)
+        ew, col, row = be.empty((300, 70)), be.empty((1, 70)), be.empty((300, 1))
+        total, norm, idx = be.empty((1, 1)), be.empty((1, 1)), be.empty((1, 70))
+        outs = []
+        for _ in range(2):
+            ew[:] = be.exp(x - be.max(x, axis=0)) * y + be.sig(y) / x
+            col[:] = be.sum(x * y, axis=0)
+            row[:] = be.sum(be.square(x), axis=1)
+            total[:] = be.sum(x * y)
+            norm[:] = be.sqrt(be.sum(be.square(x - y)))
+            idx[:] = be.argmax((x > 0.3) * 1.0, axis=0)
+            outs.append([t.get().copy() for t in (ew, col, row, total, norm, idx)])
+        return outs
+
+    serial = run(1)
+    assert np.allclose(serial[0][3], np.sum(x0 * x1))
+    assert np.allclose(serial[0][4], np.sqrt(np.sum(np.square(x0 - x1))))
+    assert np.array_equal(serial[0][5], np.argmax(x0 > 0.3, axis=0)[None])
+    # slices and blocks do not change the results, whether run on one
+    # thread or several
+    for outs in serial[1:] + run(3) + run(8):
+        for out, ref in zip(outs, serial[0]):
+            assert np.array_equal(out, ref)
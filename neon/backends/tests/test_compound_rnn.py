@@ -0,0 +1,87 @@
+# ----------------------------------------------------------------------------
+# Copyright 2015 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+# pylint: skip-file
+
+"""
+test the fused cpu lstm and gru step kernels against the op-tree versions
+"""
+import itertools as itt
+import numpy as np
+
+from neon import NervanaObject
+from neon.backends.backend import Backend
+from neon.backends.nervanacpu import NervanaCPU
+from neon.transforms import Identity, Logistic, Rectlin, Tanh
+
+activations = [Identity(), Logistic(), Logistic(shortcut=True), Rectlin(), Tanh()]
+
+
+def run_both(nc, name, make_args):
+    """
+    Call the fused and the op-tree kernel on copies of the same arguments
+    and return the arrays of both
+    """
+    fused, ref = make_args(), make_args()
+    getattr(nc, name)(*fused)
+    getattr(Backend, name).__func__(nc, *ref)
+    return ([a.get() for a in fused if hasattr(a, 'get')],
+            [a.get() for a in ref if hasattr(a, 'get')])
+
+
+def test_compound_rnn_steps(backend_cpu64):
+
+    # the op-tree versions run on the backend of the transforms
+    nc = NervanaObject.be
+    assert isinstance(nc, NervanaCPU)
+    nout, N = 6, 4
+    rng = np.random.RandomState(0)
+
+    for gate, act in itt.product(activations, activations):
+        for first in (False, True):
+            state = np.random.RandomState(rng.randint(1 << 30))
+            vals = [state.uniform(0, 1, (nout * 4, N)) for _ in range(4)] + \
+                [state.uniform(-1, 1, (nout, N)) for _ in range(6)] + \
+                [state.uniform(-1, 1, (nout, nout * 3)) for _ in range(2)]
+
+            def lstm_fprop():
+                return [nc.array(vals[0]), 0 if first else nc.array(vals[4]),
+                        nc.array(vals[5]), nc.array(vals[6]), nc.array(vals[7]), gate, act]
+
+            def lstm_bprop():
+                return [nc.array(vals[0]), 0 if first else nc.array(vals[4]),
+                        nc.array(vals[5]), nc.array(vals[6]), nc.array(vals[1]),
+                        nc.array(vals[7]), None if first else nc.array(vals[8]), gate, act]
+
+            def gru_fprop():
+                return [nc.array(vals[10][:, :nout * 2].T), nc.array(vals[11][:, :nout].T),
+                        nc.array(vals[4]), nc.array(vals[0][:nout * 3]),
+                        nc.array(vals[1][:nout * 3]), nc.array(vals[5]), nc.array(vals[6]),
+                        gate, act]
+
+            def gru_bprop():
+                return [nc.array(vals[10][:, :nout * 2].T), nc.array(vals[11][:, :nout].T),
+                        nc.array(vals[0][:nout * 3]), 0 if first else nc.array(vals[4]),
+                        nc.array(vals[5]), nc.array(vals[1][:nout * 3]), nc.array(vals[6]),
+                        nc.array(vals[7]), gate, act]
+
+            for name, make_args in (('compound_lstm_fprop_step', lstm_fprop),
+                                    ('compound_lstm_bprop_step', lstm_bprop),
+                                    ('compound_gru_fprop_step', gru_fprop),
+                                    ('compound_gru_bprop_step', gru_bprop)):
+                if first and name.endswith('fprop_step'):
+                    continue
+                fused, ref = run_both(nc, name, make_args)
+                for a, b in zip(fused, ref):
+                    assert np.allclose(a, b, rtol=0, atol=1e-12), (name, gate, act)
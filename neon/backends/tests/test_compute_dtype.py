@@ -0,0 +1,92 @@
+# ----------------------------------------------------------------------------
+# Copyright 2015 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+# pylint: skip-file
+
+"""
+test float16 tensors computed in float32 (NervanaCPU compute_dtype) against
+the same computations on float32 tensors.
+"""
+import numpy as np
+
+from neon.backends.nervanacpu import NervanaCPU
+from neon.backends.tests.test_backend_conv_layer import run_backend_conv
+
+
+def assert_fp16_close(x, ref):
+    assert x.dtype == np.float16
+    assert np.allclose(x, ref, rtol=2e-3, atol=2e-3 * np.max(np.abs(ref)))
+
+
+def test_optree_fp16():
+
+    nc = NervanaCPU(default_dtype=np.float16, compute_dtype=np.float32, ew_block_bytes=1024)
+    a = np.random.uniform(-1, 1, (64, 50)).astype(np.float16)
+    b = np.random.uniform(-1, 1, (64, 50)).astype(np.float16)
+    c = np.random.uniform(-1, 1, (1, 50)).astype(np.float16)
+    A, B, C = [nc.array(x) for x in (a, b, c)]
+    a, b, c = [x.astype(np.float32) for x in (a, b, c)]
+
+    out = nc.empty((64, 50))
+    rows = nc.empty((64, 1))
+    total = nc.empty((1, 1))
+    for step in range(2):
+        # blocked and in place
+        out[:] = nc.sig(A) * B + A - C
+        assert_fp16_close(out.get(), 1. / (1. + np.exp(-a)) * b + a - c)
+        out[:] = out * A
+        assert_fp16_close(out.get(), (1. / (1. + np.exp(-a)) * b + a - c) * a)
+        rows[:] = nc.sum(nc.square(A - C), axis=1)
+        assert_fp16_close(rows.get(), np.sum(np.square(a - c), axis=1, keepdims=True))
+        total[:] = nc.sum(A * B)
+        assert_fp16_close(total.get(), np.sum(a * b).reshape((1, 1)))
+
+
+def test_dot_fp16():
+
+    nc = NervanaCPU(default_dtype=np.float16, compute_dtype=np.float32)
+    a = np.random.uniform(-1, 1, (16, 24)).astype(np.float16)
+    b = np.random.uniform(-1, 1, (24, 12)).astype(np.float16)
+    c = np.random.uniform(-1, 1, (16, 12)).astype(np.float16)
+    ref = 2.0 * np.dot(a.astype(np.float32), b.astype(np.float32))
+    for beta in (0.0, 0.5):
+        C = nc.array(c)
+        bsum = nc.empty((16, 1))
+        nc.compound_dot(nc.array(a), nc.array(b), C, alpha=2.0, beta=beta, bsum=bsum)
+        assert_fp16_close(C.get(), ref + beta * c)
+        assert_fp16_close(bsum.get(), np.sum(ref + beta * c, axis=1, keepdims=True))
+
+    w = np.random.uniform(-1, 1, (12, 24)).astype(np.float16)
+    x = np.random.uniform(-1, 1, (5, 24, 8)).astype(np.float16)
+    out = nc.zeros((5, 12, 8))
+    nc.batched_dot(nc.array(w), nc.array(x), out)
+    assert_fp16_close(out.get(), np.array([np.dot(w.astype(np.float32), x[i]) for i in range(5)]))
+
+
+def test_conv_fp16():
+
+    nc = NervanaCPU(compute_dtype=np.float32)
+    N, C, K, H, W = 8, 4, 8, 6, 6
+    for algo in ('direct', 'winograd_2x2'):
+        results = []
+        for dtype in (np.float32, np.float16):
+            conv = nc.conv_layer(dtype, N, C, K, H=H, W=W, R=3, S=3, pad_h=1, pad_w=1,
+                                 algo=algo)
+            rng = np.random.RandomState(0)
+            cpuI = rng.uniform(-1, 1, conv.dimI).astype(np.float16)
+            cpuF = rng.uniform(-1, 1, conv.dimF).astype(np.float16)
+            cpuE = rng.uniform(-1, 1, conv.dimO).astype(np.float16)
+            results.append(run_backend_conv(nc, conv, cpuI, cpuF, cpuE, dtype))
+        for ref, fp16 in zip(*results):
+            assert_fp16_close(fp16.get(), ref.get())
@@ -0,0 +1,69 @@
+# ----------------------------------------------------------------------------
+# Copyright 2015 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+# pylint: skip-file
+
+"""
+test the cpu onehot, which clears only the ones it wrote before
+"""
+import numpy as np
+
+from neon.backends.nervanacpu import NervanaCPU
+
+
+def onehot_ref(ind, nclass, axis):
+    out = np.zeros((nclass, ind.size))
+    out[ind, np.arange(ind.size)] = 1
+    return out if axis == 0 else out.T
+
+
+def test_onehot():
+
+    nc = NervanaCPU()
+    nclass, N = 10, 16
+    rng = np.random.RandomState(0)
+    for axis in (0, 1):
+        shape = (nclass, N) if axis == 0 else (N, nclass)
+        buf = nc.array(rng.uniform(size=shape))
+        for step in range(3):
+            ind = rng.randint(0, nclass, N)
+            buf[:] = nc.onehot(nc.array(ind, dtype=np.int32), axis=axis)
+            assert np.array_equal(buf.get(), onehot_ref(ind, nclass, axis))
+
+        # other writes to the buffer are not left behind
+        buf.fill(1)
+        buf[:] = nc.onehot(nc.array(ind, dtype=np.int32), axis=axis)
+        assert np.array_equal(buf.get(), onehot_ref(ind, nclass, axis))
+        buf[:] = buf * 0 + 2
+        buf[:] = nc.onehot(nc.array(ind, dtype=np.int32), axis=axis)
+        assert np.array_equal(buf.get(), onehot_ref(ind, nclass, axis))
+
+    # views of the same buffer, as the DataIterator writes at the end of an epoch
+    buf = nc.zeros((nclass, N))
+    for n in (N, 5, N):
+        ind = rng.randint(0, nclass, N)
+        buf[:, :n] = nc.onehot(nc.array(ind[:n], dtype=np.int32), axis=0)
+        if n < N:
+            buf[:, n:] = nc.onehot(nc.array(ind[n:], dtype=np.int32), axis=0)
+        assert np.array_equal(buf.get(), onehot_ref(ind, nclass, 0))
+
+    # writes by kernels and through the arrays of the buffer
+    ind = rng.randint(0, nclass, N)
+    for write in (lambda: nc.compound_dot(nc.ones((nclass, 2)), nc.ones((2, N)), buf),
+                  lambda: buf.get().fill(7),
+                  lambda: buf[:, 2:].asnumpyarray().fill(7)):
+        buf[:] = nc.onehot(nc.array(ind, dtype=np.int32), axis=0)
+        write()
+        buf[:] = nc.onehot(nc.array(ind, dtype=np.int32), axis=0)
+        assert np.array_equal(buf.get(), onehot_ref(ind, nclass, 0))
@@ -14,6 +14,8 @@
 # ----------------------------------------------------------------------------
 # pylint: skip-file
 
+import numpy as np
+
 from neon.backends import gen_backend
 from neon.backends.tests.utils import assert_tensors_allclose
 
@@ -107,3 +109,19 @@ def test_cpu_randomstate():
     assert_tensors_allclose([x0, x1], [y0, y1], rtol=0., atol=0.)
     assert_tensors_allclose([x0, x1], [z0, z1], rtol=0., atol=0.)
     del(be)
+
+
+def test_cpu_binary_mask():
+    be = gen_backend(backend='cpu', rng_seed=100)
+
+    for dtype in (np.uint8, np.float32):
+        a = be.empty((256, 128), dtype=dtype)
+        for keep in (0.1, 0.5, 0.9):
+            be.make_binary_mask(a, keepthresh=keep)
+            mask = a.get()
+            assert mask.dtype == dtype
+            assert np.all((mask == 0) | (mask == 1))
+            assert abs(mask.mean() - keep) < 0.01
+        be.make_binary_mask(a, keepthresh=1.0)
+        assert np.all(a.get() == 1)
+    del(be)
@@ -22,5 +22,29 @@ def test_sr():
     assert sum([C_host.flatten()[i] in [1.5] for i in range(n**2)]) > .1 * n**2
     assert sum([C_host.flatten()[i] in [1.] for i in range(n**2)]) > .7 * n**2
 
+
+def test_sr_cpu():
+    """
+    Same as test_sr, with float16 tensors computed in float32 on the cpu, and
+    checks that the rounding is unbiased
+    """
+    cpu = gen_backend(backend='cpu', rng_seed=0, compute_dtype=np.float32)
+    n = 100
+    A = cpu.ones((n, n), dtype=np.float16)
+    B = cpu.ones((n, n), dtype=np.float16)
+    cpu.multiply(B, 0.1, out=B)
+    C = cpu.ones((n, n), dtype=np.float16)
+    C.rounding = 1
+    C[:] = A + B
+    C_host = C.get()
+    assert np.all((C_host == 1.) | (C_host == 1.5))
+    # B is 0.1 rounded to float16, C is 1.5 with probability B / 0.5
+    assert abs(C_host.astype(np.float64).mean() - 1 - B.get()[0, 0]) < 0.01
+
+    # without rounding, the result is rounded to nearest
+    C.rounding = 0
+    C[:] = A + B
+    assert np.all(C.get() == np.float16(1.1))
+
 if __name__ == '__main__':
     test_sr()
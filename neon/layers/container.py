@@ -30,6 +30,10 @@ class LayerContainer(Layer):
                 lto.append(l)
         return lto
 
+    @property
+    def capturable(self):
+        return all(l.capturable for l in self.layers)
+
     def nested_str(self, level=0):
         padstr = '\n' + '  '*level
         ss = '  ' * level + self.__class__.__name__ + padstr
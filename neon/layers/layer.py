@@ -44,8 +44,15 @@ class Layer(NervanaObject):
 
     Arguments:
         name (string): Name identifying this layer (in logs, etc.)
+
+    Attributes:
+        capturable (bool): whether the computation of the layer is made only of
+                           backend calls on its persistent buffers, which can
+                           be recorded and replayed in later training steps
     """
 
+    capturable = True
+
     def __init__(self, name="layer"):
         super(Layer, self).__init__(name)
         self.outputs = None
@@ -256,7 +263,7 @@ class Pooling(Layer):
     Arguments:
         fshape (int, tuple(int, int)): one or two dimensional shape
             of pooling window
-        op (str, optional): pooling operation in [max, avg]. Defaults to "max"
+        op (str, optional): pooling operation in [max, avg, l2]. Defaults to "max"
         strides (int, dict, optional): strides to apply pooling window
             over. An int applies to both dimensions, or a dict with str_h
             and str_w applies to h and w dimensions distinctly.  Defaults
@@ -348,6 +355,15 @@ class ParameterLayer(Layer):
         self.states = []
         self.owns_delta = True
 
+        # int8 inference, see quantize.  quant_axis is the axis of W the
+        # scale of each output channel is taken along, None for layers that
+        # can not be quantized.
+        self.quant_axis = None
+        self.calibrating = False
+        self.in_range = None
+        self.in_scale = None
+        self.qinputs = None
+
     def allocate(self, shared_outputs=None):
         super(ParameterLayer, self).allocate(shared_outputs)
         if self.W is None:
@@ -385,6 +401,9 @@ class ParameterLayer(Layer):
         """
         serial_dict = {'params': {'W': self.W.asnumpyarray(),
                                   'name': self.name}}
+        if self.in_scale is not None:
+            serial_dict['params']['W_scale'] = self.W.scale.asnumpyarray()
+            serial_dict['params']['in_scale'] = self.in_scale.asnumpyarray()
         if keep_states:
             serial_dict['states'] = [s.asnumpyarray() for s in self.states]
         return serial_dict
@@ -406,12 +425,52 @@ class ParameterLayer(Layer):
             logger.warn('Using old serialization file type, will be deprecated.'
                         '  Save model into new format')
             self.W = pdict
+        if type(pdict) is dict and 'W_scale' in pdict:
+            # weights of a quantized layer
+            self.W = self.be.array(self.W, dtype=np.int8)
+            self.W.scale = self.be.array(self.W_scale, dtype=np.float32)
+            self.in_scale = self.be.array(self.in_scale, dtype=np.float32)
+            self.dW = None
+            del self.W_scale
+            return
         self.W = self.be.array(self.W)
         self.dW = self.be.empty_like(self.W)
 
     def set_states(self, states):
         self.states = [self.be.array(x) for x in states]
 
+    def quantize(self):
+        """
+        Switch the layer to int8 inference.  The weights are replaced by int8
+        ones with a scale per output channel, and fprop quantizes the inputs
+        with a single scale from the range recorded during calibration (see
+        Model.calibrate).  The layer can not be trained afterwards.
+        """
+        if self.quant_axis is None:
+            raise NotImplementedError("%s can not be quantized" % self.name)
+        if self.in_range is None:
+            raise ValueError("%s has to be calibrated before it is quantized" % self.name)
+        self.W = self.be.quantize(self.W, self.be.empty(self.W.shape, dtype=np.int8),
+                                  axis=self.quant_axis)
+        self.dW = None
+        self.in_scale = self.be.array(np.full((1, 1), (self.in_range or 1.) / 127.),
+                                      dtype=np.float32)
+
+    def fprop_inputs(self, inputs):
+        """
+        The inputs fprop computes with: their range is recorded while the
+        layer is calibrated, and they are quantized once it is quantized.
+        """
+        if self.calibrating:
+            in_range = self.be.empty((1, 1), dtype=np.float32)
+            in_range[:] = self.be.max(self.be.absolute(inputs))
+            self.in_range = max(self.in_range or 0., float(in_range.get()[0, 0]))
+        if self.in_scale is None:
+            return inputs
+        if self.qinputs is None or self.qinputs.shape != inputs.shape:
+            self.qinputs = self.be.empty(inputs.shape, dtype=np.int8)
+        return self.be.quantize(inputs, self.qinputs, self.in_scale)
+
 
 class Convolution(ParameterLayer):
 
@@ -431,12 +490,19 @@ class Convolution(ParameterLayer):
         init (Initializer, optional): Initializer object to use for
             initializing layer weights
         name (str, optional): layer name. Defaults to "ConvolutionLayer"
+        algo (str, optional): convolution algorithm of the cpu backend, one
+            of 'direct', 'fft', 'winograd_2x2' or 'winograd_4x4'.  The fft
+            algorithm needs unit strides, the Winograd algorithms 3x3 filters
+            and unit strides.  Defaults to the backend's choice, see the
+            conv_autotune argument of gen_backend.  Other backends ignore it.
     """
 
     def __init__(self, fshape, strides={}, padding={}, init=None, bsum=False,
-                 name="ConvolutionLayer"):
+                 name="ConvolutionLayer", algo=None):
         super(Convolution, self).__init__(init, name)
         self.nglayer = None
+        self.algo = algo
+        self.quant_axis = 0
         self.convparams = {'str_h': 1, 'str_w': 1, 'str_d': 1,
                            'pad_h': 0, 'pad_w': 0, 'pad_d': 0,
                            'T': 1, 'D': 1, 'bsum': bsum}  # 3D paramaters
@@ -472,7 +538,10 @@ class Convolution(ParameterLayer):
             shapedict = {k: x for k, x in zip(ikeys, self.in_shape)}
             shapedict['N'] = self.be.bsz
             self.convparams.update(shapedict)
-            self.nglayer = self.be.conv_layer(self.be.default_dtype, **self.convparams)
+            convparams = dict(self.convparams)
+            if self.algo is not None:
+                convparams['algo'] = self.algo
+            self.nglayer = self.be.conv_layer(self.be.default_dtype, **convparams)
             (K, M, P, Q, N) = self.nglayer.dimO
             self.out_shape = (K, P, Q) if M == 1 else (K, M, P, Q)
         if self.weight_shape is None:
@@ -483,7 +552,8 @@ class Convolution(ParameterLayer):
 
     def fprop(self, inputs, inference=False):
         self.inputs = inputs
-        self.be.fprop_conv(self.nglayer, inputs, self.W, self.outputs, bsum=self.batch_sum)
+        self.be.fprop_conv(self.nglayer, self.fprop_inputs(inputs), self.W, self.outputs,
+                           bsum=self.batch_sum)
         return self.outputs
 
     def bprop(self, error, alpha=1.0, beta=0.0):
@@ -601,6 +671,7 @@ class Linear(ParameterLayer):
         self.nout = nout
         self.inputs = None
         self.bsum = bsum
+        self.quant_axis = 1
 
     def __str__(self):
         return "Linear Layer '%s': %d inputs, %d outputs" % (
@@ -619,7 +690,8 @@ class Linear(ParameterLayer):
     def fprop(self, inputs, inference=False):
         self.inputs = inputs
         self.dev_inputs = inputs.reshape((self.nin, -1))
-        self.be.compound_dot(A=self.W, B=self.dev_inputs, C=self.outputs, bsum=self.batch_sum)
+        self.be.compound_dot(A=self.W, B=self.fprop_inputs(self.dev_inputs), C=self.outputs,
+                             bsum=self.batch_sum)
         return self.outputs
 
     def bprop(self, error, alpha=1.0, beta=0.0):
@@ -780,15 +852,17 @@ class Conv(Affine):
         conv_name (str): the name to call the Convolutional layer. Defaults to 'ConvolutionLayer'
         bias_name (str): the name to call the Bias layer. Defaults to 'BiasLayer'
         act_name (str): the name to call the Activation layer. Defaults to ActivationLayer.
+        algo (str, optional): convolution algorithm of the cpu backend, see
+            Convolution
 
     """
 
     def __init__(self, fshape, init, strides={}, padding={}, bias=None, batch_norm=False,
                  activation=None, conv_name='ConvolutionLayer',
-                 bias_name='BiasLayer', act_name='ActivationLayer'):
+                 bias_name='BiasLayer', act_name='ActivationLayer', algo=None):
         list.__init__(self)
         self.append(Convolution(fshape=fshape, strides=strides, padding=padding,
-                                init=init, bsum=batch_norm, name=conv_name))
+                                init=init, bsum=batch_norm, algo=algo, name=conv_name))
         self.add_postfilter_layers(bias, batch_norm, activation, bias_name, act_name)
 
 
@@ -814,7 +888,8 @@ class Dropout(Layer):
 
     Applies an element-wise multiplication of inputs with a keep mask.
 
-    A keep mask is a tensor of ones and zeros of the same shape as the input.
+    A keep mask is a tensor of ones and zeros of the same shape as the input,
+    stored as uint8.
 
     Each fprop call generates an new keep mask stochastically where there
     distribution of ones in the mask is controlled by the keep param.
@@ -842,7 +917,7 @@ class Dropout(Layer):
 
     def allocate(self, shared_outputs=None):
         super(Dropout, self).allocate(shared_outputs)
-        self.keep_mask = self.be.iobuf(self.out_shape)
+        self.keep_mask = self.be.iobuf(self.out_shape, dtype=np.uint8)
 
     def fprop(self, inputs, inference=False):
         self.outputs = self.inputs = inputs
@@ -895,6 +970,11 @@ class LookupTable(ParameterLayer):
 
     LookupTable of dimensions embedding_dim by vocab_size is learnt.
 
+    The weight gradient is row-sparse: bprop sums the errors of each word of
+    the batch into the first columns of dW_sparse, with the ids of those words
+    in dW_rows.  The dense dW is kept up to date by clearing only the columns
+    of the words of the previous batch.
+
     input shape - (nin, batch_size)
 
     output shape - (embedding_dim, nin * batch_size)
@@ -908,10 +988,15 @@ class LookupTable(ParameterLayer):
         name (str, optional): Layer name. Defaults to "LookupTableLayer"
     """
 
+    # the update depends on the word ids read back from the device
+    capturable = False
+
     def __init__(self, vocab_size, embedding_dim, init, name="LookupTableLayer"):
         super(LookupTable, self).__init__(init, name)
         self.embedding_dim = embedding_dim
         self.vocab_size = vocab_size
+        self.dW_sparse = None
+        self.dW_rows = None
 
     def __str__(self):
         return "LookupTable Layer : %d inputs, (%d, %d) outputs size" % (
@@ -930,6 +1015,8 @@ class LookupTable(ParameterLayer):
         if self.inputs is None:
             self.inputs = self.be.zeros(
                 (1, self.nin * self.be.bsz), dtype=np.int32)  # inputs is np.float32
+        self.dW_sparse = self.be.empty((self.embedding_dim, self.nin * self.be.bsz))
+        self.dW_rows = None
 
     def fprop(self, inputs, inference=False):
         self.inputs[:] = inputs.reshape(self.inputs.shape)
@@ -937,18 +1024,23 @@ class LookupTable(ParameterLayer):
         return self.outputs
 
     def bprop(self, error, alpha=1.0, beta=0):
-        self.dW[:] = 0
         wrd_ids = self.inputs.get()[0]
-        unqidx, inv = np.unique(wrd_ids, return_inverse=True)
-        groups = [np.where(inv == i) for i in range(len(unqidx))]
-        for (wrd_id, group) in zip(unqidx, groups):
-            self.dW[:, wrd_id] = self.be.sum(error.take(group[0], axis=1), axis=1)
+        self.dW_rows = self.be.lookup_bprop(wrd_ids, error, self.dW, self.dW_sparse,
+                                            self.dW_rows)
+        return self.deltas
+
+    def sparse_grad(self):
         """
-        alternative bprop
-        for (j, wrd_id) in enumerate(wrd_ids):
-            self.dW[:, wrd_id] = self.dW[:, wrd_id] + error[:, j]
+        Row-sparse weight gradient of the last bprop
+
+        Returns:
+            tuple: ids of the words of the batch and a Tensor with the
+                   gradient of each of them in a column, None before the
+                   first bprop
         """
-        return self.deltas
+        if self.dW_rows is None:
+            return None
+        return self.dW_rows, self.dW_sparse[:, :len(self.dW_rows)]
 
 
 class GeneralizedCost(NervanaObject):
@@ -71,6 +71,9 @@ class Recurrent(ParameterLayer):
         super(Recurrent, self).allocate(shared_outputs)
         self.h = get_steps(self.outputs, self.out_shape)
         self.h_prev = self.h[-1:] + self.h[:-1]
+        # the state of the first step, which the input projection of all the
+        # steps to the outputs overwrites
+        self.h_first = self.be.iobuf(self.nout)
         # State deltas
         self.h_delta = get_steps(self.be.iobuf(self.out_shape), self.out_shape)
         self.bufs_to_reset = [self.outputs]
@@ -164,10 +167,14 @@ class Recurrent(ParameterLayer):
         # recurrent layer needs a h_prev buffer for bprop
         self.h_prev_bprop = [0] + self.h[:-1]
 
-        for (h, h_prev, xs) in zip(self.h, self.h_prev, self.xs):
-            self.be.compound_dot(self.W_input, xs, h)
+        # the input projection of all the steps in one gemm
+        self.h_first[:] = self.h[-1]
+        self.be.compound_dot(self.W_input, self.x, self.outputs)
+        self.outputs[:] = self.outputs + self.b
+
+        for (h, h_prev) in zip(self.h, [self.h_first] + self.h[:-1]):
             self.be.compound_dot(self.W_recur, h_prev, h, beta=1.0)
-            h[:] = self.activation(h + self.b)
+            h[:] = self.activation(h)
 
         return self.outputs
 
@@ -185,28 +192,36 @@ class Recurrent(ParameterLayer):
                 for each mini-batch element
                 shape: (input_size * steps, batch_size)
         """
-        self.dW[:] = 0
-
         if self.in_deltas is None:
             self.in_deltas = get_steps(deltas, self.out_shape)
-            self.prev_in_deltas = self.in_deltas[-1:] + self.in_deltas[:-1]
+            # the first step has no previous step to pass its deltas to
+            self.prev_in_deltas = [None] + self.in_deltas[:-1]
+            self.in_deltas_buffer = deltas
+            self.in_deltas_last_steps = deltas[:, self.be.bsz:]
+            self.h_first_steps = self.outputs[:, :-self.be.bsz]
 
-        params = (self.xs, self.h, self.h_prev_bprop, self.h_delta,
-                  self.in_deltas, self.prev_in_deltas, self.out_delta)
+        params = (self.h, self.h_delta, self.in_deltas, self.prev_in_deltas)
 
-        for (xs, hs, h_prev, h_delta, in_deltas,
-             prev_in_deltas, out_delta) in reversed(zip(*params)):
+        # the deltas of the pre-activations of all the steps are left in the
+        # deltas buffer
+        for (hs, h_delta, in_deltas, prev_in_deltas) in reversed(zip(*params)):
 
             in_deltas[:] = self.activation.bprop(hs) * in_deltas
-            self.be.compound_dot(self.W_recur.T, in_deltas, h_delta)
-            prev_in_deltas[:] = prev_in_deltas + h_delta
-            if h_prev != 0:
-                self.be.compound_dot(in_deltas, h_prev.T, self.dW_recur, beta=1.0)
-            self.be.compound_dot(in_deltas, xs.T, self.dW_input, beta=1.0)
-            self.db[:] = self.db + self.be.sum(in_deltas, axis=1)
-            # save a bit of computation if not bpropping activation gradients
-            if out_delta:
-                self.be.compound_dot(self.W_input.T, in_deltas, out_delta, alpha=alpha, beta=beta)
+            if prev_in_deltas is not None:
+                self.be.compound_dot(self.W_recur.T, in_deltas, h_delta)
+                prev_in_deltas[:] = prev_in_deltas + h_delta
+
+        # Weight deltas and accumulate
+        self.be.compound_dot(self.in_deltas_last_steps, self.h_first_steps.T, self.dW_recur)
+        self.be.compound_dot(self.in_deltas_buffer, self.x.T, self.dW_input)
+
+        # Bias delta and accumulate
+        self.db[:] = self.be.sum(self.in_deltas_buffer, axis=1)
+
+        # out deltas
+        if self.out_deltas_buffer:  # save a bit of computation
+            self.be.compound_dot(self.W_input.T, self.in_deltas_buffer, self.out_deltas_buffer,
+                                 alpha=alpha, beta=beta)
 
         return self.out_deltas_buffer
 
@@ -298,20 +313,16 @@ class LSTM(Recurrent):
             self.h[-1][:] = 0
             self.c[-1][:] = 0
 
-        params = (self.h, self.h_prev, self.xs, self.ifog, self.ifo,
-                  self.i, self.f, self.o, self.g, self.c, self.c_prev, self.c_act)
-
-        for (h, h_prev, xs, ifog, ifo, i, f, o, g, c, c_prev, c_act) in zip(*params):
-            self.be.compound_dot(self.W_recur, h_prev, ifog)
-            self.be.compound_dot(self.W_input, xs, ifog, beta=1.0)
-            ifog[:] = ifog + self.b
+        # the input projection of all the steps in one gemm
+        self.be.compound_dot(self.W_input, self.x, self.ifog_buffer)
+        self.ifog_buffer[:] = self.ifog_buffer + self.b
 
-            ifo[:] = self.gate_activation(ifo)
-            g[:] = self.activation(g)
+        params = (self.h, self.h_prev, self.ifog, self.c, self.c_prev, self.c_act)
 
-            c[:] = f * c_prev + i * g
-            c_act[:] = self.activation(c)
-            h[:] = o * c_act
+        for (h, h_prev, ifog, c, c_prev, c_act) in zip(*params):
+            self.be.compound_dot(self.W_recur, h_prev, ifog, beta=1.0)
+            self.be.compound_lstm_fprop_step(ifog, c_prev, c, c_act, h,
+                                             self.gate_activation, self.activation)
 
         return self.outputs
 
@@ -345,27 +356,20 @@ class LSTM(Recurrent):
             self.h_first_steps = self.outputs[:, :-self.be.bsz]
 
         params = (self.h_delta, self.in_deltas, self.prev_in_deltas,
-                  self.i, self.f, self.o, self.g, self.ifog_delta,
-                  self.i_delta, self.f_delta, self.o_delta, self.g_delta,
+                  self.ifog, self.ifog_delta,
                   self.c_delta, self.c_delta_prev, self.c_prev_bprop, self.c_act)
 
-        for (h_delta, in_deltas, prev_in_deltas,
-             i, f, o, g, ifog_delta, i_delta, f_delta, o_delta, g_delta,
+        for (h_delta, in_deltas, prev_in_deltas, ifog, ifog_delta,
              c_delta, c_delta_prev, c_prev, c_act) in reversed(zip(*params)):
 
-            # current cell delta
-            c_delta[:] = c_delta + self.activation.bprop(c_act) * (o * in_deltas)
-            i_delta[:] = self.gate_activation.bprop(i) * c_delta * g
-            f_delta[:] = self.gate_activation.bprop(f) * c_delta * c_prev
-            o_delta[:] = self.gate_activation.bprop(o) * in_deltas * c_act
-            g_delta[:] = self.activation.bprop(g) * c_delta * i
+            # current cell and gate deltas
+            self.be.compound_lstm_bprop_step(ifog, c_prev, c_act, in_deltas, ifog_delta,
+                                             c_delta, c_delta_prev,
+                                             self.gate_activation, self.activation)
 
             # out deltas
             self.be.compound_dot(self.W_recur.T, ifog_delta, h_delta)
 
-            if c_delta_prev is not None:
-                c_delta_prev[:] = c_delta * f
-
             prev_in_deltas[:] = prev_in_deltas + h_delta
 
         # Weight deltas and accumulate
@@ -513,21 +517,17 @@ class GRU(Recurrent):
         """
         self.init_buffers(inputs)
 
-        for (h, h_prev, rh_prev, xs, rz, r, z, hcan, rz_rec, hcan_rec, rzhcan) in zip(
-                self.h, self.h_prev, self.rh_prev, self.xs, self.rz, self.r,
-                self.z, self.hcan, self.rz_rec, self.hcan_rec, self.rzhcan):
+        # computes r, z, hcan from the inputs of all the steps in one gemm
+        self.be.compound_dot(self.W_input, self.x, self.rzhcan_buffer)
+        self.rzhcan_buffer[:] = self.rzhcan_buffer + self.b
 
-            # computes r, z, hcan from inputs
-            self.be.compound_dot(self.W_input, xs, rzhcan)
+        for (h, h_prev, rh_prev, rzhcan, rzhcan_rec) in zip(
+                self.h, self.h_prev, self.rh_prev, self.rzhcan, self.rzhcan_rec):
 
             # computes r, z, hcan from recurrents
-            self.be.compound_dot(self.Wrz_recur, h_prev, rz_rec)
-            rz[:] = self.gate_activation(rz + rz_rec + self.b_rz)
-            rh_prev[:] = r * h_prev
-            self.be.compound_dot(self.Whcan_recur, rh_prev, hcan_rec)
-
-            hcan[:] = self.activation(hcan_rec + hcan + self.b_hcan)
-            h[:] = (1 - z) * h_prev + z * hcan
+            self.be.compound_gru_fprop_step(self.Wrz_recur, self.Whcan_recur, h_prev,
+                                            rzhcan, rzhcan_rec, rh_prev, h,
+                                            self.gate_activation, self.activation)
 
         return self.outputs
 
@@ -550,40 +550,32 @@ class GRU(Recurrent):
                 of model unrolling
         """
 
-        self.dW[:] = 0
-
         if self.in_deltas is None:
             self.in_deltas = get_steps(deltas, self.out_shape)
             self.prev_in_deltas = self.in_deltas[-1:] + self.in_deltas[:-1]
+            (rz2, c1) = (self.nout * 2, self.nout * 2)
+            self.rz_delta_last_steps = self.rzhcan_delta_buffer[:rz2, self.be.bsz:]
+            self.hcan_delta_last_steps = self.rzhcan_delta_buffer[c1:, self.be.bsz:]
+            self.h_first_steps = self.outputs[:, :-self.be.bsz]
+            self.rh_prev_last_steps = self.rh_prev_buffer[:, self.be.bsz:]
 
-        params = (self.r, self.z, self.hcan, self.rh_prev, self.h_prev_bprop,
-                  self.r_delta, self.z_delta, self.hcan_delta, self.rz_delta, self.rzhcan_delta,
+        params = (self.rzhcan, self.h_prev_bprop, self.rzhcan_delta,
                   self.h_delta, self.in_deltas, self.prev_in_deltas)
 
-        for (r, z, hcan, rh_prev, h_prev, r_delta, z_delta, hcan_delta, rz_delta,
-             rzhcan_delta, h_delta, in_deltas, prev_in_deltas) in reversed(zip(*params)):
-
-            # hcan_delta
-            hcan_delta[:] = self.activation.bprop(hcan) * in_deltas * z
-            z_delta[:] = self.gate_activation.bprop(z) * in_deltas * (hcan - h_prev)
+        for (rzhcan, h_prev, rzhcan_delta,
+             h_delta, in_deltas, prev_in_deltas) in reversed(zip(*params)):
 
-            # r_delta
-            self.be.compound_dot(self.Whcan_recur.T, hcan_delta, r_delta)
-            r_delta[:] = self.gate_activation.bprop(r) * r_delta * h_prev
-
-            # out hidden delta
-            h_delta[:] = in_deltas * (1 - z)
-            self.be.compound_dot(self.Wrz_recur.T, rz_delta, h_delta, beta=1.0)
-            self.be.compound_dot(self.Whcan_recur.T, hcan_delta, self.wrc_T_dc)
-            h_delta[:] = h_delta + r * self.wrc_T_dc
-
-            if h_prev != 0:
-                self.be.compound_dot(rz_delta, h_prev.T, self.dWrz_recur, beta=1.0)
-                self.be.compound_dot(hcan_delta, rh_prev.T, self.dWhcan_recur, beta=1.0)
+            # gate deltas and out hidden delta
+            self.be.compound_gru_bprop_step(self.Wrz_recur, self.Whcan_recur, rzhcan, h_prev,
+                                            in_deltas, rzhcan_delta, h_delta, self.wrc_T_dc,
+                                            self.gate_activation, self.activation)
 
             prev_in_deltas[:] = prev_in_deltas + h_delta
 
-        # Weight deltas and accumulate
+        # Weight deltas and accumulate, the first step has no recurrent input
+        self.be.compound_dot(self.rz_delta_last_steps, self.h_first_steps.T, self.dWrz_recur)
+        self.be.compound_dot(self.hcan_delta_last_steps, self.rh_prev_last_steps.T,
+                             self.dWhcan_recur)
         self.be.compound_dot(self.rzhcan_delta_buffer, self.x.T, self.dW_input)  # batch
         self.db[:] = self.be.sum(self.rzhcan_delta_buffer, axis=1)
 
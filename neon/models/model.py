@@ -13,6 +13,7 @@
 # limitations under the License.
 # ----------------------------------------------------------------------------
 from collections import OrderedDict
+from functools import partial
 import logging
 
 from neon import NervanaObject
@@ -35,9 +36,12 @@ class Model(NervanaObject):
         name (str): Model name.  Defaults to "model"
         optimizer (Optimizer): Optimizer object which defines the learning rule
                                for updating model parameters (ie DescentMomentum, AdaDelta)
+        capture_steps (bool): Replay the backend calls of training steps once
+                              they repeat, see _fit_minibatch.  Defaults to
+                              False.
     """
 
-    def __init__(self, layers, name="model", optimizer=None):
+    def __init__(self, layers, name="model", optimizer=None, capture_steps=False):
         super(Model, self).__init__(name)
         self.optimizer = optimizer
         self.params = None  # should be able to remove
@@ -47,6 +51,14 @@ class Model(NervanaObject):
         self.initialized = False
         self.cost = None
 
+        # replay the backend calls of training steps once they are found to
+        # repeat, see _fit_minibatch
+        self.capture_steps = capture_steps
+        self.step_key = None
+        self.step_schedule = None
+        self.step_verified = False
+        self.step_attempts = 0
+
         # Wrap the list of layers in a Sequential container if a raw list of layers
         self.layers = layers if type(layers) in (Sequential, Tree) else Sequential(layers)
         self.layers_to_optimize = self.layers.layers_to_optimize
@@ -133,20 +145,17 @@ class Model(NervanaObject):
         """
         epoch = self.epoch_index
         self.total_cost[:] = 0
+        # the learning rule may change between epochs, steps are captured
+        # again in each one
+        self.step_key = None
+        self.step_schedule = None
+        self.step_attempts = 0
         # iterate through minibatches of the dataset
         for mb_idx, (x, t) in enumerate(dataset):
 
             callbacks.on_minibatch_begin(epoch, mb_idx)
 
-            x = self.fprop(x)
-
-            self.total_cost[:] = self.total_cost + self.cost.get_cost(x, t)
-
-            # deltas back propagate through layers
-            # for every layer in reverse except the 0th one
-            delta = self.cost.get_errors(x, t)
-            self.bprop(delta)
-            self.optimizer.optimize(self.layers_to_optimize, epoch=epoch)
+            self._fit_minibatch(x, t, epoch)
 
             callbacks.on_minibatch_end(epoch, mb_idx)
 
@@ -155,6 +164,73 @@ class Model(NervanaObject):
         # across all the minibatches we trained on
         self.total_cost[:] = self.total_cost / dataset.nbatches
 
+    def _fit_minibatch(self, x, t, epoch):
+        """
+        Performs one training step on a minibatch: fprop, cost, bprop and
+        parameter update.
+
+        With capture_steps set, the backend records the calls made by a
+        step.  Once two consecutive steps make the same calls on the same
+        buffers, the following steps of the epoch replay the recorded
+        schedule rather than running the layers.  The schedule is dropped
+        when the batch size or the input buffers change.  Models with a layer
+        that is not capturable always run the layers.
+
+        A replay only repeats the recorded backend calls.  Changes made from
+        python for the rest of the epoch are not seen: a learning rate or
+        other scalar set by a callback between minibatches, or weight and
+        state tensors replaced by set_params or load_params.  Up to three
+        steps of each epoch are captured before replay starts.
+
+        Arguments:
+            x (Tensor): Input minibatch data
+            t (Tensor): Targets of the minibatch
+            epoch (int): the current epoch
+        """
+        key = (self.be.bsz, self._buffer_key(x), self._buffer_key(t))
+        if key == self.step_key and self.step_verified:
+            self.step_schedule()
+            return
+
+        step = partial(self._train_step, x, t, epoch)
+        if not self.capture_steps or not self.layers.capturable or self.step_attempts > 2:
+            step()
+            return
+
+        schedule = self.be.capture(step)
+        if schedule is None:
+            # not supported by the backend
+            self.capture_steps = False
+            return
+        self.step_verified = (key == self.step_key and schedule.replayable and
+                              schedule.signature == self.step_schedule.signature)
+        self.step_key = key
+        self.step_schedule = schedule
+        self.step_attempts += 1
+        if self.step_verified:
+            logger.debug("Replaying training steps of %d backend calls", len(schedule.calls))
+
+    def _train_step(self, x, t, epoch):
+        """
+        Runs the layers, cost and optimizer on a minibatch
+        """
+        x = self.fprop(x)
+
+        self.total_cost[:] = self.total_cost + self.cost.get_cost(x, t)
+
+        # deltas back propagate through layers
+        # for every layer in reverse except the 0th one
+        delta = self.cost.get_errors(x, t)
+        self.bprop(delta)
+        self.optimizer.optimize(self.layers_to_optimize, epoch=epoch)
+
+    @staticmethod
+    def _buffer_key(x):
+        """
+        Identity and shape of the tensor, or list of tensors, x
+        """
+        return tuple((id(b), b.shape) for b in (x if isinstance(x, list) else [x]))
+
     def fprop(self, x, inference=False):
         """
         Forward propagates a minibatch x through the model.
@@ -233,6 +309,51 @@ class Model(NervanaObject):
 
         return Ypred[:dataset.ndata]
 
+    def calibrate(self, dataset, nbatches=None):
+        """
+        Records the range of the inputs of the layers that can be quantized
+        (Linear and Convolution) over inference passes on a sample of a
+        dataset, for quantize.
+
+        Arguments:
+            dataset (iterable): Dataset iterator to calibrate on
+            nbatches (int, optional): Number of minibatches of the dataset to
+                                      run, all of them by default
+        """
+        self.initialize(dataset)
+        layers = [l for l in self.layers_to_optimize
+                  if getattr(l, 'quant_axis', None) is not None]
+        for l in layers:
+            l.calibrating = True
+            l.in_range = None
+        dataset.reset()
+        try:
+            for idx, (x, t) in enumerate(dataset):
+                if nbatches is not None and idx == nbatches:
+                    break
+                self.fprop(x, inference=True)
+        finally:
+            for l in layers:
+                l.calibrating = False
+
+    def quantize(self, dataset=None, nbatches=None):
+        """
+        Switches the Linear and Convolution layers of the model to int8
+        inference, with int8 weights scaled per output channel and inputs
+        scaled by the range recorded by calibrate.  The quantized weights are
+        saved by serialize and restored by load_weights.
+
+        Arguments:
+            dataset (iterable, optional): Dataset iterator to calibrate on
+                                          first
+            nbatches (int, optional): Number of minibatches to calibrate on
+        """
+        if dataset is not None:
+            self.calibrate(dataset, nbatches)
+        for l in self.layers_to_optimize:
+            if getattr(l, 'quant_axis', None) is not None and l.in_scale is None:
+                l.quantize()
+
     def get_description(self):
         """
         Gets a description of the model required to reconstruct the model with
@@ -28,16 +28,84 @@ def get_param_list(layer_list):
     return plist
 
 
+def get_sparse_grads(layer_list):
+    '''
+    returns the row-sparse gradients reported by layers, by the id of their
+    dense gradient
+    '''
+    sparse = dict()
+    for l in layer_list:
+        sgrad = l.sparse_grad() if hasattr(l, 'sparse_grad') else None
+        if sgrad is not None:
+            (param, grad), states = l.get_params()
+            sparse[id(grad)] = sgrad
+    return sparse
+
+
+def _matrix_powers(m, k):
+    '''
+    returns the 2x2 matrix m to each of the powers k, as the rows m00, m01,
+    m10 and m11 of a (4, len(k)) array
+    '''
+    def mul(a, b):
+        return np.array([a[0] * b[0] + a[1] * b[2], a[0] * b[1] + a[1] * b[3],
+                         a[2] * b[0] + a[3] * b[2], a[2] * b[1] + a[3] * b[3]])
+
+    k = np.array(k, dtype=np.int64).ravel()
+    result = np.zeros((4, k.size))
+    result[0] = result[3] = 1
+    base = np.tile(np.array(m, dtype=np.float64).reshape((4, 1)), (1, k.size))
+    while np.any(k):
+        odd = (k & 1).astype(bool)
+        result[:, odd] = mul(result[:, odd], base[:, odd])
+        base = mul(base, base)
+        k >>= 1
+    return result
+
+
 class Optimizer(NervanaObject):
 
     '''
     Optimizers will take a param, update, and state
     will be responsible for keeping track of a schedule
+
+    Optimizers created with sparse_update update only the columns of the
+    parameters of layers that report a row-sparse gradient (see
+    LookupTable.sparse_grad).  The columns skipped by an update catch up on
+    the decay of their states when they are next updated, so their states
+    are the same as those of dense updates with zero gradients.
     '''
 
     def optimize(self, layer_list, epoch):
         raise NotImplementedError()
 
+    def get_sparse_grads(self, layer_list):
+        '''
+        returns the row-sparse gradients to update with, by the id of the
+        dense gradient, none unless the optimizer makes sparse updates and the
+        backend can scatter the updated columns back
+        '''
+        if not getattr(self, 'sparse_update', False) or not hasattr(self.be, 'scatter'):
+            return dict()
+        return get_sparse_grads(layer_list)
+
+    def skipped_steps(self, param, rows):
+        '''
+        Count an update of the columns rows of param.
+
+        Returns:
+            numpy.ndarray: (1, len(rows)) number of updates of param each
+                           column was left out of since its last one
+        '''
+        steps = self.sparse_steps.get(id(param))
+        if steps is None:
+            steps = [param, 0, np.zeros(param.shape[1], dtype=np.int64)]
+            self.sparse_steps[id(param)] = steps
+        steps[1] += 1
+        skipped = steps[1] - 1 - steps[2][rows]
+        steps[2][rows] = steps[1]
+        return skipped.reshape((1, -1))
+
 
 class Schedule(NervanaObject):
     """
@@ -131,7 +199,7 @@ class GradientDescentMomentum(Optimizer):
     """
 
     def __init__(self, learning_rate, momentum_coef, stochastic_round=False,
-                 wdecay=0.0, name="gdm", schedule=Schedule()):
+                 wdecay=0.0, name="gdm", schedule=Schedule(), sparse_update=False):
         """
         Arguments:
             learning_rate (float): the multiplicative coefficient of updates
@@ -148,12 +216,18 @@ class GradientDescentMomentum(Optimizer):
                                   Defaults to "gdm".
             schedule (neon.optimizers.optimizer.Schedule, optional): Learning
                 rate schedule.  Defaults to a constant learning rate.
+            sparse_update (bool, optional): update only the columns of
+                row-sparse gradients.  Skipped columns catch up on the
+                momentum and weight decay steps, at the current learning
+                rate, when they are next updated.  Defaults to False.
         """
         super(GradientDescentMomentum, self).__init__(name=name)
         self.learning_rate, self.momentum_coef = (learning_rate, momentum_coef)
         self.wdecay = wdecay
         self.schedule = schedule
         self.stochastic_round = stochastic_round
+        self.sparse_update = sparse_update
+        self.sparse_steps = dict()
 
     def optimize(self, layer_list, epoch):
         """
@@ -165,15 +239,39 @@ class GradientDescentMomentum(Optimizer):
         """
         lrate = self.schedule.get_learning_rate(self.learning_rate, epoch)
         param_list = get_param_list(layer_list)
+        sparse_grads = self.get_sparse_grads(layer_list)
         for (param, grad), states in param_list:
             param.rounding = self.stochastic_round
             if len(states) == 0:
                 states.append(self.be.zeros_like(grad))
+            if id(grad) in sparse_grads:
+                self.sparse_optimize(param, sparse_grads[id(grad)], states, lrate)
+                continue
             grad = grad / self.be.bsz
             velocity = states[0]
             velocity[:] = velocity * self.momentum_coef - lrate * (grad + self.wdecay * param)
             param[:] = param + velocity
 
+    def sparse_optimize(self, param, sparse_grad, states, lrate):
+        """
+        Apply the learning rule to the columns of param with a gradient
+        """
+        rows, grad = sparse_grad
+        mom, decay = self.momentum_coef, lrate * self.wdecay
+        # a step without gradient maps (param, velocity) to
+        # ((1 - decay) * param + mom * velocity, mom * velocity - decay * param)
+        skipped = self.skipped_steps(param, rows)
+        coef = self.be.array(_matrix_powers([1 - decay, mom, -decay, mom], skipped))
+
+        p, velocity = param.take(rows, axis=1), states[0].take(rows, axis=1)
+        v = self.be.empty_like(velocity)
+        v[:] = coef[2] * p + coef[3] * velocity
+        p[:] = coef[0] * p + coef[1] * velocity
+        velocity[:] = v * mom - lrate * (grad / self.be.bsz + self.wdecay * p)
+        p[:] = p + velocity
+        self.be.scatter(p, rows, 1, param)
+        self.be.scatter(velocity, rows, 1, states[0])
+
 
 class RMSProp(Optimizer):
 
@@ -182,7 +280,7 @@ class RMSProp(Optimizer):
     """
 
     def __init__(self, stochastic_round=False, decay_rate=0.95, learning_rate=2e-3, epsilon=1e-6,
-                 clip_gradients=False, gradient_limit=5, name="rmsprop"):
+                 clip_gradients=False, gradient_limit=5, name="rmsprop", sparse_update=False):
         """
         Arguments:
             stochastic_round (bool): Set this to True for stochastic rounding.
@@ -194,6 +292,10 @@ class RMSProp(Optimizer):
             epsilon (float): smoothing epsilon to avoid divide by zeros
             clip_gradients (bool): whether to truncate the gradients.
             gradient_limit (float): positive value to clip gradients between.
+            sparse_update (bool): update only the columns of row-sparse
+                                  gradients.  Skipped columns catch up on
+                                  the decay of their state when they are
+                                  next updated.
 
         Notes:
             Only constant learning rate is supported currently.
@@ -206,6 +308,8 @@ class RMSProp(Optimizer):
         self.clip_gradients = clip_gradients
         self.gradient_limit = gradient_limit
         self.stochastic_round = stochastic_round
+        self.sparse_update = sparse_update
+        self.sparse_steps = dict()
 
     def optimize(self, layer_list, epoch):
         """
@@ -218,6 +322,7 @@ class RMSProp(Optimizer):
         lrate, epsilon, decay = (self.learning_rate, self.epsilon, self.decay_rate)
 
         param_list = get_param_list(layer_list)
+        sparse_grads = self.get_sparse_grads(layer_list)
 
         for (param, grad), states in param_list:
 
@@ -225,6 +330,10 @@ class RMSProp(Optimizer):
             if len(states) == 0:
                 states.append(self.be.zeros_like(grad))
 
+            if id(grad) in sparse_grads:
+                self.sparse_optimize(param, sparse_grads[id(grad)], states)
+                continue
+
             grad = grad / self.be.bsz
             if self.clip_gradients:
                 grad = self.be.clip(grad, -self.gradient_limit, self.gradient_limit)
@@ -235,6 +344,24 @@ class RMSProp(Optimizer):
 
             param[:] = param - grad * lrate / (self.be.sqrt(state + epsilon) + epsilon)
 
+    def sparse_optimize(self, param, sparse_grad, states):
+        """
+        Apply the learning rule to the columns of param with a gradient
+        """
+        lrate, epsilon, decay = (self.learning_rate, self.epsilon, self.decay_rate)
+        rows, grad = sparse_grad
+        decays = self.be.array(decay ** (self.skipped_steps(param, rows) + 1))
+
+        grad = grad / self.be.bsz
+        if self.clip_gradients:
+            grad = self.be.clip(grad, -self.gradient_limit, self.gradient_limit)
+
+        p, state = param.take(rows, axis=1), states[0].take(rows, axis=1)
+        state[:] = decays * state + self.be.square(grad) * (1.0 - decay)
+        p[:] = p - grad * lrate / (self.be.sqrt(state + epsilon) + epsilon)
+        self.be.scatter(p, rows, 1, param)
+        self.be.scatter(state, rows, 1, states[0])
+
 
 class Adagrad(Optimizer):
 
@@ -243,7 +370,7 @@ class Adagrad(Optimizer):
     """
 
     def __init__(self, stochastic_round=False, learning_rate=0.01, epsilon=1e-6,
-                 clip_gradients=False, gradient_limit=5, name="adagrad"):
+                 clip_gradients=False, gradient_limit=5, name="adagrad", sparse_update=False):
         """
         Arguments:
             stochastic_round (bool): Set this to True for stochastic rounding.
@@ -254,6 +381,8 @@ class Adagrad(Optimizer):
             epsilon (float): smoothing epsilon to avoid divide by zeros
             clip_gradients (bool): whether to truncate the gradients.
             gradient_limit (float): positive value to clip gradients between.
+            sparse_update (bool): update only the columns of row-sparse
+                                  gradients.
 
         Notes:
             Only constant learning rate is supported currently.
@@ -264,6 +393,7 @@ class Adagrad(Optimizer):
         self.clip_gradients = clip_gradients
         self.gradient_limit = gradient_limit
         self.stochastic_round = stochastic_round
+        self.sparse_update = sparse_update
 
     def optimize(self, layer_list, epoch):
         """
@@ -275,6 +405,7 @@ class Adagrad(Optimizer):
         """
         lrate, epsilon = (self.learning_rate, self.epsilon)
         param_list = get_param_list(layer_list)
+        sparse_grads = self.get_sparse_grads(layer_list)
 
         for (param, grad), states in param_list:
 
@@ -282,14 +413,24 @@ class Adagrad(Optimizer):
             if len(states) == 0:
                 states.append(self.be.zeros_like(grad))
 
+            # columns without gradient keep their state, only the others
+            # are updated
+            if id(grad) in sparse_grads:
+                rows, grad = sparse_grads[id(grad)]
+                p, state = param.take(rows, axis=1), states[0].take(rows, axis=1)
+            else:
+                rows, p, state = None, param, states[0]
+
             grad = grad / self.be.bsz
             # clip gradients
             if self.clip_gradients:
                 grad = self.be.clip(grad, -self.gradient_limit, self.gradient_limit)
             # update state
-            state = states[0]
             state[:] = state + self.be.square(grad)
-            param[:] = param - grad * lrate / (self.be.sqrt(state + epsilon))
+            p[:] = p - grad * lrate / (self.be.sqrt(state + epsilon))
+            if rows is not None:
+                self.be.scatter(p, rows, 1, param)
+                self.be.scatter(state, rows, 1, states[0])
 
 
 class Adadelta(Optimizer):
@@ -299,7 +440,8 @@ class Adadelta(Optimizer):
     See Zeiler2012 for instance.
     """
 
-    def __init__(self, stochastic_round=False, decay=0.95, epsilon=1e-6, name="ada"):
+    def __init__(self, stochastic_round=False, decay=0.95, epsilon=1e-6, name="ada",
+                 sparse_update=False):
         """
         Args:
             stochastic_round (bool): Set this to True for stochastic rounding.
@@ -308,11 +450,16 @@ class Adadelta(Optimizer):
                                      Only affects the gpu backend.
             decay: decay parameter in Adadelta
             epsilon: epsilon parameter in Adadelta
+            sparse_update: update only the columns of row-sparse gradients.
+                           Skipped columns catch up on the decay of their
+                           states when they are next updated.
         """
         super(Adadelta, self).__init__(name=name)
         self.decay = decay
         self.epsilon = epsilon
         self.stochastic_round = stochastic_round
+        self.sparse_update = sparse_update
+        self.sparse_steps = dict()
 
     def optimize(self, layer_list, epoch):
         """
@@ -327,6 +474,7 @@ class Adadelta(Optimizer):
         epsilon, decay = (self.epsilon, self.decay)
 
         param_list = get_param_list(layer_list)
+        sparse_grads = self.get_sparse_grads(layer_list)
 
         for (param, grad), states in param_list:
             param.rounding = self.stochastic_round
@@ -335,6 +483,10 @@ class Adadelta(Optimizer):
                 # E[Grad^2], E[Delt^2], updates
                 states.extend([self.be.zeros_like(grad) for i in range(3)])
 
+            if id(grad) in sparse_grads:
+                self.sparse_optimize(param, sparse_grads[id(grad)], states)
+                continue
+
             grad = grad / self.be.bsz
             states[0][:] = states[0] * decay + (1. - decay) * grad * grad
             states[2][:] = self.be.sqrt((states[1] + epsilon) / (states[0] + epsilon)) * grad
@@ -342,6 +494,29 @@ class Adadelta(Optimizer):
 
             param[:] = param - states[2]
 
+    def sparse_optimize(self, param, sparse_grad, states):
+        """
+        Apply the learning rule to the columns of param with a gradient
+        """
+        epsilon, decay = (self.epsilon, self.decay)
+        rows, grad = sparse_grad
+        skipped = self.skipped_steps(param, rows)
+        decays = self.be.array(decay ** skipped)
+
+        grad = grad / self.be.bsz
+        p = param.take(rows, axis=1)
+        s0, s1, s2 = [state.take(rows, axis=1) for state in states]
+        # the updates skipped were zero, E[Delt^2] only decayed
+        s1[:] = s1 * decays
+        s0[:] = s0 * decays * decay + (1. - decay) * grad * grad
+        s2[:] = self.be.sqrt((s1 + epsilon) / (s0 + epsilon)) * grad
+        s1[:] = s1 * decay + (1. - decay) * s2 * s2
+
+        p[:] = p - s2
+        self.be.scatter(p, rows, 1, param)
+        for state, s in zip(states, (s0, s1, s2)):
+            self.be.scatter(s, rows, 1, state)
+
 
 class Adam(Optimizer):
 
@@ -350,7 +525,7 @@ class Adam(Optimizer):
     """
 
     def __init__(self, stochastic_round=False, learning_rate=0.001, beta_1=0.9, beta_2=0.999,
-                 epsilon=1e-8, name="adam"):
+                 epsilon=1e-8, name="adam", sparse_update=False):
         """
         Args:
             stochastic_round (bool): Set this to True for stochastic rounding.
@@ -361,6 +536,11 @@ class Adam(Optimizer):
             beta_1 (float): Adam parameter beta1
             beta_2 (float): Adam parameter beta2
             epsilon (float): numerical stability parameter
+            sparse_update (bool): update only the columns of row-sparse
+                                  gradients.  Skipped columns catch up on
+                                  the decay of their moments when they are
+                                  next updated, but not on the steps the
+                                  decaying first moment would have made.
         """
         super(Adam, self).__init__(name=name)
         self.beta_1 = beta_1
@@ -368,6 +548,8 @@ class Adam(Optimizer):
         self.epsilon = epsilon
         self.learning_rate = learning_rate
         self.stochastic_round = stochastic_round
+        self.sparse_update = sparse_update
+        self.sparse_steps = dict()
 
     def optimize(self, layer_list, epoch):
         """
@@ -382,6 +564,7 @@ class Adam(Optimizer):
         l = self.learning_rate * self.be.sqrt(1 - self.beta_2 ** t) / (1 - self.beta_1 ** t)
 
         param_list = get_param_list(layer_list)
+        sparse_grads = self.get_sparse_grads(layer_list)
 
         for (param, grad), states in param_list:
             param.rounding = self.stochastic_round
@@ -389,6 +572,10 @@ class Adam(Optimizer):
                 # running_1st_mom, running_2nd_mom
                 states.extend([self.be.zeros_like(grad) for i in range(2)])
 
+            if id(grad) in sparse_grads:
+                self.sparse_optimize(param, sparse_grads[id(grad)], states, l)
+                continue
+
             grad = grad / self.be.bsz
             m, v = states
             m[:] = m * self.beta_1 + (1. - self.beta_1) * grad
@@ -396,6 +583,26 @@ class Adam(Optimizer):
 
             param[:] = param - l * m / (self.be.sqrt(v) + self.epsilon)
 
+    def sparse_optimize(self, param, sparse_grad, states, l):
+        """
+        Apply the learning rule to the columns of param with a gradient
+        """
+        rows, grad = sparse_grad
+        skipped = self.skipped_steps(param, rows) + 1
+        beta_1 = self.be.array(self.beta_1 ** skipped)
+        beta_2 = self.be.array(self.beta_2 ** skipped)
+
+        grad = grad / self.be.bsz
+        p = param.take(rows, axis=1)
+        m, v = [state.take(rows, axis=1) for state in states]
+        m[:] = m * beta_1 + (1. - self.beta_1) * grad
+        v[:] = v * beta_2 + (1. - self.beta_2) * grad * grad
+
+        p[:] = p - l * m / (self.be.sqrt(v) + self.epsilon)
+        self.be.scatter(p, rows, 1, param)
+        self.be.scatter(m, rows, 1, states[0])
+        self.be.scatter(v, rows, 1, states[1])
+
 
 class MultiOptimizer(Optimizer):
 
@@ -264,6 +264,92 @@ def test_conv_rand(backend_default, rand_convargs):
             '%e %e' % (np.max(np.abs(ref_dW.T - neon_dW)), atol))
     return
 
+
+def test_conv_fprop_pad_stride(backend_cpu64):
+    be = backend_cpu64
+    N, C, K, H, W, R, S = 4, 3, 8, 11, 9, 3, 5
+    pad_h, pad_w, str_h, str_w = 1, 2, 2, 3
+    layer = be.conv_layer(np.float64, N, C, K, H=H, W=W, R=R, S=S,
+                          pad_h=pad_h, pad_w=pad_w, str_h=str_h, str_w=str_w)
+    M, P, Q = layer.MPQ
+
+    inpa = np.random.random(layer.dimI)
+    fa = np.random.random(layer.dimF) - 0.5
+    outa = np.random.random(layer.dimO)
+
+    # direct reference on the zero padded input
+    padded = np.zeros((C, 1, H + 2 * pad_h, W + 2 * pad_w, N))
+    padded[:, :, pad_h:pad_h + H, pad_w:pad_w + W] = inpa
+    ref_out = np.empty(layer.dimO)
+    for p in range(P):
+        for q in range(Q):
+            window = padded[:, :, p * str_h:p * str_h + R, q * str_w:q * str_w + S]
+            ref_out[:, 0, p, q] = np.tensordot(fa, window, axes=([0, 1, 2, 3], [0, 1, 2, 3]))
+
+    inp = be.array(inpa.reshape(layer.dimI2))
+    filters = be.array(fa.reshape(layer.dimF2))
+    out = be.array(outa.reshape(layer.dimO2))
+    be.fprop_conv(layer, inp, filters, out, alpha=2.0, beta=0.5)
+
+    assert np.allclose(out.get(), (2.0 * ref_out + 0.5 * outa).reshape(layer.dimO2))
+
+
+def test_conv_bprop_pad_stride(backend_cpu64):
+    be = backend_cpu64
+    N, C, K, H, W, R, S = 4, 3, 8, 11, 9, 3, 5
+    layer = be.conv_layer(np.float64, N, C, K, H=H, W=W, R=R, S=S,
+                          pad_h=1, pad_w=2, str_h=2, str_w=3)
+
+    inp = be.array(np.random.random(layer.dimI2))
+    filters = be.array(np.random.random(layer.dimF2) - 0.5)
+    err = be.array(np.random.random(layer.dimO2))
+    out = be.empty(layer.dimO2)
+    deltas = be.empty(layer.dimI2)
+
+    # bprop is the adjoint of fprop: <fprop(I), E> == <I, bprop(E)>
+    be.fprop_conv(layer, inp, filters, out)
+    be.bprop_conv(layer, filters, err, deltas)
+    assert np.allclose(np.sum(out.get() * err.get()), np.sum(inp.get() * deltas.get()))
+
+    # accumulation into existing deltas
+    prev = deltas.get().copy()
+    be.bprop_conv(layer, filters, err, deltas, alpha=0.5, beta=1.0)
+    assert np.allclose(deltas.get(), 1.5 * prev)
+
+
+def test_conv_update_pad_stride(backend_cpu64):
+    be = backend_cpu64
+    N, C, K, H, W, R, S = 4, 3, 8, 11, 9, 3, 5
+    pad_h, pad_w, str_h, str_w = 1, 2, 2, 3
+    layer = be.conv_layer(np.float64, N, C, K, H=H, W=W, R=R, S=S,
+                          pad_h=pad_h, pad_w=pad_w, str_h=str_h, str_w=str_w)
+    M, P, Q = layer.MPQ
+
+    inpa = np.random.random(layer.dimI)
+    erra = np.random.random(layer.dimO)
+
+    # direct reference on the zero padded input
+    padded = np.zeros((C, 1, H + 2 * pad_h, W + 2 * pad_w, N))
+    padded[:, :, pad_h:pad_h + H, pad_w:pad_w + W] = inpa
+    ref_dW = np.zeros(layer.dimF)
+    for p in range(P):
+        for q in range(Q):
+            window = padded[:, :, p * str_h:p * str_h + R, q * str_w:q * str_w + S]
+            ref_dW += np.tensordot(window, erra[:, 0, p, q], axes=([4], [1]))
+
+    inp = be.array(inpa.reshape(layer.dimI2))
+    err = be.array(erra.reshape(layer.dimO2))
+    dW = be.empty(layer.dimF2)
+
+    block_bytes = be.conv_block_bytes
+    try:
+        # whole layer in one gemm, then blocked over single output rows
+        for be.conv_block_bytes in (block_bytes, 1):
+            be.update_conv(layer, inp, err, dW, alpha=0.5)
+            assert np.allclose(dW.get(), 0.5 * ref_dW.reshape(layer.dimF2))
+    finally:
+        be.conv_block_bytes = block_bytes
+
 """
 Conv check code adapted from ref-des
 cnn8 currently only using strides = 1
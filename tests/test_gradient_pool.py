@@ -57,7 +57,7 @@ def pytest_generate_tests(metafunc):
             nin_rng = [10]
             nifm_rng = [1, 5]
             fs_rng = [2, 3]
-        op_rng = ["max", "avg"]
+        op_rng = ["max", "avg", "l2"]
         fargs = itt.product(nin_rng, nifm_rng, fs_rng, bsz_rng, op_rng)
         metafunc.parametrize("poolargs", fargs)
 
@@ -89,3 +89,23 @@ def test_pooling(backend_cpu64, poolargs):
                                                lshape=lshape,
                                                pert_inds=pert_inds)
     assert max_abs < 1.0e-7
+
+
+def test_pooling_argmax(backend_cpu64):
+    # bprop routes through the argmax of the fprop it follows, and recomputes
+    # it when called again without a new fprop
+    be = NervanaObject.be
+    be.bsz = be.batch_size = 4
+    layer = be.pool_layer(be.default_dtype, "max", N=4, C=2, H=6, W=6, R=2, S=2,
+                          str_h=2, str_w=2)
+    I = be.array(np.random.rand(2 * 6 * 6, 4))
+    O = be.empty((2 * 3 * 3, 4))
+    E = be.array(np.random.rand(2 * 3 * 3, 4))
+    delta, delta2 = be.empty_like(I), be.empty_like(I)
+
+    be.fprop_pool(layer, I, O)
+    assert layer.argmax is not None
+    be.bprop_pool(layer, I, E, delta)
+    assert layer.argmax is None
+    be.bprop_pool(layer, I, E, delta2)
+    assert np.array_equal(delta.get(), delta2.get())
@@ -163,3 +163,39 @@ def test_lookuptable_rand_error(backend_default, basic_linargs):
         assert cnt == cnt_exp
 
     return
+
+
+def test_lookuptable_sparse_grad(backend_default, basic_linargs):
+    nin, nout, batch_size, vocab_size = basic_linargs
+    NervanaObject.be.bsz = NervanaObject.be.bs = batch_size
+
+    init_glorot = GlorotUniform()
+    layer = LookupTable(
+        vocab_size=vocab_size, embedding_dim=nout, init=init_glorot)
+    layer.configure(nin)
+    layer.allocate()
+
+    # the dense gradient of each batch leaves nothing of the previous one
+    for step in range(3):
+        inp = np.random.random_integers(0, vocab_size-1, size=nin*batch_size)
+        err = np.random.random((nout, nin * batch_size)).astype(np.float32)
+        layer.fprop(layer.be.array(inp.reshape((nin, batch_size))))
+        layer.bprop(layer.be.array(err))
+
+        dw_exp = np.zeros((nout, vocab_size))
+        for i, w_id in enumerate(inp):
+            dw_exp[:, w_id] += err[:, i]
+        assert np.allclose(layer.dW.get(), dw_exp, atol=1e-4, rtol=0)
+
+        # backends without a sparse lookup_bprop leave only the dense one
+        sgrad = layer.sparse_grad()
+        if sgrad is not None:
+            rows, grad = sgrad
+            assert np.array_equal(rows, np.unique(inp))
+            assert np.allclose(grad.get(), dw_exp[:, rows], atol=1e-4, rtol=0)
+
+        dw = layer.be.empty_like(layer.dW)
+        assert layer.be.lookup_bprop(inp, layer.be.array(err), dw) is None
+        assert np.allclose(dw.get(), dw_exp, atol=1e-4, rtol=0)
+
+    return
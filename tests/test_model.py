@@ -16,6 +16,7 @@
 import numpy as np
 import os
 from neon.backends import gen_backend
+from neon.callbacks.callbacks import Callbacks
 from neon.data import DataIterator, load_mnist, load_text, Text
 from neon.initializers import Gaussian, Constant
 from neon.layers import GeneralizedCost, Affine
@@ -150,6 +151,45 @@ def test_model_serialize(backend_default, data):
 
     os.remove(tmp_save)
 
+
+def test_model_capture(backend_cpu64):
+    be = backend_cpu64
+    rng = np.random.RandomState(0)
+    X = rng.rand(be.bsz * 4, 64)
+    y = rng.randint(0, 10, size=be.bsz * 4)
+    train_set = DataIterator(X, y, nclass=10, lshape=(1, 8, 8))
+
+    def train(capture):
+        be.rng_reset()
+        init_norm = Gaussian(loc=0.0, scale=0.1)
+        layers = [Conv((3, 3, 4), init=init_norm, bias=Constant(0), activation=Rectlin()),
+                  Pooling(2),
+                  Affine(nout=20, init=init_norm, batch_norm=True, activation=Rectlin()),
+                  Dropout(keep=0.5),
+                  Affine(nout=10, init=init_norm, activation=Logistic(shortcut=True))]
+        mlp = Model(layers=layers, capture_steps=capture)
+        cost = GeneralizedCost(costfunc=CrossEntropyBinary())
+        optimizer = GradientDescentMomentum(learning_rate=0.1, momentum_coef=0.9)
+        mlp.fit(train_set, cost, optimizer, num_epochs=2, callbacks=Callbacks(mlp, train_set))
+        params = [p.get().copy() for l in mlp.layers_to_optimize
+                  for p in (l.params if hasattr(l, 'params') else [l.W])]
+        return mlp, mlp.total_cost.get().copy(), params
+
+    mlp, cost, params = train(False)
+    assert not mlp.step_verified
+    # the last steps of each epoch replay the first ones, with the same result
+    mlp, cost_c, params_c = train(True)
+    assert mlp.step_verified
+    assert np.array_equal(cost, cost_c)
+    for p, p_c in zip(params, params_c):
+        assert np.array_equal(p, p_c)
+
+    # steps that allocate initialized tensors are not replayed
+    x = be.empty((2, 2))
+    for alloc in (lambda: be.zeros((2, 2)), lambda: be.zeros_like(x),
+                  lambda: be.array(np.ones((2, 2)))):
+        assert not be.capture(alloc).replayable
+
 if __name__ == '__main__':
     be = gen_backend(backend='gpu', batch_size=50)
     test_model_get_outputs_rnn(be, '~/nervana/data')
@@ -142,6 +142,51 @@ def test_adam(backend_default):
     compare_tensors(adam, param_list, param2, tol=1e-7, epoch=epoch)
 
 
+class SparseDummyLayer(DummyLayer):
+
+    def __init__(self, p):
+        super(SparseDummyLayer, self).__init__(p)
+        self.rows = None
+
+    def sparse_grad(self):
+        (param, grad), states = self.p
+        return self.rows, wrap(grad.get()[:, self.rows])
+
+
+def test_sparse_update(backend_default):
+    # dense updates with zero gradients in the other columns and sparse ones
+    # agree once every column has been updated
+    nrows, ncols, nstates = 16, 40, [1, 1, 1, 3, 2]
+    for opt_class, kwargs, n in zip([GradientDescentMomentum, RMSProp, Adagrad, Adadelta, Adam],
+                                    [dict(learning_rate=0.1, momentum_coef=0.9, wdecay=0.005),
+                                     dict(), dict(), dict(), dict()], nstates):
+        param = np.random.rand(nrows, ncols)
+        states = [0.01 * np.random.rand(nrows, ncols) for i in range(n)]
+        dense = [((wrap(param), wrap(np.zeros((nrows, ncols)))), [wrap(s) for s in states])]
+        sparse = SparseDummyLayer(
+            [((wrap(param), wrap(np.zeros((nrows, ncols)))), [wrap(s) for s in states])])
+        dense_opt, sparse_opt = opt_class(**kwargs), opt_class(sparse_update=True, **kwargs)
+
+        for step in range(6):
+            if step < 5:
+                sparse.rows = np.unique(np.random.randint(0, ncols, 10))
+            else:
+                sparse.rows = np.arange(ncols)
+            grad = np.zeros((nrows, ncols))
+            grad[:, sparse.rows] = np.random.rand(nrows, len(sparse.rows))
+            for (p, g), s in (dense[0], sparse.p):
+                g[:] = grad
+            dense_opt.optimize([DummyLayer(dense)], epoch=0)
+            sparse_opt.optimize([sparse], epoch=0)
+
+        (dense_param, _), dense_states = dense[0]
+        (sparse_param, _), sparse_states = sparse.p
+        for s, s2 in zip(dense_states, sparse_states):
+            assert np.allclose(s.get(), s2.get(), rtol=1e-4, atol=1e-6)
+        if opt_class is not Adam:
+            assert np.allclose(dense_param.get(), sparse_param.get(), rtol=1e-4, atol=1e-6)
+
+
 def test_multi_optimizer(backend_default):
     opt_gdm = GradientDescentMomentum(
         learning_rate=0.001, momentum_coef=0.9, wdecay=0.005)
@@ -0,0 +1,79 @@
+# ----------------------------------------------------------------------------
+# Copyright 2015 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Test int8 quantized inference of Linear and Convolution layers on the cpu
+"""
+import numpy as np
+
+from neon.backends import gen_backend
+from neon.data import DataIterator
+from neon.initializers import Gaussian, Constant
+from neon.layers import Affine, Conv, Pooling
+from neon.models import Model
+from neon.transforms import Rectlin, Softmax
+from neon.util.persist import save_obj
+
+
+def make_model():
+    init_norm = Gaussian(loc=0.0, scale=0.1)
+    layers = [Conv((3, 3, 8), init=init_norm, bias=Constant(0.1), activation=Rectlin()),
+              Pooling(2),
+              Affine(nout=32, init=init_norm, bias=Constant(0.1), activation=Rectlin()),
+              Affine(nout=10, init=init_norm, activation=Softmax())]
+    return Model(layers=layers)
+
+
+def test_int8_dot():
+    be = gen_backend(backend='cpu', rng_seed=0)
+    rng = np.random.RandomState(0)
+    # long enough for the int32 sum of several float32 chunks
+    a = rng.randint(-127, 128, (8, 3000)).astype(np.int8)
+    b = rng.randint(-127, 128, (3000, 5)).astype(np.int8)
+    ref = np.dot(a.astype(np.int64), b.astype(np.int64))
+    assert np.array_equal(be._int8_dot(a, b, np.empty((8, 5), np.float32)), ref)
+
+
+def test_quantize_model(tmpdir):
+    be = gen_backend(backend='cpu', rng_seed=0, batch_size=32)
+    rng = np.random.RandomState(0)
+    X = rng.rand(be.bsz * 3, 100)
+    train_set = DataIterator(X, rng.randint(0, 10, size=be.bsz * 3), nclass=10,
+                             lshape=(1, 10, 10))
+
+    model = make_model()
+    ref = model.get_outputs(train_set)
+    params = model.serialize(keep_states=False)
+
+    model.quantize(train_set, nbatches=2)
+    for l in model.layers_to_optimize:
+        if l.quant_axis is not None:
+            assert l.W.get().dtype == np.int8
+    out = model.get_outputs(train_set)
+    assert np.allclose(out, ref, rtol=0, atol=0.02)
+    assert np.mean(np.argmax(out, 1) == np.argmax(ref, 1)) > 0.9
+
+    # the int8 weights are saved and loaded
+    path = str(tmpdir.join('quantized.pkl'))
+    save_obj(model.serialize(keep_states=False), path)
+    loaded = make_model()
+    loaded.load_weights(path)
+    assert np.array_equal(loaded.get_outputs(train_set), out)
+
+    # and the float model is left as it was
+    float_path = str(tmpdir.join('float.pkl'))
+    save_obj(params, float_path)
+    loaded = make_model()
+    loaded.load_weights(float_path)
+    assert np.allclose(loaded.get_outputs(train_set), ref)
@@ -91,6 +91,28 @@ def test_ref_compare_rand(backend_default, refgruargs):
               Gaussian())
 
 
+def test_state_carry(backend_default, refgruargs):
+    # two sequences in the same input buffer continue one another
+    seq_len, input_size, hidden_size, batch_size = refgruargs
+    NervanaObject.be.bsz = NervanaObject.be.batch_size = batch_size
+
+    inp = np.random.rand(input_size, 2 * seq_len * batch_size)
+    rnns = []
+    for nsteps in (seq_len, 2 * seq_len):
+        rnn = Recurrent(hidden_size, Gaussian(), Tanh())
+        rnn.configure((input_size, nsteps))
+        rnn.allocate()
+        rnns.append(rnn)
+    rnns[1].W[:] = rnns[0].W
+
+    inpa = rnns[0].be.array(inp[:, :seq_len * batch_size])
+    out = [rnns[0].fprop(inpa).get().copy()]
+    inpa[:] = inp[:, seq_len * batch_size:]
+    out.append(rnns[0].fprop(inpa).get())
+    assert allclose_with_out(np.hstack(out), rnns[1].fprop(rnns[1].be.array(inp)).get(),
+                             rtol=0.0, atol=1.0e-5)
+
+
 # compare neon RNN to reference RNN implementstion
 def check_rnn(seq_len, input_size, hidden_size,
               batch_size, init_func, inp_moms=[0.0, 1.0]):